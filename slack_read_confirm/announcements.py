@@ -0,0 +1,196 @@
+"""Announcement persistence helpers"""
+
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import Announcement, ChannelStats, ReadReceipt, Target
+
+# Rows per multi-row INSERT; keeps bound parameters well under driver limits
+INSERT_CHUNK_SIZE = 1000
+
+ReceiptResult = namedtuple("ReceiptResult", ["announcement_id", "inserted", "completed"])
+
+
+def permalink(channel_id: str, message_ts: str) -> str:
+    """Link to an announcement's message, for reminders and status reports"""
+    return f"https://slack.com/archives/{channel_id}/p{message_ts.replace('.', '')}"
+
+
+def create_announcement(db, owner_id: str, channel_id: str, message_ts: str, text: str, user_ids):
+    """Insert an announcement and all of its targets; the caller commits.
+
+    Returns the new announcement id and a list of (target_id, user_id) pairs.
+    """
+    ann = Announcement(owner_id=owner_id, channel_id=channel_id, message_ts=message_ts, text=text,
+                       target_count=len(user_ids))
+    db.add(ann)
+    bump_channel_stats(db, owner_id, channel_id, announcement_count=1, target_count=len(user_ids))
+    # Flush (not commit) so the announcement id is available for the targets
+    db.flush()
+    announcement_id = ann.id
+
+    rows = [{"announcement_id": announcement_id, "user_id": uid} for uid in user_ids]
+    targets = []
+    if db.get_bind().dialect.full_returning:
+        # Multi-row INSERT ... RETURNING hands back the new ids directly
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            stmt = insert(Target).values(rows[start:start + INSERT_CHUNK_SIZE]).returning(Target.id, Target.user_id)
+            targets.extend(tuple(row) for row in db.execute(stmt))
+    elif rows:
+        # No RETURNING support (e.g. SQLite): executemany, then read the ids back once
+        db.execute(insert(Target), rows)
+        stmt = select(Target.id, Target.user_id).filter_by(announcement_id=announcement_id)
+        targets = [tuple(row) for row in db.execute(stmt)]
+    return announcement_id, targets
+
+
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _upsert_insert(db, model):
+    # configure_engine() rejects other backends up front
+    return _UPSERT_INSERTS[db.get_bind().dialect.name](model)
+
+
+def insert_ignore(db, model, index_elements):
+    """Build an INSERT ... ON CONFLICT DO NOTHING for the session's dialect"""
+    return _upsert_insert(db, model).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def bump_channel_stats(db, owner_id: str, channel_id: str, **deltas):
+    """Add `deltas` to the owner's totals for the channel, creating the row on first use"""
+    stmt = _upsert_insert(db, ChannelStats).values(owner_id=owner_id, channel_id=channel_id, **deltas)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["owner_id", "channel_id"],
+        set_={name: getattr(ChannelStats, name) + stmt.excluded[name] for name in deltas}))
+
+
+def record_receipt(db, channel_id: str, message_ts: str, user_id: str):
+    """Record a read receipt for the user's target on the given message.
+
+    Resolves announcement, target and any existing receipt with one indexed join.
+    Returns None when the message is not an announcement or the user is not a
+    target, otherwise a ReceiptResult. `inserted` is False if the receipt already
+    existed; `completed` is True for exactly one receipt per announcement, the
+    one that brought the read count up to the target count. The caller commits.
+    """
+    row = (db.query(Target.announcement_id, Target.id, ReadReceipt.id, Announcement.owner_id)
+           .join(Announcement, Announcement.id == Target.announcement_id)
+           .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+           .filter(Announcement.channel_id == channel_id,
+                   Announcement.message_ts == message_ts,
+                   Target.user_id == user_id)
+           .first())
+    if row is None:
+        return None
+
+    announcement_id, target_id, receipt_id, owner_id = row
+    if receipt_id is not None:
+        return ReceiptResult(announcement_id, False, False)
+
+    # A concurrent reaction may have inserted the receipt since the lookup
+    stmt = insert_ignore(db, ReadReceipt, ["target_id"]).values(target_id=target_id, timestamp=datetime.utcnow())
+    inserted = db.execute(stmt).rowcount == 1
+    completed = False
+    if inserted:
+        db.execute(update(Announcement)
+                   .where(Announcement.id == announcement_id)
+                   .values(read_count=Announcement.read_count + 1))
+        completed = mark_completed(db, announcement_id)
+        bump_channel_stats(db, owner_id, channel_id, read_count=1, completed_count=int(completed))
+    return ReceiptResult(announcement_id, inserted, completed)
+
+
+def record_receipts(db, reactions):
+    """Record a batch of (channel_id, message_ts, user_id) reactions in one transaction.
+
+    One lookup for all of them, multi-row receipt inserts, then one counter
+    update and completion check per announcement touched. Returns a list
+    parallel to `reactions` of what record_receipt would have returned for
+    each, had they been recorded one after another. The caller commits.
+    """
+    keys = list(dict.fromkeys(reactions))
+    found = {}
+    for start in range(0, len(keys), INSERT_CHUNK_SIZE):
+        rows = (db.query(Announcement.channel_id, Announcement.message_ts, Target.user_id,
+                         Target.announcement_id, Target.id, ReadReceipt.id, Announcement.owner_id)
+                .join(Announcement, Announcement.id == Target.announcement_id)
+                .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+                .filter(tuple_(Announcement.channel_id, Announcement.message_ts, Target.user_id)
+                        .in_(keys[start:start + INSERT_CHUNK_SIZE])))
+        for channel_id, message_ts, user_id, *rest in rows:
+            found[(channel_id, message_ts, user_id)] = rest
+
+    unread = [target_id for _, target_id, receipt_id, _ in found.values() if receipt_id is None]
+    inserted = set()
+    if unread:
+        now = datetime.utcnow()
+        rows = [{"target_id": target_id, "timestamp": now} for target_id in unread]
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            # Concurrent reactions may have inserted some of these since the lookup
+            stmt = insert_ignore(db, ReadReceipt, ["target_id"]).values(rows[start:start + INSERT_CHUNK_SIZE])
+            if db.get_bind().dialect.full_returning:
+                inserted.update(db.execute(stmt.returning(ReadReceipt.target_id)).scalars())
+            else:
+                db.execute(stmt)
+        if not db.get_bind().dialect.full_returning:
+            # No RETURNING: this batch's receipts are the ones carrying its timestamp
+            for start in range(0, len(unread), INSERT_CHUNK_SIZE):
+                inserted.update(db.execute(select(ReadReceipt.target_id).where(
+                    ReadReceipt.target_id.in_(unread[start:start + INSERT_CHUNK_SIZE]),
+                    ReadReceipt.timestamp == now)).scalars())
+
+    reads = Counter()
+    stats = {}
+    for (channel_id, _, _), (announcement_id, target_id, _, owner_id) in found.items():
+        if target_id in inserted:
+            reads[announcement_id] += 1
+            stats[announcement_id] = (owner_id, channel_id)
+    completed = set()
+    for announcement_id, count in reads.items():
+        db.execute(update(Announcement)
+                   .where(Announcement.id == announcement_id)
+                   .values(read_count=Announcement.read_count + count))
+        if mark_completed(db, announcement_id):
+            completed.add(announcement_id)
+    channel_reads = Counter()
+    channel_completions = Counter()
+    for announcement_id, count in reads.items():
+        channel_reads[stats[announcement_id]] += count
+        channel_completions[stats[announcement_id]] += announcement_id in completed
+    for (owner_id, channel_id), count in channel_reads.items():
+        bump_channel_stats(db, owner_id, channel_id, read_count=count,
+                           completed_count=channel_completions[(owner_id, channel_id)])
+
+    # The last new receipt of each completed announcement is the one that completed it
+    completing = {}
+    for key in keys:
+        if key in found and found[key][1] in inserted:
+            completing[found[key][0]] = key
+    results = []
+    seen = set()
+    for key in reactions:
+        if key not in found:
+            results.append(None)
+            continue
+        announcement_id, target_id = found[key][:2]
+        first = key not in seen
+        seen.add(key)
+        results.append(ReceiptResult(
+            announcement_id,
+            first and target_id in inserted,
+            first and announcement_id in completed and completing[announcement_id] == key))
+    return results
+
+
+def mark_completed(db, announcement_id: int) -> bool:
+    """Compare-and-set completed_at once every target has read; True if this call set it"""
+    stmt = (update(Announcement)
+            .where(Announcement.id == announcement_id,
+                   Announcement.completed_at.is_(None),
+                   Announcement.read_count >= Announcement.target_count)
+            .values(completed_at=datetime.utcnow()))
+    return db.execute(stmt).rowcount == 1
@@ -1,159 +1,130 @@
+"""
+Entry point for the sync (Socket Mode) runtime
+
+Importing this module has no side effects. create_app() builds the Bolt app,
+start_services() prepares the DB and starts the scheduler, and stop_services()
+winds everything down again; main() connects to Slack in between and shuts
+down on SIGTERM or SIGINT:
+    python -m slack_read_confirm.app
+
+The package modules read their settings from the environment when imported,
+so they are imported inside the functions below, after main() has loaded .env.
+"""
+import logging
 import os
-import re
-from datetime import datetime
+import signal
+import threading
+import time
 
 from dotenv import load_dotenv
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-
-from .models import Announcement, Base, ReadReceipt, SessionLocal, Target, engine
-from .scheduler import get_app, schedule_user_reminder, scheduler
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Slack Bolt app
-app = get_app()
-# Create DB tables
-Base.metadata.create_all(bind=engine)
-
-# Patterns for user and user-group mentions
-MENTION_REGEX = re.compile(r"<@([UW][A-Z0-9]+)>")
-GROUP_REGEX = re.compile(r"<!subteam\^([GS][A-Z0-9]+)\|[^>]+>")
-
-@app.command("/read-confirm")
-def handle_read_confirm_command(ack, body, client, logger):
-    ack()
-    owner_id = body["user_id"]
-    channel_id = body["channel_id"]
-    text = body.get("text", "").strip()
-
-    # Extract user IDs and expand groups
-    user_ids = MENTION_REGEX.findall(text)
-    group_ids = GROUP_REGEX.findall(text)
-    for gid in group_ids:
-        try:
-            resp = client.usergroups_users_list(usergroup=gid)
-            if resp.get("ok"):
-                user_ids.extend(resp.get("users", []))
-        except Exception as e:
-            logger.error(f"Usergroup fetch error {gid}: {e}")
-
-    targets = list({uid for uid in user_ids if uid != owner_id})
-    if not targets:
-        client.chat_postEphemeral(channel=channel_id, user=owner_id, text="Mention at least one user or group.")
-        return
-
-    # Clean text
-    clean_text = MENTION_REGEX.sub("", text)
-    clean_text = GROUP_REGEX.sub("", clean_text).strip()
-    if not clean_text:
-        client.chat_postEphemeral(channel=channel_id, user=owner_id, text="Provide announcement text after mentions.")
-        return
-
-    # Post announcement
-    post = client.chat_postMessage(channel=channel_id, text=clean_text)
-    message_ts = post["ts"]
-
-    # Save announcement
-    db = SessionLocal()
-    ann = Announcement(owner_id=owner_id, channel_id=channel_id, message_ts=message_ts, text=clean_text)
-    db.add(ann)
-    db.commit()
-    db.refresh(ann)
-
-    # Create targets & schedule
-    for uid in targets:
-        tgt = Target(announcement_id=ann.id, user_id=uid)
-        db.add(tgt)
-        db.commit()
-        db.refresh(tgt)
-        schedule_user_reminder(ann.id, tgt.id, uid)
-
-    db.close()
-    client.chat_postEphemeral(channel=channel_id, user=owner_id, text=(f"Announcement created. Targets: {', '.join(f'<@{u}>' for u in targets)}"))
-
-@app.event("reaction_added")
-def handle_reaction_added(event, client, logger):
-    reaction = event.get("reaction")
-    if reaction in ["white_check_mark", "heavy_check_mark"]:
-        user_id = event["user"]
-        item = event["item"]
-        channel_id = item["channel"]
-        message_ts = item["ts"]
-
-        db = SessionLocal()
-        # Locate announcement & target
-        ann = db.query(Announcement).filter_by(
-            channel_id=channel_id,
-            message_ts=message_ts
-        ).first()
-        if ann:
-            tgt = db.query(Target).filter_by(
-                announcement_id=ann.id,
-                user_id=user_id
-            ).first()
-            if tgt:
-                # Record receipt if not exists
-                if not db.query(ReadReceipt).filter_by(target_id=tgt.id).first():
-                    receipt = ReadReceipt(target_id=tgt.id, timestamp=datetime.utcnow())
-                    db.add(receipt)
-                    db.commit()
-                # Cancel scheduled job
-                # TODO: check if this only removes for that user.
-                job_id = f"reminder_{ann.id}_{tgt.id}"
-                try:
-                    scheduler.remove_job(job_id)
-                except Exception as e:
-                    logger.error(f"Job removal error {job_id}: {e}")
-                # If everyone read, post celebration
-                total = db.query(Target).filter_by(announcement_id=ann.id).count()
-                read_cnt = db.query(ReadReceipt).join(Target).filter(Target.announcement_id==ann.id).count()
-                if read_cnt == total:
-                    client.chat_postMessage(
-                        channel=channel_id,
-                        text=":tada: Everyone has read this announcement!",
-                        thread_ts=message_ts
-                    )
-        db.close()
-
-# Mention handler
-@app.event("app_mention")
-def handle_app_mention(event, say, client, logger):
-    user = event.get("user")
-    text = event.get("text")
-    channel_id = event.get("channel")
-    
-    # Check if the mention includes "read-confirm" command
-    if "read-confirm" in text.lower():
-        # Extract message text (everything after "read-confirm")
-        parts = text.lower().split("read-confirm", 1)
-        if len(parts) > 1:
-            message_text = parts[1].strip()
-            if message_text:
-                # Post the announcement
-                post = client.chat_postMessage(channel=channel_id, text=message_text)
-                message_ts = post["ts"]
-                
-                # Save announcement with the mentioning user as owner
-                db = SessionLocal()
-                ann = Announcement(owner_id=user, channel_id=channel_id, message_ts=message_ts, text=message_text)
-                db.add(ann)
-                db.commit()
-                db.refresh(ann)
-                db.close()
-                
-                say(f"<@{user}>, I've created your read-confirm announcement. Users can confirm by adding a ✅ reaction.")
-                return
-        
-        # If we get here, the command wasn't properly formatted
-        say(f"<@{user}>, to create a read-confirm announcement, mention me with 'read-confirm' followed by your message.")
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(**kwargs):
+    """Build the Bolt App with the middleware and listeners registered"""
+    from slack_bolt import App
+
+    from .listeners import register_listeners
+
+    kwargs.setdefault("token", os.environ.get("SLACK_BOT_TOKEN"))
+    return register_listeners(App(**kwargs))
+
+
+def start_services(app):
+    """Create tables, load the open announcement index and start the scheduler and exporters"""
+    from . import metrics
+    from .archive import ARCHIVE_INTERVAL_HOURS
+    from .hot_index import MULTI_REPLICA, open_index
+    from .models import Base, engine, session_scope
+    from .reconcile import RECONCILE_INTERVAL_SECONDS
+    from .scheduler import (schedule_archive, schedule_index_refresh, schedule_reconcile, schedule_reminder_sweep,
+                            schedule_timezone_refresh, scheduler, set_client)
+
+    Base.metadata.create_all(bind=engine)
+    # Load open announcements so unrelated reactions are dropped without a query
+    with session_scope() as db:
+        open_index.load(db)
+
+    # Scheduled jobs post through the app's client
+    set_client(app.client)
+    # Recipient time zones load in the background, ahead of the first reminder sweep
+    schedule_timezone_refresh()
+    schedule_reminder_sweep()
+    if MULTI_REPLICA:
+        # Pick up announcements created (and completed) by other replicas
+        schedule_index_refresh()
+    if ARCHIVE_INTERVAL_HOURS:
+        schedule_archive()
+    if RECONCILE_INTERVAL_SECONDS:
+        # Catch checkmarks added while the bot was down or whose events were lost
+        schedule_reconcile()
+    if metrics.enabled:
+        metrics.instrument_scheduler(scheduler)
+    scheduler.start()
+    metrics.start_exporters()
+
+
+def stop_services(handler=None, timeout: float = 30.0) -> bool:
+    """Shut down in dependency order within `timeout` seconds; returns False if anything was cut off.
+
+    Nothing is lost if it is: reminders, receipts and open announcements are
+    rebuilt from the database by the next start_services(), unfinished
+    reminder leases expire, and the reconciliation sweep backfills checkmarks
+    added meanwhile.
+    """
+    from .dispatcher import dispatcher
+    from .jobs import command_queue, mention_queue
+    from .models import engine
+    from .receipt_buffer import receipt_buffer
+    from .scheduler import stop_scheduler
+
+    started = time.monotonic()
+    deadline = started + timeout
+
+    def remaining():
+        return max(0.0, deadline - time.monotonic())
+
+    # Stop taking events; Slack redelivers anything not yet acknowledged
+    if handler is not None:
+        handler.close()
+    drained = {
+        # Sweeps finish (or release) the batch in flight
+        "scheduled_jobs": stop_scheduler(remaining()),
+        # Queued listener work may still record receipts and post replies
+        "commands": command_queue.drain(remaining()),
+        "mentions": mention_queue.drain(remaining()),
+        "receipts": receipt_buffer.drain(remaining()),
+        # Replies and celebrations queued by all of the above
+        "slack_calls": dispatcher.drain(remaining()),
+    }
+    engine.dispose()
+    unfinished = [name for name, done in drained.items() if not done]
+    if unfinished:
+        logger.warning(f"Shutdown timed out after {timeout}s waiting for {', '.join(unfinished)}")
     else:
-        # Default response for other mentions
-        say(f"Hey <@{user}>! Use me to create read-confirm announcements. Just mention me with 'read-confirm' followed by your message.")
+        logger.info(f"Shut down cleanly in {time.monotonic() - started:.2f}s")
+    return not unfinished
 
-# Start the scheduler
-scheduler.start()
 
-if __name__ == "__main__":
+def main():
+    load_dotenv()
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    app = create_app()
+    start_services(app)
+    stop = threading.Event()
+    # Deploys send SIGTERM; both signals trigger the same orderly shutdown
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
     handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
-    handler.start()
+    handler.connect()
+    logger.info("Connected to Slack")
+    try:
+        stop.wait()
+    finally:
+        stop_services(handler, timeout=float(os.environ.get("SHUTDOWN_TIMEOUT_SECONDS", "30")))
+
+
+if __name__ == "__main__":
+    main()
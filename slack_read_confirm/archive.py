@@ -0,0 +1,207 @@
+"""
+Retention: move finished announcements out of the live tables
+
+Completed announcements older than ARCHIVE_RETENTION_DAYS, and announcements
+still open ARCHIVE_EXPIRE_DAYS after they were created, are written with their
+targets and receipts to gzipped JSON-lines files in ARCHIVE_DIR, then deleted.
+    python -m slack_read_confirm.archive --dry-run
+    python -m slack_read_confirm.archive --retention-days 7
+
+Work is done in chunks, one transaction each. A chunk's announcements and
+targets are locked as they are read, its file is written to a temporary name,
+fsynced and renamed, and then exactly the exported rows are deleted and taken
+out of channel_stats. A receipt written meanwhile waits for the chunk instead
+of being deleted unexported, and an interrupted run loses nothing: the next
+run picks up the same announcements and rewrites the same file.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select
+
+from .announcements import bump_channel_stats
+from .hot_index import open_index
+from .models import Announcement, ReadReceipt, Target, session_scope
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+# Days after completion before an announcement is archived
+ARCHIVE_RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", "30"))
+# Days after creation before an announcement that never completed is archived (0 keeps them)
+ARCHIVE_EXPIRE_DAYS = int(os.environ.get("ARCHIVE_EXPIRE_DAYS", "90"))
+# Announcements per chunk, and targets per chunk (one transaction each)
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_MAX_ROWS = int(os.environ.get("ARCHIVE_MAX_ROWS", "20000"))
+# Target ids per DELETE statement; keeps bound parameters well under driver limits
+DELETE_CHUNK_SIZE = 1000
+# How often the bot runs the archive job itself (0: only via the command line).
+# With several replicas, enable it on one of them.
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", "0"))
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def archivable_query(now: datetime, retention_days: int = ARCHIVE_RETENTION_DAYS,
+                     expire_days: int = ARCHIVE_EXPIRE_DAYS):
+    """(id, target_count) of announcements past retention, oldest first"""
+    conditions = [Announcement.completed_at < now - timedelta(days=retention_days)]
+    if expire_days:
+        conditions.append(Announcement.created_at < now - timedelta(days=expire_days))
+    return (select(Announcement.id, Announcement.target_count)
+            .where(or_(*conditions))
+            .order_by(Announcement.id))
+
+
+def next_chunk(db, now: datetime, retention_days: int, expire_days: int,
+               batch_size: int = ARCHIVE_BATCH_SIZE, max_rows: int = ARCHIVE_MAX_ROWS):
+    """Ids of the next announcements to archive, capped so their targets fit in `max_rows`.
+
+    The announcements are locked until the chunk's transaction ends, so a
+    concurrent run or receipt cannot change them between export and delete.
+    """
+    stmt = archivable_query(now, retention_days, expire_days).limit(batch_size).with_for_update(of=Announcement)
+    rows = db.execute(stmt).all()
+    ids, total = [], 0
+    for announcement_id, target_count in rows:
+        # Always take at least one, however many targets it has
+        if ids and total + target_count > max_rows:
+            break
+        ids.append(announcement_id)
+        total += target_count
+    return ids
+
+
+def export_chunk(db, announcement_ids):
+    """One dict per announcement, with its targets and their read times nested, and the target ids.
+
+    The targets are locked like their announcements, so only the rows exported
+    here are deleted with the chunk.
+    """
+    targets, target_ids = {}, []
+    stmt = (select(Target.id, Target.announcement_id, Target.user_id, Target.last_reminded_at, ReadReceipt.timestamp)
+            .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+            .where(Target.announcement_id.in_(announcement_ids))
+            .order_by(Target.id)
+            .with_for_update(of=Target))
+    for target_id, announcement_id, user_id, last_reminded_at, read_at in db.execute(stmt):
+        target_ids.append(target_id)
+        targets.setdefault(announcement_id, []).append({
+            "user_id": user_id,
+            "last_reminded_at": _isoformat(last_reminded_at),
+            "read_at": _isoformat(read_at),
+        })
+
+    anns = db.execute(select(Announcement).where(Announcement.id.in_(announcement_ids))
+                      .order_by(Announcement.id)).scalars()
+    records = [{
+        "id": ann.id,
+        "owner_id": ann.owner_id,
+        "channel_id": ann.channel_id,
+        "message_ts": ann.message_ts,
+        "text": ann.text,
+        "target_count": ann.target_count,
+        "read_count": ann.read_count,
+        "created_at": _isoformat(ann.created_at),
+        "completed_at": _isoformat(ann.completed_at),
+        "targets": targets.get(ann.id, []),
+    } for ann in anns]
+    return records, target_ids
+
+
+def write_chunk(directory: str, records) -> str:
+    """Write records to a gzipped JSON-lines file, atomically; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"announcements-{records[0]['id']:012d}-{records[-1]['id']:012d}.jsonl.gz"
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for record in records:
+                gz.write((json.dumps(record) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def delete_chunk(db, records, target_ids):
+    """Delete exactly the exported rows and subtract them from channel_stats; the caller commits"""
+    for start in range(0, len(target_ids), DELETE_CHUNK_SIZE):
+        chunk = target_ids[start:start + DELETE_CHUNK_SIZE]
+        db.execute(delete(ReadReceipt).where(ReadReceipt.target_id.in_(chunk)),
+                   execution_options={"synchronize_session": False})
+        db.execute(delete(Target).where(Target.id.in_(chunk)), execution_options={"synchronize_session": False})
+    db.execute(delete(Announcement).where(Announcement.id.in_([record["id"] for record in records])),
+               execution_options={"synchronize_session": False})
+
+    removed = {}
+    for record in records:
+        removed.setdefault((record["owner_id"], record["channel_id"]), Counter()).update(
+            announcement_count=1, target_count=record["target_count"], read_count=record["read_count"],
+            completed_count=int(record["completed_at"] is not None))
+    for (owner_id, channel_id), counts in removed.items():
+        bump_channel_stats(db, owner_id, channel_id, **{name: -count for name, count in counts.items()})
+
+
+def run_archive(directory: str = ARCHIVE_DIR, now: datetime = None,
+                retention_days: int = ARCHIVE_RETENTION_DAYS, expire_days: int = ARCHIVE_EXPIRE_DAYS,
+                batch_size: int = ARCHIVE_BATCH_SIZE, max_rows: int = ARCHIVE_MAX_ROWS,
+                dry_run: bool = False, stop=None) -> dict:
+    """Archive everything past retention, chunk by chunk; returns what was moved.
+
+    Returns after the chunk in flight once the `stop` event is set; the next
+    run picks up the rest.
+    """
+    now = now or datetime.utcnow()
+    if dry_run:
+        with session_scope() as db:
+            counted = archivable_query(now, retention_days, expire_days).order_by(None).subquery()
+            count, targets = db.execute(select(func.count(), func.coalesce(func.sum(counted.c.target_count), 0))).one()
+        return {"announcements": count, "targets": targets, "files": 0}
+
+    totals = {"announcements": 0, "targets": 0, "files": 0}
+    while stop is None or not stop.is_set():
+        with session_scope() as db:
+            ids = next_chunk(db, now, retention_days, expire_days, batch_size, max_rows)
+            if not ids:
+                break
+            records, target_ids = export_chunk(db, ids)
+            path = write_chunk(directory, records)
+            # Committed by session_scope together with the locks taken above
+            delete_chunk(db, records, target_ids)
+        totals["announcements"] += len(records)
+        totals["targets"] += sum(len(record["targets"]) for record in records)
+        totals["files"] += 1
+        for record in records:
+            # Expired announcements may still be in the index
+            open_index.remove(record["channel_id"], record["message_ts"])
+        logger.info(f"Archived {len(records)} announcements to {path}")
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive completed and expired announcements")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="Directory for the archive files")
+    parser.add_argument("--retention-days", type=int, default=ARCHIVE_RETENTION_DAYS)
+    parser.add_argument("--expire-days", type=int, default=ARCHIVE_EXPIRE_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-rows", type=int, default=ARCHIVE_MAX_ROWS, help="Targets per archive chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would be archived")
+    args = parser.parse_args(argv)
+
+    totals = run_archive(args.dir, retention_days=args.retention_days, expire_days=args.expire_days,
+                         batch_size=args.batch_size, max_rows=args.max_rows, dry_run=args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"{verb} {totals['announcements']} announcements ({totals['targets']} targets) in {totals['files']} files")
+
+
+if __name__ == "__main__":
+    main()
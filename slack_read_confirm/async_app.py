@@ -0,0 +1,396 @@
+"""
+Opt-in asyncio runtime with the same handler behavior as app.py
+
+Needs the async extras (aiohttp for Socket Mode, plus the DB driver):
+    pip install aiohttp aiosqlite     # or asyncpg for Postgres
+Run with:
+    python -m slack_read_confirm.async_app
+
+Unlike app.py, this module builds its handlers at import, and the package
+modules read their settings from the environment when imported; .env is
+therefore loaded before they are.
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+from concurrent.futures import wait
+from datetime import datetime
+
+from dotenv import load_dotenv
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_sdk import WebClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+load_dotenv()
+
+from .announcements import create_announcement, record_receipt
+from .archive import ARCHIVE_INTERVAL_HOURS, run_archive
+from .dedup import async_dedup_middleware, seen_reactions
+from .dispatcher import BACKGROUND, SLACK_CALL_TIMEOUT, dispatcher
+from .hot_index import MULTI_REPLICA, OPEN_INDEX_REFRESH_SECONDS, open_index
+from .models import DATABASE_URL, Base, configure_engine, pool_options
+from .parsing import parse_command_text, parse_mention_text, split_subcommand
+from .reconcile import RECONCILE_INTERVAL_SECONDS, reconciler
+from .receipt_buffer import RECEIPT_WRITE_BEHIND, receipt_buffer
+from .report import status_text
+from .scheduler import (REMINDER_BATCH_SIZE, REMINDER_DIGEST, REMINDER_LEASE, REMINDER_SWEEP_SECONDS,
+                        claim_due_reminders, due_users_query, reminder_text, render_digests, renew_leases,
+                        schedule_reminders, settle_batch, sweeps_stopping)
+from .timezones import USER_TZ_CHECK_SECONDS, user_timezones
+from .usergroups import usergroup_cache
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its asyncio driver"""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+# Bound lazily so importing this module does not need the async driver
+AsyncSessionLocal = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+_async_engine = None
+
+def get_async_engine():
+    """Get or initialize the asyncio engine for DATABASE_URL"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(async_database_url(DATABASE_URL), **pool_options(DATABASE_URL))
+        configure_engine(_async_engine.sync_engine, DATABASE_URL)
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+def async_session() -> AsyncSession:
+    get_async_engine()
+    return AsyncSessionLocal()
+
+# Outbound calls share the thread-based dispatcher (and its rate-limit budget)
+# with sync mode; awaiting its futures keeps the event loop free.
+_web_client = None
+
+def get_web_client():
+    """Get or initialize the sync Web API client used by the dispatcher"""
+    global _web_client
+    if _web_client is None:
+        _web_client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+    return _web_client
+
+async def slack_call(method: str, **kwargs):
+    return await asyncio.wrap_future(dispatcher.submit(get_web_client(), method, **kwargs))
+
+def slack_submit(method: str, **kwargs):
+    dispatcher.submit(get_web_client(), method, **kwargs)
+
+
+async def handle_read_confirm_command(ack, body, logger):
+    await ack()
+    owner_id = body["user_id"]
+    channel_id = body["channel_id"]
+    text = body.get("text", "").strip()
+
+    subcommand, args = split_subcommand(text)
+    if subcommand == "status":
+        async with async_session() as db:
+            reply = await db.run_sync(status_text, owner_id, int(args) if args else None)
+        slack_submit("chat_postEphemeral", channel=channel_id, user=owner_id, text=reply)
+        return
+
+    targets, error = await announce(owner_id, channel_id, parse_command_text(text))
+    if error:
+        slack_submit("chat_postEphemeral", channel=channel_id, user=owner_id, text=error)
+        return
+
+    slack_submit("chat_postEphemeral", channel=channel_id, user=owner_id, text=(f"Announcement created. Targets: {', '.join(f'<@{u}>' for u in targets)}"))
+
+async def announce(owner_id, channel_id, parsed):
+    """Async counterpart of listeners.announce: returns (targets, None) or (None, message)"""
+    user_ids = list(parsed.user_ids)
+    if parsed.group_ids:
+        groups = await asyncio.to_thread(usergroup_cache.get_members, get_web_client(), parsed.group_ids)
+        for members in groups.values():
+            user_ids.extend(members)
+
+    targets = list({uid for uid in user_ids if uid != owner_id})
+    if not targets:
+        return None, "Mention at least one user or group."
+
+    if not parsed.text:
+        return None, "Provide announcement text after mentions."
+
+    # Post announcement
+    try:
+        post = await asyncio.wait_for(slack_call("chat_postMessage", channel=channel_id, text=parsed.text),
+                                      SLACK_CALL_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None, "Slack is slow to respond right now, please try again in a moment."
+    message_ts = post["ts"]
+
+    # Save announcement & targets in one transaction; the reminder loop picks them up
+    async with async_session() as db:
+        await db.run_sync(create_announcement, owner_id, channel_id, message_ts, parsed.text, targets)
+        await db.commit()
+    open_index.add(channel_id, message_ts, targets)
+    return targets, None
+
+async def handle_reaction_added(event, logger):
+    reaction = event.get("reaction")
+    if reaction in ["white_check_mark", "heavy_check_mark"]:
+        user_id = event["user"]
+        item = event["item"]
+        channel_id = item["channel"]
+        message_ts = item["ts"]
+
+        if not open_index.might_be_pending(channel_id, message_ts, user_id):
+            return
+        key = (channel_id, message_ts, user_id)
+        if seen_reactions.seen(key):
+            return
+
+        try:
+            if RECEIPT_WRITE_BEHIND:
+                # Shares a transaction with the other reactions arriving in the same few milliseconds
+                result = await asyncio.wrap_future(receipt_buffer.add(channel_id, message_ts, user_id))
+            else:
+                async with async_session() as db:
+                    result = await db.run_sync(record_receipt, channel_id, message_ts, user_id)
+                    await db.commit()
+        except Exception:
+            seen_reactions.forget(key)
+            raise
+        open_index.discard(channel_id, message_ts, user_id)
+        if result and result.completed:
+            open_index.remove(channel_id, message_ts)
+            # Everyone read: post celebration
+            slack_submit(
+                "chat_postMessage",
+                channel=channel_id,
+                text=":tada: Everyone has read this announcement!",
+                thread_ts=message_ts
+            )
+
+async def handle_subteam_members_changed(event, logger):
+    # Drop the cached membership; the next command re-fetches it
+    usergroup_cache.invalidate(event["subteam_id"])
+
+async def handle_app_mention(event, context, logger):
+    user = event.get("user")
+    channel_id = event.get("channel")
+
+    parsed = parse_mention_text(event.get("text", ""), context.bot_user_id)
+    if parsed is None:
+        # Default response for other mentions
+        slack_submit("chat_postMessage", channel=channel_id, text=f"Hey <@{user}>! Use me to create read-confirm announcements. Just mention me with 'read-confirm', the people to notify and your message.")
+        return
+
+    targets, error = await announce(user, channel_id, parsed)
+    if error:
+        slack_submit("chat_postMessage", channel=channel_id, text=f"<@{user}> {error} To create a read-confirm announcement, mention me with 'read-confirm', the people to notify and your message.")
+        return
+    slack_submit("chat_postMessage", channel=channel_id, text=f"<@{user}>, I've created your read-confirm announcement for {len(targets)} people. They can confirm by adding a ✅ reaction.")
+
+
+async def gather_renewing(db, sends, target_ids):
+    """gather(*sends, return_exceptions=True), renewing the batch's lease every half lease meanwhile"""
+    gathered = asyncio.gather(*sends, return_exceptions=True)
+    while True:
+        try:
+            return await asyncio.wait_for(asyncio.shield(gathered), REMINDER_LEASE.total_seconds() / 2)
+        except asyncio.TimeoutError:
+            await db.run_sync(renew_leases, target_ids, datetime.utcnow() + REMINDER_LEASE)
+
+async def finish_batch(db, sends, now: datetime) -> int:
+    """Record a finished batch the same way the sync sweep does; returns the number of sends delivered.
+
+    `sends` maps each dispatcher future to the target ids it reminds. Sends not
+    started yet are cancelled first, so a sweep that is cancelled part way hands
+    those targets back at once; see settle_batch() for delivered and failed ones.
+    """
+    # Calls already being sent cannot be cancelled; let them finish
+    await asyncio.to_thread(wait, [future for future in sends if not future.cancel()])
+    sent = await db.run_sync(settle_batch, sends, now)
+    await db.commit()
+    return sent
+
+async def send_due_reminders(batch_size: int = REMINDER_BATCH_SIZE):
+    """Async counterpart of scheduler.send_due_reminders; returns the number sent"""
+    now = datetime.utcnow()
+    sent = 0
+    async with async_session() as db:
+        if user_timezones.ready:
+            await db.run_sync(schedule_reminders, now, user_timezones.known_zone)
+        while not sweeps_stopping.is_set():
+            batch = await db.run_sync(claim_due_reminders, now, batch_size)
+            if not batch:
+                break
+            sends = {dispatcher.submit(get_web_client(), "chat_postMessage", priority=BACKGROUND, channel=row.user_id,
+                                       text=reminder_text(row.channel_id, row.text)): [row.target_id]
+                     for row in batch}
+            try:
+                await gather_renewing(db, [asyncio.wrap_future(future) for future in sends],
+                                      [row.target_id for row in batch])
+            finally:
+                # Shielded so a sweep cancelled on shutdown still records and releases its batch
+                sent += await asyncio.shield(finish_batch(db, sends, now))
+    return sent
+
+async def send_due_digests(batch_size: int = REMINDER_BATCH_SIZE):
+    """Async counterpart of scheduler.send_due_digests; returns the number of digests sent"""
+    now = datetime.utcnow()
+    sent = 0
+    async with async_session() as db:
+        if user_timezones.ready:
+            await db.run_sync(schedule_reminders, now, user_timezones.known_zone)
+        while not sweeps_stopping.is_set():
+            user_ids = (await db.execute(due_users_query(now).limit(batch_size))).scalars().all()
+            if not user_ids:
+                break
+            batch = await db.run_sync(claim_due_reminders, now, None, user_ids=user_ids)
+            sends = {dispatcher.submit(get_web_client(), "chat_postMessage", priority=BACKGROUND, channel=user_id,
+                                       text=text, blocks=blocks): target_ids
+                     for user_id, (target_ids, blocks, text) in render_digests(batch).items()}
+            try:
+                await gather_renewing(db, [asyncio.wrap_future(future) for future in sends],
+                                      [row.target_id for row in batch])
+            finally:
+                sent += await asyncio.shield(finish_batch(db, sends, now))
+    return sent
+
+# Set on SIGTERM/SIGINT; the background loops return instead of starting another run
+stopping = asyncio.Event()
+# Time a sweep cancelled at the shutdown deadline still gets to release its leases
+CANCELLED_SWEEP_GRACE_SECONDS = 5.0
+
+
+async def idle(seconds: float) -> bool:
+    """Sleep for `seconds` or until shutdown begins; returns True if it has"""
+    try:
+        await asyncio.wait_for(stopping.wait(), seconds)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+async def reminder_loop():
+    """Send reminders as they come due, every REMINDER_SWEEP_SECONDS"""
+    while not await idle(REMINDER_SWEEP_SECONDS):
+        try:
+            await (send_due_digests() if REMINDER_DIGEST else send_due_reminders())
+        except Exception:
+            logger.exception("Reminder sweep failed")
+
+
+async def timezone_refresh_loop():
+    """Reload recipient time zones once the cache expires, off the reminder sweep"""
+    while True:
+        try:
+            await asyncio.to_thread(user_timezones.ensure_fresh, get_web_client())
+        except Exception:
+            logger.exception("Time zone refresh failed")
+        if await idle(USER_TZ_CHECK_SECONDS):
+            return
+
+
+async def index_refresh_loop():
+    """Reload the open announcement index so announcements from other replicas show up"""
+    while not await idle(OPEN_INDEX_REFRESH_SECONDS):
+        try:
+            async with async_session() as db:
+                await db.run_sync(open_index.load)
+        except Exception:
+            logger.exception("Open announcement index refresh failed")
+
+
+async def archive_loop():
+    """Move announcements past retention out of the live tables every ARCHIVE_INTERVAL_HOURS"""
+    while not await idle(ARCHIVE_INTERVAL_HOURS * 3600):
+        try:
+            await asyncio.to_thread(run_archive, stop=sweeps_stopping)
+        except Exception:
+            logger.exception("Archive run failed")
+
+
+async def reconcile_loop():
+    """Backfill receipts for missed checkmarks every RECONCILE_INTERVAL_SECONDS"""
+    while not await idle(RECONCILE_INTERVAL_SECONDS):
+        try:
+            await asyncio.to_thread(reconciler.run, get_web_client())
+        except Exception:
+            logger.exception("Reaction reconciliation failed")
+
+
+def build_app(**kwargs) -> AsyncApp:
+    """Create the AsyncApp and register the listeners"""
+    kwargs.setdefault("token", os.environ.get("SLACK_BOT_TOKEN"))
+    app = AsyncApp(**kwargs)
+    app.use(async_dedup_middleware)
+    app.command("/read-confirm")(handle_read_confirm_command)
+    app.event("reaction_added")(handle_reaction_added)
+    app.event("subteam_members_changed")(handle_subteam_members_changed)
+    app.event("app_mention")(handle_app_mention)
+    return app
+
+async def main():
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        await db.run_sync(open_index.load)
+    tasks = [asyncio.create_task(timezone_refresh_loop()), asyncio.create_task(reminder_loop())]
+    if MULTI_REPLICA:
+        tasks.append(asyncio.create_task(index_refresh_loop()))
+    if ARCHIVE_INTERVAL_HOURS:
+        tasks.append(asyncio.create_task(archive_loop()))
+    if RECONCILE_INTERVAL_SECONDS:
+        tasks.append(asyncio.create_task(reconcile_loop()))
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+    handler = AsyncSocketModeHandler(build_app(), os.environ.get("SLACK_APP_TOKEN"))
+    await handler.connect_async()
+    logger.info("Connected to Slack")
+    try:
+        await stopping.wait()
+    finally:
+        await shutdown(handler, tasks, float(os.environ.get("SHUTDOWN_TIMEOUT_SECONDS", "30")))
+
+
+async def shutdown(handler, tasks, timeout: float) -> bool:
+    """Async counterpart of app.stop_services; returns False if anything was cut off"""
+    deadline = time.monotonic() + timeout
+
+    def remaining():
+        return max(0.0, deadline - time.monotonic())
+
+    stopping.set()
+    await handler.close_async()
+    # Running sweeps finish their batch; idle loops return at once
+    sweeps_stopping.set()
+    reconciler.stop()
+    user_timezones.stop()
+    _, pending = await asyncio.wait(tasks, timeout=remaining())
+    for task in pending:
+        task.cancel()
+    # Commit receipts still waiting in the write-behind buffer, then send the calls they queued
+    drained = await asyncio.to_thread(receipt_buffer.drain, remaining())
+    drained = await asyncio.to_thread(dispatcher.drain, remaining()) and drained
+    if pending:
+        # Cancelled sweeps record what they sent and release the rest of their batch
+        await asyncio.wait(pending, timeout=max(remaining(), CANCELLED_SWEEP_GRACE_SECONDS))
+    await get_async_engine().dispose()
+    if pending or not drained:
+        logger.warning(f"Shutdown timed out after {timeout}s")
+    return not pending and drained
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,334 @@
+"""
+Benchmarks for the bot's hot paths
+
+Run against an in-memory SQLite database (default) or a local Postgres:
+    python -m slack_read_confirm.bench fanout
+    python -m slack_read_confirm.bench fanout --database-url postgresql://localhost:5432/slack_read_confirm_bench
+    python -m slack_read_confirm.bench runtime      # sync vs asyncio reaction throughput
+    python -m slack_read_confirm.bench load reactions --save baseline.json   # see loadtest.py
+    python -m slack_read_confirm.bench stagger --histogram   # reminder sends per minute
+    python -m slack_read_confirm.bench startup      # cold start of slack_read_confirm.app
+    python -m slack_read_confirm.bench tokenize --mentions 5000   # mention parsing throughput
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from .announcements import create_announcement, record_receipt
+from .models import (SQLITE_SYNCHRONOUS, Announcement, Base, Target, configure_engine, create_database_engine,
+                     is_memory_sqlite, is_sqlite)
+from .parsing import parse_command_text
+
+FANOUT_SIZES = [10, 100, 1000, 10000]
+# Startup phases, each timed in a fresh interpreter
+STARTUP_PHASES = {
+    "interpreter": "pass",
+    "import app": "import slack_read_confirm.app",
+    "create_app": ("from slack_read_confirm.app import create_app\n"
+                   "create_app(token='xoxb-bench', signing_secret='bench', token_verification_enabled=False)"),
+    "start_services": ("from slack_read_confirm.app import create_app, start_services\n"
+                       "start_services(create_app(token='xoxb-bench', signing_secret='bench', token_verification_enabled=False))"),
+}
+# Share of simulated recipients per time zone
+STAGGER_ZONE_MIX = {
+    "America/Los_Angeles": 0.2,
+    "America/New_York": 0.3,
+    "Europe/London": 0.2,
+    "Europe/Berlin": 0.15,
+    "Asia/Kolkata": 0.1,
+    "Asia/Tokyo": 0.05,
+}
+
+
+def _reset_schema(engine):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _legacy_fanout(db, user_ids):
+    """The original per-recipient path: one commit + refresh for every target"""
+    ann = Announcement(owner_id="U_OWNER", channel_id="C_BENCH", message_ts=f"{time.time():.6f}", text="Benchmark")
+    db.add(ann)
+    db.commit()
+    db.refresh(ann)
+    for uid in user_ids:
+        tgt = Target(announcement_id=ann.id, user_id=uid)
+        db.add(tgt)
+        db.commit()
+        db.refresh(tgt)
+
+
+def _batched_fanout(db, user_ids):
+    create_announcement(db, "U_OWNER", "C_BENCH", f"{time.time():.6f}", "Benchmark", user_ids)
+    db.commit()
+
+
+def bench_fanout(database_url: str, sizes=FANOUT_SIZES):
+    """Time announcement creation at increasing target counts"""
+    engine = create_database_engine(database_url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    results = []
+    for size in sizes:
+        user_ids = [f"U{i:08d}" for i in range(size)]
+        row = {"targets": size}
+        for name, fanout in (("legacy", _legacy_fanout), ("batched", _batched_fanout)):
+            _reset_schema(engine)
+            db = Session()
+            start = time.perf_counter()
+            fanout(db, user_ids)
+            row[name] = time.perf_counter() - start
+            db.close()
+        results.append(row)
+        print(f"{size:>6} targets: legacy {row['legacy'] * 1000:9.1f} ms  "
+              f"batched {row['batched'] * 1000:9.1f} ms  "
+              f"speedup {row['legacy'] / row['batched']:6.1f}x")
+    engine.dispose()
+    return results
+
+
+def bench_runtime(database_url: str, events: int = 2000, concurrency: int = 10):
+    """Reaction events per second: sync worker threads vs asyncio tasks on an async engine"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from .async_app import async_database_url
+
+    tmpdir = None
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        # Both engines must see the same database, so use a file
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    engine = create_database_engine(database_url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    user_ids = [f"U{i:08d}" for i in range(events)]
+
+    def setup():
+        _reset_schema(engine)
+        db = Session()
+        create_announcement(db, "U_OWNER", "C_BENCH", "1.000001", "Benchmark", user_ids)
+        db.commit()
+        db.close()
+
+    def sync_event(uid):
+        db = Session()
+        try:
+            record_receipt(db, "C_BENCH", "1.000001", uid)
+            db.commit()
+        finally:
+            db.close()
+
+    # Sync mode: Bolt's default listener pool is a ThreadPoolExecutor
+    setup()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(sync_event, user_ids))
+    sync_rate = events / (time.perf_counter() - start)
+
+    async def run_async():
+        async_engine = create_async_engine(async_database_url(database_url))
+        configure_engine(async_engine.sync_engine, database_url)
+        AsyncSession_ = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def async_event(uid):
+            async with limit:
+                async with AsyncSession_() as db:
+                    await db.run_sync(record_receipt, "C_BENCH", "1.000001", uid)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(async_event(uid) for uid in user_ids))
+        elapsed = time.perf_counter() - start
+        await async_engine.dispose()
+        return events / elapsed
+
+    setup()
+    async_rate = asyncio.run(run_async())
+
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+    print(f"{events} reaction events, concurrency {concurrency}: "
+          f"sync {sync_rate:8.0f} events/s  async {async_rate:8.0f} events/s")
+    return {"events": events, "sync": sync_rate, "async": async_rate}
+
+
+def bench_load(database_url: str, workload: str, events: int, targets: int, group_size: int, rate: float,
+               save: str = None, compare: str = None, tolerance: float = 0.1):
+    """Replay a synthetic event stream; exits non-zero if it regressed against `compare`"""
+    from . import loadtest
+
+    result = loadtest.run_workload(database_url, workload, events, targets, group_size, rate)
+    print(loadtest.format_result(result))
+    if save:
+        loadtest.save_baseline(save, result)
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+        regressions = loadtest.compare_to_baseline(result, baseline, tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+    return result
+
+
+def bench_stagger(users: int = 10000, jitter_minutes: int = None, histogram: bool = False):
+    """Simulate one day of reminders and report sends per minute (UTC) for each scheduling policy"""
+    from .scheduler import REMINDER_HOUR
+    from .timezones import REMINDER_JITTER_MINUTES, get_zone, next_reminder_slot
+
+    jitter_minutes = REMINDER_JITTER_MINUTES if jitter_minutes is None else jitter_minutes
+    rng = random.Random(0)
+    zones = rng.choices(list(STAGGER_ZONE_MIX), weights=list(STAGGER_ZONE_MIX.values()), k=users)
+    user_ids = [f"U{i:08d}" for i in range(users)]
+    day = datetime(2026, 3, 2)
+
+    policies = {
+        "server time": lambda uid, zone: day + timedelta(hours=REMINDER_HOUR),
+        "local time": lambda uid, zone: next_reminder_slot(uid, get_zone(zone), day, REMINDER_HOUR, jitter_minutes=0),
+        f"local + {jitter_minutes}m jitter": lambda uid, zone: next_reminder_slot(uid, get_zone(zone), day, REMINDER_HOUR,
+                                                                                 jitter_minutes=jitter_minutes),
+    }
+    results = {}
+    for name, slot in policies.items():
+        per_minute = Counter(slot(uid, zone).replace(second=0, microsecond=0) for uid, zone in zip(user_ids, zones))
+        results[name] = per_minute
+        print(f"{name:>22}: peak {max(per_minute.values()):6d} sends/min over {len(per_minute):4d} active minutes")
+
+    if histogram:
+        per_minute = results[f"local + {jitter_minutes}m jitter"]
+        peak = max(per_minute.values())
+        for minute in sorted(per_minute):
+            print(f"{minute:%H:%M} UTC {per_minute[minute]:6d} {'#' * max(1, round(40 * per_minute[minute] / peak))}")
+    return results
+
+
+def _legacy_parse(text):
+    """The original parser: separate findall and sub passes for users and groups"""
+    mention_regex = re.compile(r"<@([UW][A-Z0-9]+)>")
+    group_regex = re.compile(r"<!subteam\^([GS][A-Z0-9]+)\|[^>]+>")
+    user_ids = mention_regex.findall(text)
+    group_ids = group_regex.findall(text)
+    clean_text = mention_regex.sub("", text)
+    clean_text = group_regex.sub("", clean_text).strip()
+    return user_ids, group_ids, clean_text
+
+
+def bench_tokenize(mentions: int = 5000, runs: int = 20):
+    """Parse a large pasted message (mentions, groups and prose) with the legacy and single-pass parsers"""
+    rng = random.Random(0)
+    words = ["please", "read", "the", "updated", "on-call", "policy", "before", "Friday", "thanks"]
+    parts = []
+    for i in range(mentions):
+        parts.append(f"<@U{i:08d}>" if i % 50 else f"<!subteam^S{i:08d}|team-{i}>")
+        parts.extend(rng.choices(words, k=3))
+    text = " ".join(parts)
+    size_mb = len(text.encode("utf-8")) / 1e6
+    assert _legacy_parse(text) == tuple(parse_command_text(text))
+
+    results = {}
+    for name, parse in (("legacy", _legacy_parse), ("single pass", parse_command_text)):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            parse(text)
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+        print(f"{name:>12}: {results[name] * 1000:8.2f} ms  {size_mb / results[name]:7.1f} MB/s "
+              f"({mentions} mentions, {size_mb:.2f} MB)")
+    return results
+
+
+def bench_startup(database_url: str, runs: int = 5):
+    """Median wall time of each startup phase of slack_read_confirm.app, in a new process per run"""
+    tmpdir = None
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'startup.db')}"
+    env = {**os.environ, "DATABASE_URL": database_url}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for phase, code in STARTUP_PHASES.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], env=env, cwd=root, check=True)
+            timings.append(time.perf_counter() - start)
+        results[phase] = statistics.median(timings)
+        print(f"{phase:>15}: {results[phase] * 1000:8.1f} ms")
+    if tmpdir:
+        tmpdir.cleanup()
+    return results
+
+
+def describe_backend(database_url: str) -> str:
+    """Storage backend label printed with every benchmark, so runs on each backend can be compared"""
+    if not is_sqlite(database_url):
+        return database_url.split("://", 1)[0]
+    if is_memory_sqlite(database_url):
+        # runtime, startup and load swap this for a temporary file that their threads can share
+        return "sqlite (in memory, or a temporary WAL file for multi-threaded benchmarks)"
+    return f"sqlite (WAL, synchronous={SQLITE_SYNCHRONOUS})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="slack_read_confirm benchmarks")
+    parser.add_argument("--database-url", default="sqlite://", help="Database to benchmark against (default: in-memory SQLite)")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    fanout = sub.add_parser("fanout", help="Announcement + target creation latency")
+    fanout.add_argument("--sizes", type=int, nargs="+", default=FANOUT_SIZES)
+    runtime = sub.add_parser("runtime", help="Sync vs asyncio reaction throughput (needs aiosqlite/asyncpg)")
+    runtime.add_argument("--events", type=int, default=2000)
+    runtime.add_argument("--concurrency", type=int, default=10)
+    stagger = sub.add_parser("stagger", help="Reminder sends per minute under each scheduling policy")
+    stagger.add_argument("--users", type=int, default=10000)
+    stagger.add_argument("--jitter-minutes", type=int, default=None, help="Default: REMINDER_JITTER_MINUTES")
+    stagger.add_argument("--histogram", action="store_true", help="Print the per-minute histogram with jitter")
+    startup = sub.add_parser("startup", help="Cold start time of the app, phase by phase")
+    startup.add_argument("--runs", type=int, default=5)
+    tokenize = sub.add_parser("tokenize", help="Mention parsing throughput on a large pasted message")
+    tokenize.add_argument("--mentions", type=int, default=5000)
+    tokenize.add_argument("--runs", type=int, default=20)
+    load = sub.add_parser("load", help="Replay synthetic Slack events through the Bolt listeners")
+    load.add_argument("workload", choices=["reactions", "commands", "mentions"])
+    load.add_argument("--events", type=int, default=200)
+    load.add_argument("--targets", type=int, default=100, help="Targets per announcement (user mentions for commands)")
+    load.add_argument("--group-size", type=int, default=0, help="Members of the usergroup mentioned by commands")
+    load.add_argument("--rate", type=float, default=0.0, help="Arrivals per second (default: back to back)")
+    load.add_argument("--save", metavar="PATH", help="Write the results as a JSON baseline")
+    load.add_argument("--compare", metavar="PATH", help="Fail if worse than this JSON baseline")
+    load.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression as a fraction (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    if args.benchmark not in ("stagger", "tokenize"):
+        print(f"Backend: {describe_backend(args.database_url)}")
+    if args.benchmark == "fanout":
+        bench_fanout(args.database_url, args.sizes)
+    elif args.benchmark == "runtime":
+        bench_runtime(args.database_url, args.events, args.concurrency)
+    elif args.benchmark == "stagger":
+        bench_stagger(args.users, args.jitter_minutes, args.histogram)
+    elif args.benchmark == "startup":
+        bench_startup(args.database_url, args.runs)
+    elif args.benchmark == "tokenize":
+        bench_tokenize(args.mentions, args.runs)
+    elif args.benchmark == "load":
+        bench_load(args.database_url, args.workload, args.events, args.targets, args.group_size, args.rate,
+                   args.save, args.compare, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
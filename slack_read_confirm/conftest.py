@@ -0,0 +1,20 @@
+"""
+Tests run against a throwaway SQLite database unless TEST_DATABASE_URL is set
+    TEST_DATABASE_URL=postgresql://localhost:5432/slack_read_confirm_test pytest slack_read_confirm
+"""
+import os
+import shutil
+import tempfile
+
+# Set before any test module imports models.py, which reads DATABASE_URL once
+_tmpdir = None
+if os.environ.get("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+else:
+    _tmpdir = tempfile.mkdtemp(prefix="slack_read_confirm_test_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+
+
+def pytest_unconfigure(config):
+    if _tmpdir:
+        shutil.rmtree(_tmpdir, ignore_errors=True)
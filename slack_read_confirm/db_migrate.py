@@ -1,16 +1,104 @@
 import os
 import sys
 
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy_utils import create_database, database_exists
 
 from .models import Base, engine
 
+# Collapse rows that would violate the unique lookup indexes. Children are
+# re-pointed at the surviving (lowest id) parent before duplicates are deleted.
+DEDUPLICATE_STATEMENTS = [
+    """UPDATE targets SET announcement_id = (
+           SELECT MIN(a2.id) FROM announcements a1
+           JOIN announcements a2 ON a1.channel_id = a2.channel_id AND a1.message_ts = a2.message_ts
+           WHERE a1.id = targets.announcement_id)""",
+    "DELETE FROM announcements WHERE id NOT IN (SELECT MIN(id) FROM announcements GROUP BY channel_id, message_ts)",
+    """UPDATE read_receipts SET target_id = (
+           SELECT MIN(t2.id) FROM targets t1
+           JOIN targets t2 ON t1.announcement_id = t2.announcement_id AND t1.user_id = t2.user_id
+           WHERE t1.id = read_receipts.target_id)""",
+    "DELETE FROM targets WHERE id NOT IN (SELECT MIN(id) FROM targets GROUP BY announcement_id, user_id)",
+    "DELETE FROM read_receipts WHERE id NOT IN (SELECT MIN(id) FROM read_receipts GROUP BY target_id)",
+]
+
+# Backfill the denormalized announcement counters from the detail tables
+BACKFILL_COUNTERS_STATEMENTS = [
+    """UPDATE announcements SET
+           target_count = (SELECT COUNT(*) FROM targets WHERE targets.announcement_id = announcements.id),
+           read_count = (SELECT COUNT(*) FROM read_receipts
+                         JOIN targets ON targets.id = read_receipts.target_id
+                         WHERE targets.announcement_id = announcements.id)""",
+    """UPDATE announcements SET completed_at = CURRENT_TIMESTAMP
+       WHERE completed_at IS NULL AND target_count > 0 AND read_count >= target_count""",
+]
+
+# Rebuild the per owner and channel totals served by `/read-confirm status`
+BACKFILL_CHANNEL_STATS_STATEMENTS = [
+    "DELETE FROM channel_stats",
+    """INSERT INTO channel_stats (owner_id, channel_id, announcement_count, target_count, read_count, completed_count)
+       SELECT owner_id, channel_id, COUNT(*), SUM(target_count), SUM(read_count), COUNT(completed_at)
+       FROM announcements GROUP BY owner_id, channel_id""",
+]
+
+
+def add_missing_columns():
+    """Add columns introduced since the tables were created; returns the names added"""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def backfill_counters():
+    """Recompute the announcement counters and completion markers"""
+    with engine.begin() as conn:
+        for statement in BACKFILL_COUNTERS_STATEMENTS:
+            conn.execute(text(statement))
+
+
+def backfill_channel_stats():
+    """Recompute channel_stats from the announcement counters"""
+    with engine.begin() as conn:
+        for statement in BACKFILL_CHANNEL_STATS_STATEMENTS:
+            conn.execute(text(statement))
+
+
+def missing_indexes():
+    """Model indexes the database does not have yet"""
+    inspector = inspect(engine)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def create_indexes():
+    """Add the unique lookup indexes to tables created before they existed; returns the names created"""
+    missing = missing_indexes()
+    with engine.begin() as conn:
+        # Duplicates can only exist where a unique index is missing; skip the full-table rewrites otherwise
+        if any(index.unique for index in missing):
+            for statement in DEDUPLICATE_STATEMENTS:
+                conn.execute(text(statement))
+        for index in missing:
+            index.create(bind=conn)
+    return [index.name for index in missing]
+
 
 def create_tables():
     """Create all database tables"""
     db_url = os.environ.get("DATABASE_URL", "postgresql://localhost:5432/slack_read_confirm")
-    
+
     # Create the database if it doesn't exist
     if not database_exists(db_url):
         print(f"Creating database at {db_url}")
@@ -19,11 +107,25 @@ def create_tables():
         except Exception as e:
             print(f"Error creating database: {e}")
             sys.exit(1)
-    
+
     # Create tables
     print(f"Creating tables in database {db_url}")
+    had_channel_stats = inspect(engine).has_table("channel_stats")
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully!")
 
+    # Upgrade tables created by earlier versions
+    added = add_missing_columns()
+    for name in added:
+        print(f"Added column {name}")
+    for name in create_indexes():
+        print(f"Created index {name}")
+    if "announcements.read_count" in added:
+        print("Backfilling announcement counters")
+        backfill_counters()
+    if not had_channel_stats:
+        print("Backfilling channel stats")
+        backfill_channel_stats()
+
 if __name__ == "__main__":
     create_tables()
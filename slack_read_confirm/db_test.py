@@ -8,7 +8,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 from sqlalchemy import inspect
 
-from .models import Announcement, Base, ReadReceipt, SessionLocal, Target, engine
+from .models import Announcement, Base, ReadReceipt, Target, engine, session_scope
 
 # Load environment variables
 load_dotenv()
@@ -42,79 +42,73 @@ def check_tables_exist():
 
 def create_and_verify_test_data():
     """Create test data and verify it was persisted"""
-    db = SessionLocal()
-    
-    # Create a test announcement with a unique identifier
-    test_id = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    test_text = f"Test announcement {test_id}"
-    
-    print(f"Creating test announcement with text: '{test_text}'")
-    
-    # Create announcement
-    ann = Announcement(
-        owner_id="U_TEST",
-        channel_id="C_TEST",
-        message_ts=f"{test_id}.123456",
-        text=test_text
-    )
-    db.add(ann)
-    db.commit()
-    db.refresh(ann)
-    announcement_id = ann.id
-    print(f"✅ Created announcement with ID: {announcement_id}")
-    
-    # Create target
-    tgt = Target(
-        announcement_id=announcement_id,
-        user_id="U_TARGET_TEST"
-    )
-    db.add(tgt)
-    db.commit()
-    db.refresh(tgt)
-    target_id = tgt.id
-    print(f"✅ Created target with ID: {target_id}")
-    
-    # Create read receipt
-    receipt = ReadReceipt(
-        target_id=target_id,
-        timestamp=datetime.utcnow()
-    )
-    db.add(receipt)
-    db.commit()
-    db.refresh(receipt)
-    receipt_id = receipt.id
-    print(f"✅ Created read receipt with ID: {receipt_id}")
-    
-    # Close the session
-    db.close()
+    with session_scope() as db:
+        # Create a test announcement with a unique identifier
+        test_id = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        test_text = f"Test announcement {test_id}"
+    
+        print(f"Creating test announcement with text: '{test_text}'")
+    
+        # Create announcement
+        ann = Announcement(
+            owner_id="U_TEST",
+            channel_id="C_TEST",
+            message_ts=f"{test_id}.123456",
+            text=test_text
+        )
+        db.add(ann)
+        db.commit()
+        db.refresh(ann)
+        announcement_id = ann.id
+        print(f"✅ Created announcement with ID: {announcement_id}")
+    
+        # Create target
+        tgt = Target(
+            announcement_id=announcement_id,
+            user_id="U_TARGET_TEST"
+        )
+        db.add(tgt)
+        db.commit()
+        db.refresh(tgt)
+        target_id = tgt.id
+        print(f"✅ Created target with ID: {target_id}")
+    
+        # Create read receipt
+        receipt = ReadReceipt(
+            target_id=target_id,
+            timestamp=datetime.utcnow()
+        )
+        db.add(receipt)
+        db.commit()
+        db.refresh(receipt)
+        receipt_id = receipt.id
+        print(f"✅ Created read receipt with ID: {receipt_id}")
+    
     
     # Open a new session to verify data was persisted
     print("\nVerifying data persistence...")
-    db = SessionLocal()
-    
-    # Verify announcement
-    saved_ann = db.query(Announcement).filter_by(id=announcement_id).first()
-    if saved_ann and saved_ann.text == test_text:
-        print(f"✅ Successfully retrieved announcement with ID {announcement_id}")
-    else:
-        print(f"❌ Failed to retrieve announcement with ID {announcement_id}")
-    
-    # Verify target
-    saved_tgt = db.query(Target).filter_by(id=target_id).first()
-    if saved_tgt and saved_tgt.announcement_id == announcement_id:
-        print(f"✅ Successfully retrieved target with ID {target_id}")
-    else:
-        print(f"❌ Failed to retrieve target with ID {target_id}")
-    
-    # Verify read receipt
-    saved_receipt = db.query(ReadReceipt).filter_by(id=receipt_id).first()
-    if saved_receipt and saved_receipt.target_id == target_id:
-        print(f"✅ Successfully retrieved read receipt with ID {receipt_id}")
-    else:
-        print(f"❌ Failed to retrieve read receipt with ID {receipt_id}")
+    with session_scope() as db:
+        # Verify announcement
+        saved_ann = db.query(Announcement).filter_by(id=announcement_id).first()
+        if saved_ann and saved_ann.text == test_text:
+            print(f"✅ Successfully retrieved announcement with ID {announcement_id}")
+        else:
+            print(f"❌ Failed to retrieve announcement with ID {announcement_id}")
+    
+        # Verify target
+        saved_tgt = db.query(Target).filter_by(id=target_id).first()
+        if saved_tgt and saved_tgt.announcement_id == announcement_id:
+            print(f"✅ Successfully retrieved target with ID {target_id}")
+        else:
+            print(f"❌ Failed to retrieve target with ID {target_id}")
+    
+        # Verify read receipt
+        saved_receipt = db.query(ReadReceipt).filter_by(id=receipt_id).first()
+        if saved_receipt and saved_receipt.target_id == target_id:
+            print(f"✅ Successfully retrieved read receipt with ID {receipt_id}")
+        else:
+            print(f"❌ Failed to retrieve read receipt with ID {receipt_id}")
     
-    # Close the session
-    db.close()
     
     # Return True if all verifications passed
     return saved_ann and saved_tgt and saved_receipt
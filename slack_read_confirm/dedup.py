@@ -0,0 +1,91 @@
+"""Drop redelivered events and repeated checkmarks before they reach the database"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from slack_bolt import BoltResponse
+
+from . import metrics
+
+# Slack retries an unacknowledged event for a few minutes
+EVENT_DEDUP_TTL = float(os.environ.get("EVENT_DEDUP_TTL", "600"))
+EVENT_DEDUP_SIZE = int(os.environ.get("EVENT_DEDUP_SIZE", "100000"))
+
+
+class SeenCache:
+    """Bounded set of recently seen keys that expire after `ttl` seconds.
+
+    Every entry lives for the same ttl, so insertion order is expiry order
+    and expired entries are popped from the front.
+    """
+
+    def __init__(self, ttl: float = EVENT_DEDUP_TTL, max_size: int = EVENT_DEDUP_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def seen(self, key) -> bool:
+        """True if `key` was seen within the ttl; otherwise remember it and return False"""
+        now = time.monotonic()
+        with self._lock:
+            while self._expires and next(iter(self._expires.values())) <= now:
+                self._expires.popitem(last=False)
+            if key in self._expires:
+                self.duplicates += 1
+                return True
+            self._expires[key] = now + self.ttl
+            if len(self._expires) > self.max_size:
+                self._expires.popitem(last=False)
+            return False
+
+    def forget(self, key):
+        """Let `key` through again, e.g. after the work it guarded failed"""
+        with self._lock:
+            self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+            self.duplicates = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._expires), "duplicates": self.duplicates}
+
+
+# Events redelivered by Slack, keyed by event_id
+seen_events = SeenCache()
+# Checkmarks by the same user on the same message (toggles, or both check emoji)
+seen_reactions = SeenCache()
+
+
+def _duplicate_event(body) -> bool:
+    event_id = body.get("event_id")
+    return event_id is not None and seen_events.seen(event_id)
+
+
+def dedup_middleware(body, next):
+    """Bolt global middleware acknowledging redelivered events without running listeners"""
+    if _duplicate_event(body):
+        return BoltResponse(status=200, body="")
+    return next()
+
+
+async def async_dedup_middleware(body, next):
+    if _duplicate_event(body):
+        return BoltResponse(status=200, body="")
+    return await next()
+
+
+def _collect():
+    samples = []
+    for kind, cache in (("event", seen_events), ("reaction", seen_reactions)):
+        samples.extend(({"kind": kind, "stat": key}, value) for key, value in cache.stats().items())
+    return metrics.gauge_lines("dedup_cache", "Duplicate events and reactions dropped before any DB work", samples)
+
+
+metrics.registry.register_collector(_collect)
@@ -0,0 +1,285 @@
+"""Rate-limited dispatcher for outbound Slack Web API calls"""
+
+import logging
+import os
+import queue
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from slack_sdk.errors import SlackApiError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Published Slack rate-limit tiers, in calls per minute
+TIER_RATES = {
+    "tier1": 1,
+    "tier2": 20,
+    "tier3": 50,
+    "tier4": 100,
+    # chat.postMessage is "special": ~1/sec per channel plus a workspace-wide cap
+    "post_message": int(os.environ.get("SLACK_POST_MESSAGE_PER_MINUTE", "600")),
+}
+METHOD_TIERS = {
+    "chat_postMessage": "post_message",
+    "chat_postEphemeral": "tier4",
+    "usergroups_users_list": "tier2",
+    "users_info": "tier4",
+    "users_list": "tier2",
+    "reactions_get": "tier3",
+}
+DEFAULT_TIER = "tier3"
+# Per-channel limit applied on top of the post_message tier
+CHANNEL_POSTS_PER_MINUTE = 60
+MAX_CHANNEL_BUCKETS = 10000
+
+# Worker threads per rate-limit tier
+DISPATCH_WORKERS = int(os.environ.get("SLACK_DISPATCH_WORKERS", "4"))
+MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", "5"))
+# Seconds a user-facing path waits on a call before telling the user to retry
+SLACK_CALL_TIMEOUT = float(os.environ.get("SLACK_CALL_TIMEOUT", "15"))
+
+# Queue priorities within a tier: replies to users go ahead of sweeps
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        # Allow bursts of roughly ten seconds' worth of calls
+        self.capacity = capacity if capacity is not None else max(1.0, per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (used when Slack answers 429)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            # Resume with a single probe call rather than a full burst
+            self._tokens = min(self._tokens, 1.0)
+
+
+class Dispatcher:
+    """Outbound API calls drained under tier rate limits, one queue and worker pool per tier.
+
+    A paused or saturated tier (a reminder wave, a 429 on users.list) only
+    holds its own workers; calls in other tiers keep flowing. Within a tier,
+    INTERACTIVE calls (replies to a user) go ahead of BACKGROUND ones.
+
+    Calls that hit a 429 are retried after Slack's Retry-After plus jitter, and
+    the whole tier is paused meanwhile so other workers don't pile on.
+    """
+
+    def __init__(self, workers: int = DISPATCH_WORKERS, max_retries: int = MAX_RETRIES,
+                 tier_rates=None, channel_rate: float = CHANNEL_POSTS_PER_MINUTE, jitter: float = 1.0):
+        self.workers = workers
+        self.channel_rate = channel_rate
+        self.max_retries = max_retries
+        self.jitter = jitter
+        self._buckets = {tier: TokenBucket(rate) for tier, rate in (tier_rates or TIER_RATES).items()}
+        self._channel_buckets = OrderedDict()
+        self._queues = {}
+        self._threads = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Notified whenever a call finishes, for join() and drain()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {tier: 0 for tier in self._buckets}
+        self._in_flight = 0
+        self._counters = {"sent": 0, "retried": 0, "rate_limited": 0, "failed": 0}
+
+    def set_rates(self, tier_rates, channel_rate: float = None):
+        """Replace the tier (and optionally per-channel) limits, e.g. to lift them for benchmarks"""
+        with self._lock:
+            self._buckets.update({tier: TokenBucket(rate) for tier, rate in tier_rates.items()})
+            for tier in self._buckets:
+                self._pending.setdefault(tier, 0)
+            if channel_rate is not None:
+                self.channel_rate = channel_rate
+                self._channel_buckets.clear()
+
+    def _tier(self, method: str) -> str:
+        tier = METHOD_TIERS.get(method, DEFAULT_TIER)
+        return tier if tier in self._buckets else DEFAULT_TIER
+
+    def _tier_queue(self, tier: str) -> queue.PriorityQueue:
+        """The tier's queue, starting its workers on first use"""
+        with self._lock:
+            if tier not in self._queues:
+                self._queues[tier] = queue.PriorityQueue()
+                self._threads[tier] = []
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._work, args=(tier,), name=f"slack-dispatch-{tier}-{i}",
+                                              daemon=True)
+                    thread.start()
+                    self._threads[tier].append(thread)
+            return self._queues[tier]
+
+    def submit(self, client, method: str, priority: int = INTERACTIVE, **kwargs) -> Future:
+        """Enqueue `client.<method>(**kwargs)`; the returned future resolves to the response"""
+        future = Future()
+        tier = self._tier(method)
+        tier_queue = self._tier_queue(tier)
+        with self._lock:
+            self._pending[tier] += 1
+        # The sequence number keeps calls of equal priority in FIFO order
+        tier_queue.put((priority, next(self._sequence), future, client, method, kwargs))
+        return future
+
+    def call(self, client, method: str, timeout: float = None, priority: int = INTERACTIVE, **kwargs):
+        """Enqueue a call and wait for its response.
+
+        Raises concurrent.futures.TimeoutError after `timeout` seconds; the call
+        is then cancelled unless it is already being sent.
+        """
+        future = self.submit(client, method, priority=priority, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def _channel_bucket(self, channel: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._channel_buckets.pop(channel, None) or TokenBucket(self.channel_rate, capacity=1)
+            self._channel_buckets[channel] = bucket
+            if len(self._channel_buckets) > MAX_CHANNEL_BUCKETS:
+                self._channel_buckets.popitem(last=False)
+            return bucket
+
+    def _work(self, tier: str):
+        tier_queue = self._queues[tier]
+        while True:
+            _, _, future, client, method, kwargs = tier_queue.get()
+            with self._lock:
+                self._pending[tier] -= 1
+                self._in_flight += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self._send(client, method, tier, kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+
+    def _send(self, client, method: str, tier: str, kwargs):
+        attempt = 0
+        while True:
+            self._buckets[tier].acquire()
+            if tier == "post_message" and "channel" in kwargs:
+                self._channel_bucket(kwargs["channel"]).acquire()
+            start = time.perf_counter()
+            try:
+                response = getattr(client, method)(**kwargs)
+                self._count("sent")
+                self._observe(method, start)
+                return response
+            except SlackApiError as e:
+                self._observe(method, start, error=e.response.get("error") or str(e.response.status_code))
+                if e.response.status_code != 429 or attempt >= self.max_retries:
+                    self._count("failed")
+                    logger.error(f"Slack {method} failed: {e}")
+                    raise
+                headers = e.response.headers or {}
+                retry_after = float(headers.get("Retry-After", headers.get("retry-after", 1)))
+                self._count("rate_limited")
+                self._buckets[tier].pause(retry_after)
+                delay = retry_after + random.uniform(0, self.jitter)
+            except OSError as e:
+                self._observe(method, start, error=type(e).__name__)
+                if attempt >= self.max_retries:
+                    self._count("failed")
+                    logger.error(f"Slack {method} failed: {e}")
+                    raise
+                delay = min(30.0, 2 ** attempt) + random.uniform(0, self.jitter)
+            attempt += 1
+            self._count("retried")
+            time.sleep(delay)
+
+    def _observe(self, method: str, start: float, error: str = None):
+        if not metrics.enabled:
+            return
+        metrics.SLACK_API_SECONDS.observe(time.perf_counter() - start, method=method)
+        if error:
+            metrics.SLACK_API_ERRORS.inc(method=method, error=error)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        """Queue depth per tier, in-flight calls and outcome counters"""
+        with self._lock:
+            return {
+                "queue_depth": sum(self._pending.values()),
+                "queue_depth_by_tier": dict(self._pending),
+                "in_flight": self._in_flight,
+                **self._counters,
+            }
+
+    def join(self):
+        """Block until every queued call has completed"""
+        self.drain()
+
+    def drain(self, timeout: float = None) -> bool:
+        """Like join(), but give up after `timeout`; returns False if calls were still queued.
+
+        The dispatcher stays usable: calls submitted meanwhile are sent too.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight or any(self._pending.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+# Process-wide dispatcher shared by handlers and scheduled jobs
+dispatcher = Dispatcher()
+
+
+def _collect():
+    stats = dispatcher.stats()
+    lines = metrics.gauge_lines("slack_dispatch_queue_depth", "Outbound calls waiting per rate-limit tier",
+                                [({"tier": tier}, depth) for tier, depth in stats["queue_depth_by_tier"].items()])
+    lines += metrics.gauge_lines("slack_dispatch_in_flight", "Outbound calls being sent", [({}, stats["in_flight"])])
+    lines += metrics.gauge_lines("slack_dispatch_calls", "Outbound call outcomes since start",
+                                 [({"outcome": key}, stats[key]) for key in ("sent", "retried", "rate_limited", "failed")])
+    return lines
+
+
+metrics.registry.register_collector(_collect)
@@ -0,0 +1,97 @@
+"""
+Local stand-in for the Slack Web API, for tests and benchmarks
+
+    with FakeSlackServer() as server:
+        server.rate_limit("chat.postMessage", times=2, retry_after=0)
+        client = WebClient(token="xoxb-test", base_url=server.base_url)
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeSlackServer:
+    """Serves /api/<method> with canned or scripted responses and records every call"""
+
+    def __init__(self):
+        self.calls = []
+        self._handlers = {}
+        self._rate_limits = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def on(self, method: str, handler):
+        """Answer `method` (e.g. "reactions.get") with handler(params) -> response dict"""
+        self._handlers[method] = handler
+
+    def rate_limit(self, method: str, times: int, retry_after: float = 1):
+        """Answer the next `times` calls to `method` with HTTP 429"""
+        self._rate_limits[method] = (times, retry_after)
+
+    def calls_to(self, method: str):
+        with self._lock:
+            return [params for name, params in self.calls if name == method]
+
+    def _respond(self, method: str, params: dict):
+        with self._lock:
+            self.calls.append((method, params))
+            times, retry_after = self._rate_limits.get(method, (0, 0))
+            if times > 0:
+                self._rate_limits[method] = (times - 1, retry_after)
+                return 429, {"ok": False, "error": "ratelimited"}, {"Retry-After": str(retry_after)}
+        handler = self._handlers.get(method)
+        body = handler(params) if handler else {"ok": True, "ts": "1234567890.000001"}
+        return 200, body, {}
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(raw or "{}")
+                else:
+                    params = dict(parse_qsl(raw))
+                self.reply(self.path.rsplit("/", 1)[-1], params)
+
+            def do_GET(self):
+                # Read methods such as reactions.get send their arguments in the query string
+                url = urlsplit(self.path)
+                self.reply(url.path.rsplit("/", 1)[-1], dict(parse_qsl(url.query)))
+
+            def reply(self, method, params):
+                status, body, headers = fake._respond(method, params)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,120 @@
+"""Process-local index of open announcements and the targets yet to confirm them"""
+
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import select
+
+from . import metrics
+from .models import Announcement, ReadReceipt, Target
+
+LOAD_BATCH_SIZE = 5000
+# With several replicas, announcements created elsewhere only arrive on reload
+MULTI_REPLICA = os.environ.get("MULTI_REPLICA", "false").lower() in ("1", "true", "yes")
+OPEN_INDEX_REFRESH_SECONDS = float(os.environ.get("OPEN_INDEX_REFRESH_SECONDS", "30"))
+# Messages posted this close to (or after) the last load may not be in it yet
+FRESHNESS_MARGIN_SECONDS = 60
+
+
+class OpenAnnouncementIndex:
+    """Maps (channel_id, message_ts) to the set of user ids that have not read it.
+
+    Ids are interned, so a user targeted by many announcements is stored once,
+    and entries hold plain strings and sets rather than ORM objects. Until
+    load() has run every lookup answers "maybe" so callers fall back to the DB.
+
+    When `shared`, other replicas also create announcements, so unknown
+    messages newer than the last load are answered "maybe" too.
+    """
+
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.dropped = 0
+
+    def load(self, db):
+        """Rebuild the index from the unread targets of open announcements"""
+        started = time.time()
+        stmt = (select(Announcement.channel_id, Announcement.message_ts, Target.user_id)
+                .join(Target, Target.announcement_id == Announcement.id)
+                .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+                .where(Announcement.completed_at.is_(None), ReadReceipt.id.is_(None)))
+        pending = {}
+        result = db.execute(stmt, execution_options={"stream_results": True})
+        for batch in result.partitions(LOAD_BATCH_SIZE):
+            for channel_id, message_ts, user_id in batch:
+                key = (sys.intern(channel_id), sys.intern(message_ts))
+                pending.setdefault(key, set()).add(sys.intern(user_id))
+        with self._lock:
+            self._pending = pending
+            self.loaded = True
+            self.loaded_at = started
+
+    def add(self, channel_id: str, message_ts: str, user_ids):
+        key = (sys.intern(channel_id), sys.intern(message_ts))
+        users = {sys.intern(uid) for uid in user_ids}
+        with self._lock:
+            self._pending.setdefault(key, set()).update(users)
+
+    def might_be_pending(self, channel_id: str, message_ts: str, user_id: str) -> bool:
+        """False only when the reaction certainly needs no DB work"""
+        with self._lock:
+            if not self.loaded:
+                return True
+            users = self._pending.get((channel_id, message_ts))
+            if users is not None and user_id in users:
+                self.hits += 1
+                return True
+            if users is None and self.shared and self._maybe_unseen(message_ts):
+                return True
+            self.dropped += 1
+            return False
+
+    def _maybe_unseen(self, message_ts: str) -> bool:
+        try:
+            return float(message_ts) >= self.loaded_at - FRESHNESS_MARGIN_SECONDS
+        except ValueError:
+            return True
+
+    def discard(self, channel_id: str, message_ts: str, user_id: str):
+        """Forget a target once its receipt is stored"""
+        key = (channel_id, message_ts)
+        with self._lock:
+            users = self._pending.get(key)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._pending[key]
+
+    def remove(self, channel_id: str, message_ts: str):
+        """Forget a completed (or archived) announcement"""
+        with self._lock:
+            self._pending.pop((channel_id, message_ts), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "announcements": len(self._pending),
+                "targets": sum(len(users) for users in self._pending.values()),
+                "hits": self.hits,
+                "dropped": self.dropped,
+            }
+
+
+# Process-wide index used by the reaction listener
+open_index = OpenAnnouncementIndex(shared=MULTI_REPLICA)
+
+
+def _collect():
+    stats = open_index.stats()
+    return metrics.gauge_lines("open_announcement_index", "Open announcement index size, hits and dropped reactions",
+                               [({"stat": key}, value) for key, value in stats.items()])
+
+
+metrics.registry.register_collector(_collect)
@@ -0,0 +1,156 @@
+"""Bounded background job queues, so listeners can ack and return immediately"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import LatencyHistogram, gauge_lines, histogram_lines, registry
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "100"))
+# Seconds submit() waits for queue space before rejecting the job
+JOB_SUBMIT_TIMEOUT = float(os.environ.get("JOB_SUBMIT_TIMEOUT", "1.0"))
+
+
+class JobRejected(Exception):
+    """Raised when a queue is full (backpressure) or already draining"""
+
+
+class JobQueue:
+    """Fixed pool of worker threads fed by a bounded queue.
+
+    Listener arguments (the Bolt client, logger) are not picklable, so the
+    pool uses threads; the work it runs is I/O bound (Slack and DB calls).
+    """
+
+    def __init__(self, name: str, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_SIZE,
+                 submit_timeout: float = JOB_SUBMIT_TIMEOUT):
+        self.name = name
+        self.workers = workers
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._running = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0}
+        self.wait_latency = LatencyHistogram()
+        self.run_latency = LatencyHistogram()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs); raises JobRejected if no space frees up in time"""
+        if self._closed:
+            raise JobRejected(f"{self.name} queue is draining")
+        future = Future()
+        self._ensure_started()
+        try:
+            self._queue.put((future, time.monotonic(), fn, args, kwargs), timeout=self.submit_timeout)
+        except queue.Full:
+            self._count("rejected")
+            raise JobRejected(f"{self.name} queue is full")
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            future, enqueued, fn, args, kwargs = item
+            started = time.monotonic()
+            self.wait_latency.observe(started - enqueued)
+            with self._lock:
+                self._running += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                        self._count("completed")
+                    except Exception as e:
+                        logger.exception(f"{self.name} job {getattr(fn, '__name__', fn)} failed")
+                        future.set_exception(e)
+                        self._count("failed")
+            finally:
+                self.run_latency.observe(time.monotonic() - started)
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def join(self):
+        """Block until every queued job has finished"""
+        self._queue.join()
+
+    def drain(self, timeout: float = None) -> bool:
+        """Stop accepting jobs, finish the queued ones and stop the workers.
+
+        Returns False if the workers were still busy when `timeout` ran out.
+        """
+        self._closed = True
+        with self._lock:
+            threads = list(self._threads)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        # One sentinel per worker, queued behind the outstanding jobs. A full queue
+        # only makes room as jobs finish, so give up at the deadline like the joins do.
+        for _ in threads:
+            try:
+                self._queue.put(None, timeout=remaining())
+            except queue.Full:
+                logger.warning(f"{self.name} queue still full at the drain deadline")
+                break
+        for thread in threads:
+            thread.join(remaining())
+        return not any(thread.is_alive() for thread in threads)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "running": self._running,
+                **self._counters,
+                "wait_seconds": self.wait_latency.snapshot(),
+                "run_seconds": self.run_latency.snapshot(),
+            }
+
+
+# Queues for listener work handed off after ack()
+command_queue = JobQueue("commands")
+mention_queue = JobQueue("mentions")
+
+
+def _collect():
+    queues = [(jobs.name, jobs.stats()) for jobs in (command_queue, mention_queue)]
+    lines = []
+    for key, help_text in (("pending", "Jobs waiting for a worker"),
+                           ("running", "Jobs currently running"),
+                           ("completed", "Jobs completed since start"),
+                           ("failed", "Jobs that raised since start"),
+                           ("rejected", "Jobs rejected by backpressure since start")):
+        lines += gauge_lines(f"job_queue_{key}", help_text, [({"queue": name}, stats[key]) for name, stats in queues])
+    for key, help_text in (("wait_seconds", "Time jobs spent queued"), ("run_seconds", "Time jobs spent running")):
+        lines += histogram_lines(f"job_queue_{key}", help_text, [({"queue": name}, stats[key]) for name, stats in queues])
+    return lines
+
+
+registry.register_collector(_collect)
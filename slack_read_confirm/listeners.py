@@ -0,0 +1,175 @@
+"""Bolt listeners for the sync runtime; the jobs they queue run on jobs.py worker threads"""
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from . import metrics
+from .announcements import create_announcement, record_receipt
+from .dedup import dedup_middleware, seen_reactions
+from .dispatcher import SLACK_CALL_TIMEOUT, dispatcher
+from .hot_index import open_index
+from .jobs import JobRejected, command_queue, mention_queue
+from .models import session_scope
+from .parsing import parse_command_text, parse_mention_text, split_subcommand
+from .receipt_buffer import RECEIPT_WRITE_BEHIND, receipt_buffer
+from .report import status_text
+from .usergroups import usergroup_cache
+
+
+@metrics.timed("/read-confirm")
+def handle_read_confirm_command(ack, body, client, logger):
+    ack()
+    # Do the slow work (group expansion, posting, DB writes) off the listener thread
+    try:
+        command_queue.submit(process_read_confirm_command, body, client, logger)
+    except JobRejected as e:
+        logger.warning(f"Dropping /read-confirm: {e}")
+        dispatcher.submit(client, "chat_postEphemeral", channel=body["channel_id"], user=body["user_id"],
+                          text="I'm busy right now, please try again in a moment.")
+
+@metrics.timed("read_confirm_job")
+def process_read_confirm_command(body, client, logger):
+    owner_id = body["user_id"]
+    channel_id = body["channel_id"]
+    text = body.get("text", "").strip()
+
+    subcommand, args = split_subcommand(text)
+    if subcommand == "status":
+        reply_status(client, owner_id, channel_id, args)
+        return
+
+    targets, error = announce(client, owner_id, channel_id, parse_command_text(text))
+    if error:
+        dispatcher.submit(client, "chat_postEphemeral", channel=channel_id, user=owner_id, text=error)
+        return
+
+    dispatcher.submit(client, "chat_postEphemeral", channel=channel_id, user=owner_id, text=(f"Announcement created. Targets: {', '.join(f'<@{u}>' for u in targets)}"))
+
+def announce(client, owner_id, channel_id, parsed):
+    """Expand groups, then post and store the announcement with its targets.
+
+    Shared by the command and mention paths. Returns (targets, None), or
+    (None, message) when there is nothing to announce.
+    """
+    user_ids = list(parsed.user_ids)
+    for members in usergroup_cache.get_members(client, parsed.group_ids).values():
+        user_ids.extend(members)
+
+    targets = list({uid for uid in user_ids if uid != owner_id})
+    if not targets:
+        return None, "Mention at least one user or group."
+
+    if not parsed.text:
+        return None, "Provide announcement text after mentions."
+
+    # Post announcement
+    try:
+        post = dispatcher.call(client, "chat_postMessage", timeout=SLACK_CALL_TIMEOUT, channel=channel_id,
+                               text=parsed.text)
+    except FutureTimeoutError:
+        return None, "Slack is slow to respond right now, please try again in a moment."
+    message_ts = post["ts"]
+
+    # Save announcement & targets in one transaction; the reminder sweep picks them up
+    with session_scope() as db:
+        create_announcement(db, owner_id, channel_id, message_ts, parsed.text, targets)
+    open_index.add(channel_id, message_ts, targets)
+    return targets, None
+
+def reply_status(client, owner_id, channel_id, args):
+    """Answer `/read-confirm status [id]` from the precomputed counters"""
+    with session_scope() as db:
+        text = status_text(db, owner_id, int(args) if args else None)
+    dispatcher.submit(client, "chat_postEphemeral", channel=channel_id, user=owner_id, text=text)
+
+@metrics.timed("reaction_added")
+def handle_reaction_added(event, client, logger):
+    reaction = event.get("reaction")
+    if reaction in ["white_check_mark", "heavy_check_mark"]:
+        user_id = event["user"]
+        item = event["item"]
+        channel_id = item["channel"]
+        message_ts = item["ts"]
+
+        # Most checkmarks are on ordinary messages or from non-targets
+        if not open_index.might_be_pending(channel_id, message_ts, user_id):
+            return
+        # Toggled or doubled checkmarks: only the first goes to the DB
+        key = (channel_id, message_ts, user_id)
+        if seen_reactions.seen(key):
+            return
+
+        if RECEIPT_WRITE_BEHIND:
+            # Batched with other reactions; the rest happens once the batch commits
+            future = receipt_buffer.add(channel_id, message_ts, user_id)
+            future.add_done_callback(lambda f: receipt_flushed(client, key, f, logger))
+            return
+        try:
+            with session_scope() as db:
+                result = record_receipt(db, channel_id, message_ts, user_id)
+        except Exception:
+            seen_reactions.forget(key)
+            raise
+        receipt_recorded(client, channel_id, message_ts, user_id, result)
+
+def receipt_flushed(client, key, future, logger):
+    try:
+        result = future.result()
+    except Exception as e:
+        seen_reactions.forget(key)
+        logger.error(f"Dropping receipt {key}: {e}")
+        return
+    receipt_recorded(client, *key, result)
+
+def receipt_recorded(client, channel_id, message_ts, user_id, result):
+    open_index.discard(channel_id, message_ts, user_id)
+    if result and result.completed:
+        open_index.remove(channel_id, message_ts)
+        # Everyone read: post celebration
+        dispatcher.submit(
+            client,
+            "chat_postMessage",
+            channel=channel_id,
+            text=":tada: Everyone has read this announcement!",
+            thread_ts=message_ts
+        )
+
+@metrics.timed("subteam_members_changed")
+def handle_subteam_members_changed(event, logger):
+    # Drop the cached membership; the next command re-fetches it
+    usergroup_cache.invalidate(event["subteam_id"])
+
+@metrics.timed("app_mention")
+def handle_app_mention(event, client, context, logger):
+    try:
+        mention_queue.submit(process_app_mention, event, client, logger, context.bot_user_id)
+    except JobRejected as e:
+        logger.warning(f"Dropping app_mention: {e}")
+
+@metrics.timed("app_mention_job")
+def process_app_mention(event, client, logger, bot_user_id=None):
+    user = event.get("user")
+    channel_id = event.get("channel")
+
+    # "@bot read-confirm @alice <!subteam^...> text" works like the slash command
+    parsed = parse_mention_text(event.get("text", ""), bot_user_id)
+    if parsed is None:
+        # Default response for other mentions
+        dispatcher.submit(client, "chat_postMessage", channel=channel_id, text=f"Hey <@{user}>! Use me to create read-confirm announcements. Just mention me with 'read-confirm', the people to notify and your message.")
+        return
+
+    targets, error = announce(client, user, channel_id, parsed)
+    if error:
+        dispatcher.submit(client, "chat_postMessage", channel=channel_id, text=f"<@{user}> {error} To create a read-confirm announcement, mention me with 'read-confirm', the people to notify and your message.")
+        return
+    dispatcher.submit(client, "chat_postMessage", channel=channel_id, text=f"<@{user}>, I've created your read-confirm announcement for {len(targets)} people. They can confirm by adding a ✅ reaction.")
+
+
+def register_listeners(app):
+    """Attach the middleware and listeners to a Bolt App"""
+    # Acknowledge redelivered events without running the listeners again
+    app.use(dedup_middleware)
+    app.command("/read-confirm")(handle_read_confirm_command)
+    app.event("reaction_added")(handle_reaction_added)
+    app.event("subteam_members_changed")(handle_subteam_members_changed)
+    app.event("app_mention")(handle_app_mention)
+    return app
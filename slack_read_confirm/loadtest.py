@@ -0,0 +1,246 @@
+"""
+Load tests: synthetic Slack event streams replayed through the real Bolt listeners
+
+Each payload goes through App.dispatch, so middleware, listener matching and
+the job queues all run as in production. Web API calls go to a local
+FakeSlackServer. Events are replayed one at a time and each one is timed until
+its queued jobs and outbound Slack calls have finished.
+    python -m slack_read_confirm.bench load reactions --targets 1000 --events 2000 --rate 200
+    python -m slack_read_confirm.bench load commands --group-size 500 --save baseline.json
+    python -m slack_read_confirm.bench load commands --group-size 500 --compare baseline.json
+"""
+import itertools
+import json
+import math
+import os
+import subprocess
+import tempfile
+import time
+
+from slack_bolt import App, BoltRequest
+from slack_sdk import WebClient
+from sqlalchemy import event
+
+from .announcements import create_announcement
+from .dedup import seen_events, seen_reactions
+from .dispatcher import CHANNEL_POSTS_PER_MINUTE, TIER_RATES, dispatcher
+from .fake_slack import FakeSlackServer
+from .hot_index import open_index
+from .jobs import command_queue, mention_queue
+from .listeners import register_listeners
+from .models import Base, SessionLocal, create_database_engine, engine as default_engine
+from .usergroups import usergroup_cache
+
+WORKLOADS = ("reactions", "commands", "mentions")
+# Compared against a baseline: metric -> True if a higher value is a regression
+BASELINE_METRICS = {"p50_ms": True, "p99_ms": True, "throughput": False, "queries_per_event": True}
+
+BOT_USER_ID = "U_BOT"
+OWNER_ID = "U_OWNER"
+CHANNEL_ID = "C_LOAD"
+GROUP_ID = "S_LOAD"
+SEED_TS = "1000000000.000001"
+# Effectively no client-side rate limiting; the fake server never answers 429
+UNLIMITED_PER_MINUTE = 60_000_000
+
+
+def _user_ids(count: int, prefix: str = "U"):
+    return [f"{prefix}{i:08d}" for i in range(count)]
+
+
+def _event_body(event_payload: dict, sequence: int) -> dict:
+    return {
+        "type": "event_callback",
+        "team_id": "T_LOAD",
+        "api_app_id": "A_LOAD",
+        "event": event_payload,
+        "event_id": f"Ev{sequence:010d}",
+        "event_time": int(time.time()),
+    }
+
+
+def reaction_payload(user_id: str, message_ts: str, sequence: int = 0) -> dict:
+    return _event_body({
+        "type": "reaction_added",
+        "user": user_id,
+        "reaction": "white_check_mark",
+        "item": {"type": "message", "channel": CHANNEL_ID, "ts": message_ts},
+        "event_ts": f"{time.time():.6f}",
+    }, sequence)
+
+
+def mention_payload(text: str, sequence: int = 0) -> dict:
+    return _event_body({
+        "type": "app_mention",
+        "user": OWNER_ID,
+        "text": text,
+        "channel": CHANNEL_ID,
+        "ts": f"{time.time():.6f}",
+        "event_ts": f"{time.time():.6f}",
+    }, sequence)
+
+
+def command_payload(text: str) -> dict:
+    return {
+        "command": "/read-confirm",
+        "text": text,
+        "user_id": OWNER_ID,
+        "channel_id": CHANNEL_ID,
+        "team_id": "T_LOAD",
+        "api_app_id": "A_LOAD",
+        "trigger_id": "0.0.0",
+        "response_url": "https://hooks.slack.com/commands/T_LOAD/0/0",
+    }
+
+
+def generate_payloads(workload: str, events: int, targets: int, group_size: int):
+    """The request bodies replayed for a workload"""
+    if workload == "reactions":
+        # Cycles through the seeded targets; once they have all confirmed,
+        # repeats exercise the already-read path
+        users = itertools.cycle(_user_ids(targets))
+        return [reaction_payload(next(users), SEED_TS, i) for i in range(events)]
+    if workload == "commands":
+        mentions = " ".join(f"<@{uid}>" for uid in _user_ids(targets))
+        group = f" <!subteam^{GROUP_ID}|load>" if group_size else ""
+        return [command_payload(f"{mentions}{group} Load test announcement {i}") for i in range(events)]
+    if workload == "mentions":
+        mentions = " ".join(f"<@{uid}>" for uid in _user_ids(targets))
+        return [mention_payload(f"<@{BOT_USER_ID}> read-confirm {mentions} Load test announcement {i}", i)
+                for i in range(events)]
+    raise ValueError(f"Unknown workload {workload!r}")
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _fake_slack(group_size: int) -> FakeSlackServer:
+    server = FakeSlackServer()
+    ts_counter = itertools.count(1)
+    group_members = _user_ids(group_size, prefix="W")
+    server.on("auth.test", lambda params: {"ok": True, "user_id": BOT_USER_ID, "bot_id": "B_BOT", "team_id": "T_LOAD"})
+    server.on("chat.postMessage", lambda params: {"ok": True, "ts": f"2000000000.{next(ts_counter):06d}"})
+    server.on("usergroups.users.list", lambda params: {"ok": True, "users": group_members})
+    return server.start()
+
+
+def run_workload(database_url: str, workload: str, events: int = 200, targets: int = 100,
+                 group_size: int = 0, rate: float = 0.0) -> dict:
+    """Replay `events` payloads and return latency, throughput and query counts.
+
+    `rate` paces arrivals in events per second (0 replays back to back); latency
+    is measured from each event's scheduled arrival, so falling behind the
+    requested rate shows up as queueing delay.
+    """
+    tmpdir = None
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        # Job worker threads open their own connections, so use a file
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'load.db')}"
+
+    engine = create_database_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    counts = {"queries": 0}
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _count_query(*args):
+        counts["queries"] += 1
+
+    SessionLocal.configure(bind=engine)
+    dispatcher.set_rates({tier: UNLIMITED_PER_MINUTE for tier in TIER_RATES}, channel_rate=UNLIMITED_PER_MINUTE)
+    usergroup_cache.invalidate(GROUP_ID)
+    server = _fake_slack(group_size)
+    try:
+        if workload == "reactions":
+            with SessionLocal() as db:
+                create_announcement(db, OWNER_ID, CHANNEL_ID, SEED_TS, "Load test announcement", _user_ids(targets))
+                db.commit()
+        with SessionLocal() as db:
+            open_index.load(db)
+
+        client = WebClient(token="xoxb-load", base_url=server.base_url)
+        # Socket Mode requests skip signature checks, but Bolt still wants a secret
+        app = register_listeners(App(client=client, signing_secret="load", token_verification_enabled=False,
+                                     process_before_response=True))
+        payloads = generate_payloads(workload, events, targets, group_size)
+
+        # Warm up Bolt's auth.test lookup outside the measured window
+        app.dispatch(BoltRequest(body=reaction_payload(OWNER_ID, "0.0"), mode="socket_mode"))
+        counts["queries"] = 0
+        # Payload event ids repeat between runs; each run starts with nothing seen
+        seen_events.clear()
+        seen_reactions.clear()
+
+        latencies = []
+        start = time.perf_counter()
+        for i, body in enumerate(payloads):
+            arrival = start + i / rate if rate else time.perf_counter()
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            response = app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+            if response.status != 200:
+                raise RuntimeError(f"{workload} event {i} failed with {response.status}: {response.body}")
+            command_queue.join()
+            mention_queue.join()
+            dispatcher.join()
+            latencies.append(time.perf_counter() - arrival)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+        dispatcher.set_rates(TIER_RATES, channel_rate=CHANNEL_POSTS_PER_MINUTE)
+        SessionLocal.configure(bind=default_engine)
+        engine.dispose()
+        if tmpdir:
+            tmpdir.cleanup()
+
+    return {
+        "workload": workload,
+        "params": {"events": events, "targets": targets, "group_size": group_size, "rate": rate,
+                   "database": engine.dialect.name},
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": events / elapsed,
+        "queries_per_event": counts["queries"] / events,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_baseline(path: str, result: dict):
+    with open(path, "w") as f:
+        json.dump({**result, "commit": _git_commit()}, f, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float = 0.1):
+    """Metrics that are more than `tolerance` (a fraction) worse than the baseline"""
+    if result["workload"] != baseline["workload"] or result["params"] != baseline["params"]:
+        raise ValueError("Baseline was recorded with a different workload or parameters")
+    regressions = []
+    for metric, higher_is_worse in BASELINE_METRICS.items():
+        old, new = baseline[metric], result[metric]
+        if not old:
+            continue
+        change = (new - old) / old
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append(f"{metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    return regressions
+
+
+def format_result(result: dict) -> str:
+    params = result["params"]
+    return (f"{result['workload']} x{params['events']} on {params['database']} "
+            f"(targets {params['targets']}, group size {params['group_size']}, rate {params['rate'] or 'max'}): "
+            f"p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  "
+            f"{result['throughput']:.0f} events/s  {result['queries_per_event']:.1f} queries/event")
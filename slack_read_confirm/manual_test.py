@@ -2,7 +2,7 @@ import os
 from datetime import datetime
 
 from dotenv import load_dotenv
-from .models import Announcement, Base, ReadReceipt, SessionLocal, Target, engine
+from .models import Announcement, Base, ReadReceipt, Target, engine, session_scope
 
 # Load environment variables
 load_dotenv()
@@ -12,44 +12,42 @@ Base.metadata.create_all(bind=engine)
 
 def create_test_data():
     """Create test data for manual testing"""
-    db = SessionLocal()
+    with session_scope() as db:
+        # Create a test announcement
+        ann = Announcement(
+            owner_id="U12345",
+            channel_id="C12345",
+            message_ts=f"{datetime.utcnow().timestamp():.6f}",
+            text="This is a test announcement"
+        )
+        db.add(ann)
+        db.commit()
+        db.refresh(ann)
+        print(f"Created announcement: {ann.id}")
     
-    # Create a test announcement
-    ann = Announcement(
-        owner_id="U12345",
-        channel_id="C12345",
-        message_ts="1234567890.123456",
-        text="This is a test announcement"
-    )
-    db.add(ann)
-    db.commit()
-    db.refresh(ann)
-    print(f"Created announcement: {ann.id}")
+        # Create test targets
+        targets = []
+        for user_id in ["U67890", "U13579"]:
+            tgt = Target(
+                announcement_id=ann.id,
+                user_id=user_id
+            )
+            db.add(tgt)
+            db.commit()
+            db.refresh(tgt)
+            targets.append(tgt)
+            print(f"Created target: {tgt.id} for user {user_id}")
     
-    # Create test targets
-    targets = []
-    for user_id in ["U67890", "U13579"]:
-        tgt = Target(
-            announcement_id=ann.id,
-            user_id=user_id
+        # Create a read receipt for one target
+        receipt = ReadReceipt(
+            target_id=targets[0].id,
+            timestamp=datetime.utcnow()
         )
-        db.add(tgt)
+        db.add(receipt)
         db.commit()
-        db.refresh(tgt)
-        targets.append(tgt)
-        print(f"Created target: {tgt.id} for user {user_id}")
-    
-    # Create a read receipt for one target
-    receipt = ReadReceipt(
-        target_id=targets[0].id,
-        timestamp=datetime.utcnow()
-    )
-    db.add(receipt)
-    db.commit()
-    db.refresh(receipt)
-    print(f"Created read receipt: {receipt.id} for target {targets[0].id}")
+        db.refresh(receipt)
+        print(f"Created read receipt: {receipt.id} for target {targets[0].id}")
     
-    db.close()
     print("Test data created successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,283 @@
+"""
+Hot-path metrics in the Prometheus text format
+
+Off unless METRICS_ENABLED=true; when off, the instrumentation hooks are not
+installed and the remaining checks are a single module-level flag test.
+Exposition is over HTTP (METRICS_PORT, serving /metrics) and/or a file that is
+rewritten every METRICS_DUMP_INTERVAL seconds (METRICS_FILE).
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_DUMP_INTERVAL = float(os.environ.get("METRICS_DUMP_INTERVAL", "15"))
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of the listener/job currently running on this thread, used to attribute SQL
+current_handler = contextvars.ContextVar("current_handler", default="other")
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self) -> dict:
+        """Cumulative counts per upper bound, plus count and sum"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative[bound] = running
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def render_histogram(name: str, labels: dict, snapshot: dict):
+    """Prometheus sample lines for a LatencyHistogram snapshot"""
+    lines = []
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': _format_bound(bound)})} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def render(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return histogram_lines(self.name, self.help,
+                               [(dict(zip(self.label_names, key)), histogram.snapshot()) for key, histogram in items])
+
+
+class Registry:
+    """Metrics plus collectors: callables returning extra exposition lines at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names=()) -> Histogram:
+        metric = Histogram(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+LISTENER_SECONDS = registry.histogram("slack_listener_seconds", "Bolt listener and job latency", ["handler"])
+DB_QUERIES = registry.counter("db_queries_total", "SQL statements executed", ["handler"])
+DB_QUERY_SECONDS = registry.histogram("db_query_seconds", "SQL statement latency", ["handler"])
+SLACK_API_SECONDS = registry.histogram("slack_api_seconds", "Slack Web API call latency", ["method"])
+SLACK_API_ERRORS = registry.counter("slack_api_errors_total", "Slack Web API call errors", ["method", "error"])
+SCHEDULER_LAG_SECONDS = registry.histogram("scheduler_job_lag_seconds", "Delay between a job's scheduled and actual start", ["job"])
+
+
+def timed(handler: str):
+    """Decorator: record latency under `handler` and attribute its SQL to it.
+
+    Applied to the listener functions themselves: with process_before_response
+    off, Bolt acks and then runs listeners on its own threads, without the
+    middleware's context.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            token = current_handler.set(handler)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                LISTENER_SECONDS.observe(time.perf_counter() - start, handler=handler)
+                current_handler.reset(token)
+        return wrapper
+    return decorator
+
+
+def gauge_lines(name: str, help_text: str, samples):
+    """Exposition lines for a gauge from [(labels, value)]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def histogram_lines(name: str, help_text: str, samples):
+    """Exposition lines for a histogram from [(labels, LatencyHistogram snapshot)]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, snapshot in samples:
+        lines.extend(render_histogram(name, labels, snapshot))
+    return lines
+
+
+def instrument_engine(engine):
+    """Count and time every SQL statement, labelled with the current handler"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        handler = current_handler.get()
+        DB_QUERIES.inc(handler=handler)
+        DB_QUERY_SECONDS.observe(elapsed, handler=handler)
+
+
+def instrument_scheduler(scheduler):
+    """Record how late each APScheduler job starts relative to its schedule"""
+    from datetime import datetime
+
+    from apscheduler.events import EVENT_JOB_SUBMITTED
+
+    def _on_submitted(event):
+        scheduled = event.scheduled_run_times[-1]
+        lag = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+        SCHEDULER_LAG_SECONDS.observe(max(0.0, lag), job=event.job_id)
+
+    scheduler.add_listener(_on_submitted, EVENT_JOB_SUBMITTED)
+
+
+def start_http_server(port: int):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def dump_to_file(path: str):
+    """Atomically rewrite `path` with the current exposition"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(registry.exposition())
+    os.replace(tmp_path, path)
+
+
+def start_file_dumper(path: str, interval: float = METRICS_DUMP_INTERVAL):
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_to_file(path)
+            except OSError as e:
+                logger.error(f"Metrics dump to {path} failed: {e}")
+
+    threading.Thread(target=_loop, name="metrics-dump", daemon=True).start()
+
+
+def start_exporters():
+    """Start whichever exporters are configured; no-op when metrics are disabled"""
+    if not enabled:
+        return
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        start_file_dumper(METRICS_FILE)
@@ -1,14 +1,183 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, create_engine
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from . import metrics
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql://localhost:5432/slack_read_confirm")
-engine = create_engine(DATABASE_URL)
+
+# Connection pool settings; SQLite file databases use the size, overflow and timeout, in-memory ones do not pool
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+# Server-side statement timeout in milliseconds (Postgres only, 0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Backends with the ON CONFLICT upserts the receipt and stats writes rely on
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+# Embedded SQLite backend (DATABASE_URL=sqlite:///path/to.db) for small deployments and tests
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Seconds a writer waits for the database lock before failing
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "30"))
+# Prepared statements kept per connection
+SQLITE_STATEMENT_CACHE = int(os.environ.get("SQLITE_STATEMENT_CACHE", "256"))
+
+
+class PoolStats:
+    """Checkout counts and time spent waiting for a pooled connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_memory_sqlite(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def pool_options(url: str) -> dict:
+    """create_engine() pool arguments from the DB_POOL_* environment"""
+    if is_sqlite(url):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def sqlite_options(url: str) -> dict:
+    """Connection arguments for SQLite; file databases are pooled so prepared statements survive checkouts"""
+    options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT,
+                                "cached_statements": SQLITE_STATEMENT_CACHE}}
+    if not is_memory_sqlite(url):
+        options.update(poolclass=TimedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                       pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def engine_options(url: str) -> dict:
+    if is_sqlite(url):
+        return sqlite_options(url)
+    options = pool_options(url)
+    if options:
+        options["poolclass"] = TimedQueuePool
+    if url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def sqlite_pragmas(url: str):
+    """PRAGMAs run on every new SQLite connection"""
+    pragmas = [f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}", f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}"]
+    if not is_memory_sqlite(url):
+        # WAL lets readers proceed while a writer commits; it is a no-op for in-memory databases
+        pragmas = ["PRAGMA journal_mode=WAL", f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}"] + pragmas
+    return pragmas
+
+
+def configure_engine(engine, url: str):
+    """Install backend-specific connection setup on a sync engine (or an async engine's sync_engine)"""
+    if engine.dialect.name not in SUPPORTED_DIALECTS:
+        raise ValueError(f"Unsupported database backend {engine.dialect.name!r} in DATABASE_URL; "
+                         f"use one of: {', '.join(SUPPORTED_DIALECTS)}")
+    if is_sqlite(url):
+        pragmas = sqlite_pragmas(url)
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+    return engine
+
+
+def create_database_engine(url: str):
+    """Engine for `url` with the tuning of its backend (Postgres or SQLite)"""
+    return configure_engine(create_engine(url, **engine_options(url)), url)
+
+
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+@contextmanager
+def session_scope():
+    """Session that commits on success, rolls back on error and is always closed"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_pool_stats() -> dict:
+    """Current pool usage plus cumulative checkout wait statistics"""
+    pool = engine.pool
+    stats = {
+        "checkouts": pool_stats.checkouts,
+        "wait_seconds_total": pool_stats.wait_seconds_total,
+        "wait_seconds_max": pool_stats.wait_seconds_max,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return stats
+
+
+def _collect():
+    return metrics.gauge_lines("db_pool", "Connection pool usage and checkout wait",
+                               [({"stat": key}, value) for key, value in get_pool_stats().items()])
+
+
+metrics.registry.register_collector(_collect)
+if metrics.enabled:
+    metrics.instrument_engine(engine)
+
 class Announcement(Base):
     __tablename__ = "announcements"
     id = Column(Integer, primary_key=True, index=True)
@@ -16,15 +185,55 @@ class Announcement(Base):
     channel_id = Column(String, nullable=False)
     message_ts = Column(String, nullable=False)
     text = Column(String, nullable=False)
+    # Denormalized counters, maintained in the same transaction as target/receipt inserts
+    target_count = Column(Integer, nullable=False, default=0, server_default="0")
+    read_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set exactly once, by the receipt that brings read_count up to target_count
+    completed_at = Column(DateTime, nullable=True)
+    # NULL for announcements created before this column existed; those never expire
+    created_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_announcements_channel_message", "channel_id", "message_ts", unique=True),
+        Index("ix_announcements_owner", "owner_id", "id"),
+    )
 
 class Target(Base):
     __tablename__ = "targets"
     id = Column(Integer, primary_key=True, index=True)
     announcement_id = Column(Integer, ForeignKey("announcements.id"), nullable=False)
     user_id = Column(String, nullable=False)
+    # Reminder state lives here rather than in scheduler memory
+    last_reminded_at = Column(DateTime, nullable=True)
+    # Next reminder (UTC): REMINDER_HOUR in the recipient's time zone plus their jitter
+    next_reminder_at = Column(DateTime, nullable=True)
+    # Reminder lease: the replica sending this target's reminder, until lease_expires_at
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Slack error that makes reminding this target pointless (e.g. user_not_found); no more are sent
+    reminder_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("uq_targets_announcement_user", "announcement_id", "user_id", unique=True),
+        Index("ix_targets_next_reminder_at", "next_reminder_at"),
+    )
 
 class ReadReceipt(Base):
     __tablename__ = "read_receipts"
     id = Column(Integer, primary_key=True, index=True)
     target_id = Column(Integer, ForeignKey("targets.id"), nullable=False)
     timestamp = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("uq_read_receipts_target", "target_id", unique=True),
+    )
+
+class ChannelStats(Base):
+    """Per owner and channel totals, updated in the same transactions as the rows they count"""
+    __tablename__ = "channel_stats"
+    owner_id = Column(String, primary_key=True)
+    channel_id = Column(String, primary_key=True)
+    announcement_count = Column(Integer, nullable=False, default=0, server_default="0")
+    target_count = Column(Integer, nullable=False, default=0, server_default="0")
+    read_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
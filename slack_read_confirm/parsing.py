@@ -0,0 +1,48 @@
+"""Parsing of /read-confirm and mention text"""
+
+import re
+from collections import namedtuple
+
+# User and user-group mentions in one alternation, so text is scanned a single time
+TOKEN_REGEX = re.compile(r"<@(?P<user>[UW][A-Z0-9]+)>|<!subteam\^(?P<group>[GS][A-Z0-9]+)\|[^>]+>")
+# The keyword that turns an @-mention of the bot into an announcement
+MENTION_KEYWORD_REGEX = re.compile(r"read-confirm", re.IGNORECASE)
+
+ParsedText = namedtuple("ParsedText", ["user_ids", "group_ids", "text"])
+
+
+def parse_command_text(text: str) -> ParsedText:
+    """Split command text into (user ids, group ids, text with the mentions removed)"""
+    # One scan: split() interleaves the text between mentions with each match's two groups
+    parts = TOKEN_REGEX.split(text)
+    user_ids = [uid for uid in parts[1::3] if uid]
+    group_ids = [gid for gid in parts[2::3] if gid]
+    return ParsedText(user_ids, group_ids, "".join(parts[0::3]).strip())
+
+
+def parse_mention_text(text: str, bot_user_id: str = None):
+    """Parse an app mention like "@bot read-confirm @alice Hello".
+
+    Returns None if the keyword is missing; otherwise the ParsedText of what
+    follows it, without the bot's own user id.
+    """
+    keyword = MENTION_KEYWORD_REGEX.search(text)
+    if keyword is None:
+        return None
+    parsed = parse_command_text(text[keyword.end():])
+    if bot_user_id:
+        parsed = parsed._replace(user_ids=[uid for uid in parsed.user_ids if uid != bot_user_id])
+    return parsed
+
+
+# /read-confirm text handled as a subcommand rather than an announcement: exactly
+# "status" or "status <announcement id>", so announcements may start with the word
+SUBCOMMAND_REGEX = re.compile(r"\s*(?P<name>status)(?:\s+(?P<args>\d+))?\s*", re.IGNORECASE)
+
+
+def split_subcommand(text: str):
+    """Split off a subcommand: ("status", "12") for "status 12", (None, text) otherwise"""
+    match = SUBCOMMAND_REGEX.fullmatch(text)
+    if match is None:
+        return None, text
+    return match["name"].lower(), match["args"] or ""
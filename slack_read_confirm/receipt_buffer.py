@@ -0,0 +1,162 @@
+"""
+Write-behind buffer coalescing reaction bursts into batched receipt inserts
+
+When RECEIPT_WRITE_BEHIND is on, reaction listeners hand receipts to the
+buffer instead of writing them. A flusher thread collects them for up to
+RECEIPT_FLUSH_MS (or RECEIPT_FLUSH_SIZE receipts) and records the whole
+batch with record_receipts: one transaction and one completion check per
+announcement, instead of one of each per reaction.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import metrics
+from .announcements import record_receipts
+from .models import session_scope
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_WRITE_BEHIND = os.environ.get("RECEIPT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+# A receipt waits at most this long for others to share its transaction
+RECEIPT_FLUSH_MS = float(os.environ.get("RECEIPT_FLUSH_MS", "20"))
+RECEIPT_FLUSH_SIZE = int(os.environ.get("RECEIPT_FLUSH_SIZE", "200"))
+# Receipts waiting to be flushed before add() blocks the listener
+RECEIPT_BUFFER_SIZE = int(os.environ.get("RECEIPT_BUFFER_SIZE", "10000"))
+
+
+class ReceiptBuffer:
+    """Queue of pending receipts and the thread that flushes them in batches.
+
+    add() returns a Future resolved with the receipt's ReceiptResult (or the
+    flush error) once its batch has committed.
+    """
+
+    def __init__(self, flush_ms: float = RECEIPT_FLUSH_MS, flush_size: int = RECEIPT_FLUSH_SIZE,
+                 max_pending: int = RECEIPT_BUFFER_SIZE, session_factory=session_scope):
+        self.flush_interval = flush_ms / 1000
+        self.flush_size = flush_size
+        self.session_factory = session_factory
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.flushes = 0
+        self.receipts = 0
+        self.failed = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="receipt-flusher", daemon=True)
+                self._thread.start()
+
+    def add(self, channel_id: str, message_ts: str, user_id: str) -> Future:
+        future = Future()
+        item = (future, (channel_id, message_ts, user_id))
+        if self._closed:
+            # Shutting down: write it straight away
+            self._flush([item])
+            return future
+        self._ensure_started()
+        self._queue.put(item)
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._flush_remaining()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                self._flush_remaining()
+                return
+
+    def _flush_remaining(self):
+        # Receipts added while drain() was queueing its sentinel
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with self.session_factory() as db:
+                results = record_receipts(db, [key for _, key in batch])
+        except Exception as e:
+            logger.error(f"Flushing {len(batch)} receipts failed: {e}")
+            with self._lock:
+                self.failed += len(batch)
+            for future, _ in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.flushes += 1
+            self.receipts += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        for (future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def drain(self, timeout: float = None) -> bool:
+        """Flush everything buffered and stop the flusher; later receipts are written directly.
+
+        Returns False if the flusher was still busy when `timeout` ran out.
+        """
+        self._closed = True
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # A full queue only makes room as the flusher takes batches; do not wait past the deadline
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Receipt buffer still full at the drain deadline")
+            return False
+        thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not thread.is_alive()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._queue.qsize(), "flushes": self.flushes, "receipts": self.receipts,
+                    "failed": self.failed, "largest_batch": self.largest_batch}
+
+
+# Process-wide buffer used by the reaction listeners in write-behind mode
+receipt_buffer = ReceiptBuffer()
+
+
+def _collect():
+    stats = receipt_buffer.stats()
+    return metrics.gauge_lines("receipt_buffer", "Write-behind receipt buffer depth, flushes and batch sizes",
+                               [({"stat": key}, value) for key, value in stats.items()])
+
+
+metrics.registry.register_collector(_collect)
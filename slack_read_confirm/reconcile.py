@@ -0,0 +1,181 @@
+"""
+Reconciliation: backfill receipts for checkmarks whose reaction_added event was missed
+
+Each sweep fetches the current reactions of open announcements with
+reactions.get, compares the users who reacted with a checkmark to the
+targets still without a receipt, and records the difference in bulk. Calls
+go through the rate-limited dispatcher, with at most RECONCILE_CONCURRENCY
+in flight. Each announcement is re-fetched at most once per
+RECONCILE_RECHECK_SECONDS, and a sweep makes at most RECONCILE_MAX_CALLS
+calls, so thousands of open announcements are covered over several sweeps,
+least recently checked first.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from slack_sdk.errors import SlackApiError
+from sqlalchemy import select
+
+from . import metrics
+from .announcements import record_receipts
+from .dispatcher import BACKGROUND, dispatcher
+from .hot_index import open_index
+from .models import Announcement, ReadReceipt, Target, session_scope
+
+logger = logging.getLogger(__name__)
+
+# Sweep interval; 0 disables. With several replicas, enable it on one of them.
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get("RECONCILE_INTERVAL_SECONDS", "0"))
+RECONCILE_RECHECK_SECONDS = float(os.environ.get("RECONCILE_RECHECK_SECONDS", "3600"))
+# reactions.get is tier 3 (50/min): the default budget is ten minutes' worth
+RECONCILE_MAX_CALLS = int(os.environ.get("RECONCILE_MAX_CALLS", "500"))
+RECONCILE_CONCURRENCY = int(os.environ.get("RECONCILE_CONCURRENCY", "4"))
+# Announcements whose reactions are compared and backfilled together
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", "100"))
+CHECKMARKS = ("white_check_mark", "heavy_check_mark")
+
+
+def checkmark_users(response) -> set:
+    """Users who reacted with a checkmark, from a reactions.get response"""
+    users = set()
+    for reaction in (response.get("message") or {}).get("reactions", []):
+        # Skin-tone variants arrive as e.g. "white_check_mark::skin-tone-2"
+        if reaction.get("name", "").split("::")[0] in CHECKMARKS:
+            users.update(reaction.get("users", []))
+    return users
+
+
+class Reconciler:
+    """Sweeps open announcements; remembers when each was last fetched"""
+
+    def __init__(self, dispatcher=dispatcher, recheck_seconds: float = RECONCILE_RECHECK_SECONDS,
+                 max_calls: int = RECONCILE_MAX_CALLS, concurrency: int = RECONCILE_CONCURRENCY,
+                 batch_size: int = RECONCILE_BATCH_SIZE):
+        self.dispatcher = dispatcher
+        self.recheck_seconds = recheck_seconds
+        self.max_calls = max_calls
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._checked = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._counters = {"sweeps": 0, "fetched": 0, "skipped_recent": 0, "failed": 0, "backfilled": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def due_announcements(self, db):
+        """(id, channel_id, message_ts) of open announcements to fetch this sweep"""
+        rows = db.execute(select(Announcement.id, Announcement.channel_id, Announcement.message_ts)
+                          .where(Announcement.completed_at.is_(None), Announcement.target_count > 0)
+                          .order_by(Announcement.id)).all()
+        now = time.monotonic()
+        with self._lock:
+            # Forget announcements that completed or were archived since
+            self._checked = {key: self._checked[key] for key in self._checked.keys() & {row.id for row in rows}}
+            last_checked = {row.id: self._checked.get(row.id, float("-inf")) for row in rows}
+        due = [row for row in rows if now - last_checked[row.id] >= self.recheck_seconds]
+        self._count("skipped_recent", len(rows) - len(due))
+        # Never checked first, then least recently checked
+        due.sort(key=lambda row: last_checked[row.id])
+        return due[:self.max_calls]
+
+    def fetch_reactions(self, client, announcements):
+        """{announcement id: checkmark user ids}, with at most `concurrency` calls in flight"""
+        reacted = {}
+        pending = deque()
+
+        def collect(row, future):
+            try:
+                reacted[row.id] = checkmark_users(future.result())
+                self._count("fetched")
+            except (SlackApiError, OSError) as e:
+                # e.g. message_not_found for a deleted announcement, or still rate limited
+                # after the dispatcher's retries; try again next interval
+                logger.warning(f"reactions.get failed for {row.channel_id}/{row.message_ts}: {e}")
+                self._count("failed")
+            with self._lock:
+                self._checked[row.id] = time.monotonic()
+
+        for row in announcements:
+            if self._stopping.is_set():
+                # Unfetched announcements stay due for the next sweep
+                break
+            if len(pending) >= self.concurrency:
+                collect(*pending.popleft())
+            pending.append((row, self.dispatcher.submit(client, "reactions_get", priority=BACKGROUND, channel=row.channel_id,
+                                                        timestamp=row.message_ts, full=True)))
+        while pending:
+            collect(*pending.popleft())
+        return reacted
+
+    def backfill(self, db, client, announcements, reacted):
+        """Record receipts for targets that reacted but have none; returns the ReceiptResults"""
+        ids = [row.id for row in announcements if reacted.get(row.id)]
+        if not ids:
+            return []
+        unread = {}
+        stmt = (select(Target.announcement_id, Target.user_id)
+                .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+                .where(Target.announcement_id.in_(ids), ReadReceipt.id.is_(None)))
+        for announcement_id, user_id in db.execute(stmt):
+            unread.setdefault(announcement_id, set()).add(user_id)
+
+        missing = []
+        for row in announcements:
+            for user_id in sorted(unread.get(row.id, set()) & reacted.get(row.id, set())):
+                missing.append((row.channel_id, row.message_ts, user_id))
+        if not missing:
+            return []
+        results = record_receipts(db, missing)
+        for (channel_id, message_ts, user_id), result in zip(missing, results):
+            open_index.discard(channel_id, message_ts, user_id)
+            if result and result.completed:
+                open_index.remove(channel_id, message_ts)
+                self.dispatcher.submit(client, "chat_postMessage", channel=channel_id,
+                                       text=":tada: Everyone has read this announcement!", thread_ts=message_ts)
+        inserted = sum(1 for result in results if result and result.inserted)
+        self._count("backfilled", inserted)
+        return results
+
+    def run(self, client) -> int:
+        """One sweep; returns the number of receipts backfilled"""
+        with session_scope() as db:
+            due = self.due_announcements(db)
+        backfilled = 0
+        for start in range(0, len(due), self.batch_size):
+            if self._stopping.is_set():
+                break
+            batch = due[start:start + self.batch_size]
+            reacted = self.fetch_reactions(client, batch)
+            with session_scope() as db:
+                backfilled += sum(1 for result in self.backfill(db, client, batch, reacted) if result and result.inserted)
+        self._count("sweeps")
+        if backfilled:
+            logger.info(f"Reconciliation backfilled {backfilled} missed receipts")
+        return backfilled
+
+    def stop(self):
+        """Make a running sweep record what it has fetched and return without further calls"""
+        self._stopping.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "tracked": len(self._checked)}
+
+
+# Process-wide reconciler run by the scheduler
+reconciler = Reconciler()
+
+
+def _collect():
+    stats = reconciler.stats()
+    return metrics.gauge_lines("reconciler", "Reaction reconciliation sweeps, fetches and backfilled receipts",
+                               [({"stat": key}, value) for key, value in stats.items()])
+
+
+metrics.registry.register_collector(_collect)
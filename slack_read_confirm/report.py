@@ -0,0 +1,139 @@
+"""
+Read-status reports, served from the counters kept on announcements and channel_stats
+
+Backs `/read-confirm status [announcement id]` and a bulk export:
+    python -m slack_read_confirm.report --owner U12345 --format csv > status.csv
+"""
+import argparse
+import csv
+import json
+import sys
+
+from sqlalchemy import select
+
+from .announcements import permalink
+from .models import Announcement, ChannelStats, ReadReceipt, Target, session_scope
+
+# Announcements listed by `/read-confirm status`
+STATUS_RECENT = 10
+# Unread users named in a single announcement's status
+STATUS_MAX_UNREAD = 100
+EXPORT_FIELDS = ["announcement_id", "owner_id", "channel_id", "message_ts", "text",
+                 "target_count", "read_count", "unread_count", "completed_at"]
+EXPORT_BATCH_SIZE = 1000
+
+
+def channel_summary(db, owner_id: str):
+    """The owner's per-channel totals: one primary-key range read"""
+    return db.execute(select(ChannelStats)
+                      .where(ChannelStats.owner_id == owner_id)
+                      .order_by(ChannelStats.channel_id)).scalars().all()
+
+
+def recent_announcements(db, owner_id: str, limit: int = STATUS_RECENT):
+    return (db.query(Announcement)
+            .filter(Announcement.owner_id == owner_id)
+            .order_by(Announcement.id.desc())
+            .limit(limit)
+            .all())
+
+
+def unread_users(db, announcement_id: int, limit: int = STATUS_MAX_UNREAD):
+    """Targets of one announcement without a receipt (bounded by that announcement's targets)"""
+    return db.execute(select(Target.user_id)
+                      .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+                      .where(Target.announcement_id == announcement_id, ReadReceipt.id.is_(None))
+                      .order_by(Target.id)
+                      .limit(limit)).scalars().all()
+
+
+def _progress(ann) -> str:
+    done = " :white_check_mark:" if ann.completed_at else ""
+    return f"{ann.read_count}/{ann.target_count} read{done}"
+
+
+def status_text(db, owner_id: str, announcement_id: int = None) -> str:
+    """The reply to `/read-confirm status`, optionally for one of the owner's announcements"""
+    if announcement_id is not None:
+        ann = db.get(Announcement, announcement_id)
+        if ann is None or ann.owner_id != owner_id:
+            return f"You have no announcement #{announcement_id}."
+        lines = [f"#{ann.id} <{permalink(ann.channel_id, ann.message_ts)}|announcement> in <#{ann.channel_id}>: {_progress(ann)}"]
+        unread_count = ann.target_count - ann.read_count
+        if unread_count > 0:
+            unread = unread_users(db, ann.id)
+            more = f" and {unread_count - len(unread)} more" if unread_count > len(unread) else ""
+            lines.append("Not read yet: " + ", ".join(f"<@{uid}>" for uid in unread) + more)
+        return "\n".join(lines)
+
+    channels = channel_summary(db, owner_id)
+    if not channels:
+        return "You haven't created any announcements yet."
+    lines = ["*Your announcements by channel*"]
+    for stats in channels:
+        lines.append(f"<#{stats.channel_id}>: {stats.announcement_count} announcements, "
+                     f"{stats.read_count}/{stats.target_count} read, {stats.completed_count} complete")
+    lines.append("*Latest announcements*")
+    for ann in recent_announcements(db, owner_id):
+        lines.append(f"#{ann.id} <{permalink(ann.channel_id, ann.message_ts)}|in> <#{ann.channel_id}>: {_progress(ann)}")
+    lines.append("Use `/read-confirm status <id>` to see who hasn't read one.")
+    return "\n".join(lines)
+
+
+def export_rows(db, owner_id: str = None, channel_id: str = None):
+    """Yield one dict per announcement, streamed in batches"""
+    query = select(Announcement).order_by(Announcement.id)
+    if owner_id:
+        query = query.where(Announcement.owner_id == owner_id)
+    if channel_id:
+        query = query.where(Announcement.channel_id == channel_id)
+    result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for ann in result.scalars():
+        yield {
+            "announcement_id": ann.id,
+            "owner_id": ann.owner_id,
+            "channel_id": ann.channel_id,
+            "message_ts": ann.message_ts,
+            "text": ann.text,
+            "target_count": ann.target_count,
+            "read_count": ann.read_count,
+            "unread_count": ann.target_count - ann.read_count,
+            "completed_at": ann.completed_at.isoformat() if ann.completed_at else None,
+        }
+
+
+def write_export(rows, out, fmt: str = "csv") -> int:
+    """Write rows as CSV or JSON lines; returns the number written"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export read status per announcement")
+    parser.add_argument("--owner", help="Only this owner's announcements")
+    parser.add_argument("--channel", help="Only announcements in this channel")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--output", help="File to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        with session_scope() as db:
+            write_export(export_rows(db, args.owner, args.channel), out, args.format)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,424 @@
 """APScheduler jobs"""
 
+import logging
 import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import wait
+from datetime import datetime, timedelta
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from slack_bolt import App
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from sqlalchemy import bindparam, or_, select, update
 
-from .models import Announcement, ReadReceipt, SessionLocal, Target
+from . import metrics
+from .announcements import permalink
+from .archive import ARCHIVE_INTERVAL_HOURS, run_archive
+from .dispatcher import BACKGROUND, dispatcher
+from .hot_index import OPEN_INDEX_REFRESH_SECONDS, open_index
+from .models import Announcement, ReadReceipt, Target, session_scope
+from .reconcile import RECONCILE_INTERVAL_SECONDS, reconciler
+from .timezones import USER_TZ_CHECK_SECONDS, next_reminder_slot, user_timezones
+
+logger = logging.getLogger(__name__)
 
 # Initialize scheduler
 scheduler = BackgroundScheduler()
 
-# Lazy-loaded Slack app
-_app = None
+SWEEP_JOB_ID = "reminder_sweep"
+INDEX_REFRESH_JOB_ID = "open_index_refresh"
+ARCHIVE_JOB_ID = "archive"
+RECONCILE_JOB_ID = "reconcile_reactions"
+TIMEZONE_REFRESH_JOB_ID = "user_timezones_refresh"
+# Hour of day, in each recipient's own time zone, at which they are reminded
+REMINDER_HOUR = int(os.environ.get("REMINDER_HOUR", "9"))
+# The sweep runs this often and sends whatever has come due since the last run
+REMINDER_SWEEP_SECONDS = int(os.environ.get("REMINDER_SWEEP_SECONDS", "60"))
+# Targets sent per batch while walking the sweep cursor
+REMINDER_BATCH_SIZE = int(os.environ.get("REMINDER_BATCH_SIZE", "500"))
+# Send each user one Block Kit digest of all their unread announcements
+REMINDER_DIGEST = os.environ.get("REMINDER_DIGEST", "false").lower() in ("1", "true", "yes")
+# Announcements listed per digest; Block Kit allows at most 50 blocks per message
+DIGEST_MAX_ITEMS = 40
+DIGEST_SNIPPET_CHARS = 150
+# At most one reminder per target per day, with headroom for a late sweep
+MIN_REMINDER_INTERVAL = timedelta(hours=20)
+# Identifies this process in reminder leases; must differ between replicas
+REPLICA_ID = os.environ.get("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# How long a claimed batch stays reserved before another replica may take it over
+REMINDER_LEASE = timedelta(seconds=int(os.environ.get("REMINDER_LEASE_SECONDS", "300")))
+# How often a sweep waiting on its sends checks its lease and whether shutdown has begun
+STOP_POLL_SECONDS = 0.1
+# chat.postMessage errors that retrying cannot fix; the target gets no further reminders
+UNDELIVERABLE_ERRORS = frozenset({"account_inactive", "cannot_dm_bot", "channel_not_found", "messages_tab_disabled",
+                                  "user_disabled", "user_not_found"})
+
+# Set by stop_scheduler(): sweeps finish the batch in flight and leave the rest due in the DB
+sweeps_stopping = threading.Event()
+
+# Web API client for scheduled jobs; app.start_services() hands over the app's
+_client = None
 
-def get_app():
-    """Get or initialize the Slack app"""
-    global _app
-    if _app is None:
+def set_client(client):
+    global _client
+    _client = client
+
+def get_client():
+    """Get the client set by set_client, or build one from SLACK_BOT_TOKEN"""
+    global _client
+    if _client is None:
         token = os.environ.get("SLACK_BOT_TOKEN")
-        if token:
-            _app = App(token=token)
-        else:
-            # For testing purposes
-            from unittest.mock import MagicMock
-            _app = MagicMock()
-    return _app
-
-def schedule_user_reminder(announcement_id: int, target_id: int, user_id: str):
-    job_id = f"reminder_{announcement_id}_{target_id}"
-    trigger = CronTrigger(hour=9, minute=0)
-    scheduler.add_job(send_reminder, trigger, args=[announcement_id, target_id, user_id], id=job_id, replace_existing=True)
-
-def send_reminder(announcement_id: int, target_id: int, user_id: str):
-    db = SessionLocal()
-    existing = db.query(ReadReceipt).filter_by(target_id=target_id).first()
-    if not existing:
-        # Get the announcement details to provide context in the reminder
-        target = db.query(Target).filter_by(id=target_id).first()
-        announcement = db.query(Announcement).filter_by(id=announcement_id).first()
-        
-        if announcement:
-            channel_link = f"<#{announcement.channel_id}>"
-            text = (f"Reminder: Please confirm you've read the announcement in {channel_link}.\n"
-                   f"Message: '{announcement.text}'\n"
-                   f"Please add a ✅ reaction to the original message to confirm you've read it.")
-            get_app().client.chat_postMessage(channel=user_id, text=text)
-    db.close()
+        if not token:
+            raise RuntimeError("SLACK_BOT_TOKEN is not set")
+        _client = WebClient(token=token)
+    return _client
+
+def schedule_reminder_sweep():
+    """Register the recurring job that sends reminders as they come due"""
+    sweep = send_due_digests if REMINDER_DIGEST else send_due_reminders
+    scheduler.add_job(sweep, "interval", seconds=REMINDER_SWEEP_SECONDS, id=SWEEP_JOB_ID,
+                      replace_existing=True, coalesce=True, max_instances=1)
+
+def schedule_timezone_refresh():
+    """Keep recipient time zones loaded in the background, starting now, so sweeps never page users.list"""
+    scheduler.add_job(refresh_timezones, "interval", seconds=USER_TZ_CHECK_SECONDS, id=TIMEZONE_REFRESH_JOB_ID,
+                      next_run_time=datetime.now(), replace_existing=True, coalesce=True, max_instances=1)
+
+def refresh_timezones():
+    user_timezones.ensure_fresh(get_client())
+
+def schedule_index_refresh():
+    """Periodically reload the open announcement index (multi-replica mode)"""
+    scheduler.add_job(refresh_open_index, "interval", seconds=OPEN_INDEX_REFRESH_SECONDS,
+                      id=INDEX_REFRESH_JOB_ID, replace_existing=True)
+
+def schedule_archive():
+    """Periodically move announcements past retention out of the live tables"""
+    scheduler.add_job(run_archive, "interval", hours=ARCHIVE_INTERVAL_HOURS, id=ARCHIVE_JOB_ID,
+                      kwargs={"stop": sweeps_stopping}, replace_existing=True, coalesce=True, max_instances=1)
+
+def schedule_reconcile():
+    """Periodically backfill receipts for checkmarks whose events were missed"""
+    scheduler.add_job(reconcile_reactions, "interval", seconds=RECONCILE_INTERVAL_SECONDS, id=RECONCILE_JOB_ID,
+                      replace_existing=True, coalesce=True, max_instances=1)
+
+def reconcile_reactions():
+    return reconciler.run(get_client())
+
+def stop_scheduler(timeout: float = None) -> bool:
+    """Stop scheduling jobs and wait up to `timeout` seconds for the running ones.
+
+    Sweeps and the archive stop after the batch or chunk in flight; reminders
+    they have not sent yet are released and go out from the next start (or
+    another replica). Returns False if a job was still running at the timeout.
+    """
+    sweeps_stopping.set()
+    reconciler.stop()
+    user_timezones.stop()
+    if not scheduler.running:
+        return True
+    # shutdown(wait=True) has no timeout of its own
+    stopper = threading.Thread(target=scheduler.shutdown, kwargs={"wait": True}, name="scheduler-shutdown",
+                               daemon=True)
+    stopper.start()
+    stopper.join(timeout)
+    return not stopper.is_alive()
+
+def refresh_open_index():
+    with session_scope() as db:
+        open_index.load(db)
+
+def reminder_text(channel_id: str, announcement_text: str) -> str:
+    channel_link = f"<#{channel_id}>"
+    return (f"Reminder: Please confirm you've read the announcement in {channel_link}.\n"
+            f"Message: '{announcement_text}'\n"
+            f"Please add a ✅ reaction to the original message to confirm you've read it.")
+
+def digest_line(channel_id: str, message_ts: str, announcement_text: str) -> str:
+    snippet = " ".join(announcement_text.split())
+    if len(snippet) > DIGEST_SNIPPET_CHARS:
+        snippet = snippet[:DIGEST_SNIPPET_CHARS - 1] + "…"
+    # Angle brackets would end the link early
+    snippet = snippet.replace("<", "‹").replace(">", "›")
+    return f"• <{permalink(channel_id, message_ts)}|{snippet}> in <#{channel_id}>"
+
+def digest_blocks(lines):
+    """Block Kit for one user's digest from pre-rendered announcement lines"""
+    count = len(lines)
+    noun = "announcement" if count == 1 else "announcements"
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": f"Reminder: you have {count} {noun} waiting for your ✅"}}]
+    blocks += [{"type": "section", "text": {"type": "mrkdwn", "text": line}} for line in lines[:DIGEST_MAX_ITEMS]]
+    if count > DIGEST_MAX_ITEMS:
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": f"…and {count - DIGEST_MAX_ITEMS} more"}})
+    blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": "Add a ✅ reaction to each message to confirm you've read it."}]})
+    return blocks
+
+def render_digests(rows):
+    """Group claimed rows by user and render every digest in the batch.
+
+    Returns {user_id: (target ids, blocks, fallback text)}. Each announcement's
+    line is rendered once and shared by all of its targets.
+    """
+    lines = {}
+    by_user = OrderedDict()
+    for row in rows:
+        line = lines.get(row.announcement_id)
+        if line is None:
+            line = lines[row.announcement_id] = digest_line(row.channel_id, row.message_ts, row.text)
+        target_ids, user_lines = by_user.setdefault(row.user_id, ([], []))
+        target_ids.append(row.target_id)
+        user_lines.append(line)
+    return {user_id: (target_ids, digest_blocks(user_lines), f"Reminder: {len(user_lines)} announcement(s) waiting for your ✅")
+            for user_id, (target_ids, user_lines) in by_user.items()}
+
+def _due_conditions(now: datetime):
+    return (Announcement.completed_at.is_(None),
+            ReadReceipt.id.is_(None),
+            Target.next_reminder_at <= now,
+            _lease_free())
+
+def unscheduled_targets_query(after_id: int = 0):
+    """Unread targets of open announcements that have no reminder slot yet, from `after_id` on"""
+    return (select(Target.id, Target.user_id, Target.last_reminded_at)
+            .join(Announcement, Announcement.id == Target.announcement_id)
+            .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+            .where(Announcement.completed_at.is_(None),
+                   ReadReceipt.id.is_(None),
+                   Target.next_reminder_at.is_(None),
+                   Target.reminder_error.is_(None),
+                   Target.id > after_id)
+            .order_by(Target.id))
+
+def schedule_reminders(db, now: datetime, zone_for, batch_size: int = REMINDER_BATCH_SIZE) -> int:
+    """Give unscheduled targets their next local REMINDER_HOUR slot; returns the number scheduled.
+
+    New targets get the first slot after `now`, reminded ones the first slot at
+    least MIN_REMINDER_INTERVAL after their last reminder. `zone_for(user_id)`
+    returns the recipient's time zone, or None to leave them for a later sweep.
+    """
+    targets = Target.__table__
+    set_slot = (targets.update()
+                .where(targets.c.id == bindparam("b_target_id"))
+                .values(next_reminder_at=bindparam("b_slot")))
+    scheduled = 0
+    last_id = 0
+    while True:
+        # Walk by id: targets without a known zone stay unscheduled and must not be read again
+        batch = db.execute(unscheduled_targets_query(last_id).limit(batch_size)).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        params = []
+        for target_id, user_id, last_reminded_at in batch:
+            zone = zone_for(user_id)
+            if zone is None:
+                continue
+            after = now if last_reminded_at is None else max(now, last_reminded_at + MIN_REMINDER_INTERVAL)
+            params.append({"b_target_id": target_id,
+                           "b_slot": next_reminder_slot(user_id, zone, after, REMINDER_HOUR)})
+        if params:
+            db.execute(set_slot, params)
+            db.commit()
+        scheduled += len(params)
+    return scheduled
+
+def due_reminders_query(now: datetime):
+    """Unread, unleased targets of open announcements whose reminder slot has passed"""
+    return (select(Target.id.label("target_id"), Target.user_id, Announcement.id.label("announcement_id"),
+                   Announcement.channel_id, Announcement.message_ts, Announcement.text)
+            .join(Announcement, Announcement.id == Target.announcement_id)
+            .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+            .where(*_due_conditions(now))
+            .order_by(Target.id))
+
+def due_users_query(now: datetime):
+    """Users with at least one due reminder"""
+    return (select(Target.user_id)
+            .join(Announcement, Announcement.id == Target.announcement_id)
+            .outerjoin(ReadReceipt, ReadReceipt.target_id == Target.id)
+            .where(*_due_conditions(now))
+            .group_by(Target.user_id)
+            .order_by(Target.user_id))
+
+def _lease_free():
+    # Leases run on the wall clock, not on a sweep's `now`, which is fixed when the sweep starts
+    clock = datetime.utcnow()
+    return or_(Target.lease_expires_at.is_(None), Target.lease_expires_at < clock)
+
+def claim_due_reminders(db, now: datetime, limit: int, replica_id: str = REPLICA_ID, user_ids=None):
+    """Lease up to `limit` due targets (of `user_ids`, if given) to `replica_id` and commit.
+
+    Returns the claimed due_reminders_query rows. `now` only decides what is
+    due; the lease runs for REMINDER_LEASE from the time of the claim, so a
+    long sweep does not hand out leases that have already expired.
+
+    On Postgres, FOR UPDATE SKIP LOCKED lets replicas claim disjoint batches
+    without waiting on each other. The conditional UPDATE keeps a claim
+    exclusive on databases without row locks, where writers are serialized.
+    """
+    expires = datetime.utcnow() + REMINDER_LEASE
+    query = due_reminders_query(now)
+    if user_ids is not None:
+        query = query.where(Target.user_id.in_(user_ids))
+    rows = db.execute(query.limit(limit).with_for_update(skip_locked=True, of=Target)).all()
+    if not rows:
+        return []
+    target_ids = [row[0] for row in rows]
+    claimed = db.execute(update(Target)
+                         .where(Target.id.in_(target_ids), _lease_free())
+                         .values(lease_owner=replica_id, lease_expires_at=expires)
+                         .execution_options(synchronize_session=False))
+    db.commit()
+    if claimed.rowcount == len(rows):
+        return rows
+    # Another replica won part of the batch between our SELECT and UPDATE
+    owned = set(db.execute(select(Target.id).where(Target.id.in_(target_ids),
+                                                   Target.lease_owner == replica_id,
+                                                   Target.lease_expires_at == expires)).scalars())
+    return [row for row in rows if row[0] in owned]
+
+def complete_reminders(db, target_ids, now: datetime):
+    """Record delivered reminders and release their leases; the next sweep reschedules them"""
+    db.execute(update(Target)
+               .where(Target.id.in_(target_ids))
+               .values(last_reminded_at=now, next_reminder_at=None, lease_owner=None, lease_expires_at=None)
+               .execution_options(synchronize_session=False))
+
+def release_reminders(db, target_ids):
+    """Drop the leases of claimed reminders that were not sent, so they are due again at once"""
+    if not target_ids:
+        return
+    db.execute(update(Target)
+               .where(Target.id.in_(target_ids))
+               .values(lease_owner=None, lease_expires_at=None)
+               .execution_options(synchronize_session=False))
+
+def retire_reminders(db, target_ids, error: str):
+    """Stop reminding targets whose reminders Slack rejected for good, releasing their leases"""
+    db.execute(update(Target)
+               .where(Target.id.in_(target_ids))
+               .values(reminder_error=error, next_reminder_at=None, lease_owner=None, lease_expires_at=None)
+               .execution_options(synchronize_session=False))
+
+def renew_leases(db, target_ids, expires: datetime, replica_id: str = REPLICA_ID):
+    """Push back the expiry of this replica's leases on `target_ids` and commit"""
+    db.execute(update(Target)
+               .where(Target.id.in_(target_ids), Target.lease_owner == replica_id)
+               .values(lease_expires_at=expires)
+               .execution_options(synchronize_session=False))
+    db.commit()
+
+def lease_renewer(db, target_ids):
+    """Callback that renews a claimed batch's lease once half of it has passed.
+
+    Rate limits and Retry-After waits can make a batch outlast REMINDER_LEASE;
+    without renewal another replica would claim and remind the same targets.
+    """
+    renewed = time.monotonic()
+
+    def renew():
+        nonlocal renewed
+        if time.monotonic() - renewed < REMINDER_LEASE.total_seconds() / 2:
+            return
+        renewed = time.monotonic()
+        renew_leases(db, target_ids, datetime.utcnow() + REMINDER_LEASE)
+    return renew
+
+def wait_for_sends(futures, renew=None):
+    """Wait for a batch of dispatcher futures, calling renew() while they are pending.
+
+    Once sweeps are stopping, cancel the ones not started yet.
+    """
+    pending = futures
+    while pending:
+        _, pending = wait(pending, timeout=STOP_POLL_SECONDS)
+        if pending and renew is not None:
+            renew()
+        if pending and sweeps_stopping.is_set():
+            # Calls already being sent cannot be cancelled; let them finish. Cancelled ones
+            # only count as done for wait() once a worker dequeues them, so skip those.
+            wait([future for future in pending if not future.cancel()])
+            return
+
+def settle_batch(db, sends, now: datetime) -> int:
+    """Record a finished batch; returns the number of sends delivered. The caller commits.
+
+    `sends` maps each dispatcher future to the target ids it reminds.
+    Delivered targets are complete and cancelled ones released at once.
+    Failures in UNDELIVERABLE_ERRORS retire their targets; any other failure
+    keeps its lease as a backoff, and a sweep retries it once the lease expires.
+    """
+    delivered, cancelled, retired = [], [], {}
+    for future, target_ids in sends.items():
+        if future.cancelled():
+            cancelled.extend(target_ids)
+            continue
+        error = future.exception()
+        if error is None:
+            delivered.append(future)
+        elif isinstance(error, SlackApiError) and error.response.get("error") in UNDELIVERABLE_ERRORS:
+            retired.setdefault(error.response["error"], []).extend(target_ids)
+    complete_reminders(db, [tid for future in delivered for tid in sends[future]], now)
+    release_reminders(db, cancelled)
+    for error, target_ids in retired.items():
+        logger.warning(f"Not reminding {len(target_ids)} targets again: {error}")
+        retire_reminders(db, target_ids, error)
+    return len(delivered)
+
+@metrics.timed("reminder_sweep")
+def send_due_reminders(batch_size: int = REMINDER_BATCH_SIZE, now: datetime = None):
+    """Claim and remind due targets batch by batch; returns the number sent.
+
+    Every replica runs this sweep. Each batch is leased to this replica first,
+    so replicas split the work and no target is reminded twice. How failed and
+    cancelled sends are handled is described in settle_batch(); on shutdown,
+    sends not yet started are cancelled.
+    """
+    now = now or datetime.utcnow()
+    client = get_client()
+    sent = 0
+    with session_scope() as db:
+        if user_timezones.ready:
+            # Slots are final, so wait for real time zones rather than assign default ones
+            schedule_reminders(db, now, user_timezones.known_zone)
+        while not sweeps_stopping.is_set():
+            batch = claim_due_reminders(db, now, batch_size)
+            if not batch:
+                break
+            # Hand the batch to the rate-limited dispatcher and wait for it to drain
+            sends = {dispatcher.submit(client, "chat_postMessage", priority=BACKGROUND, channel=row.user_id,
+                                       text=reminder_text(row.channel_id, row.text)): [row.target_id]
+                     for row in batch}
+            wait_for_sends(list(sends), lease_renewer(db, [row.target_id for row in batch]))
+            sent += settle_batch(db, sends, now)
+            db.commit()
+    return sent
+
+@metrics.timed("reminder_digest")
+def send_due_digests(batch_size: int = REMINDER_BATCH_SIZE, now: datetime = None):
+    """Send each user with due reminders one digest DM; returns the number of digests sent.
+
+    Works through due users `batch_size` at a time, claiming all of a user's
+    due targets together so they land in a single message.
+    """
+    now = now or datetime.utcnow()
+    client = get_client()
+    sent = 0
+    with session_scope() as db:
+        if user_timezones.ready:
+            schedule_reminders(db, now, user_timezones.known_zone)
+        while not sweeps_stopping.is_set():
+            user_ids = db.execute(due_users_query(now).limit(batch_size)).scalars().all()
+            if not user_ids:
+                break
+            batch = claim_due_reminders(db, now, None, user_ids=user_ids)
+            sends = {dispatcher.submit(client, "chat_postMessage", priority=BACKGROUND, channel=user_id,
+                                       text=text, blocks=blocks): target_ids
+                     for user_id, (target_ids, blocks, text) in render_digests(batch).items()}
+            wait_for_sends(list(sends), lease_renewer(db, [row.target_id for row in batch]))
+            sent += settle_batch(db, sends, now)
+            db.commit()
+    return sent
@@ -1,11 +1,23 @@
+import io
 import os
+import threading
+import time
 import unittest
-from datetime import datetime
-from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta
+from unittest.mock import ANY, MagicMock, patch
 
 from dotenv import load_dotenv
-from .models import Announcement, Base, ReadReceipt, SessionLocal, Target, engine
-from .scheduler import schedule_user_reminder
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+from sqlalchemy import create_engine, text
+from .announcements import create_announcement, record_receipt
+from .dispatcher import TIER_RATES, Dispatcher
+from .hot_index import OpenAnnouncementIndex
+from .models import (Announcement, Base, ChannelStats, ReadReceipt, SessionLocal, Target, TimedQueuePool, engine,
+                     engine_options, pool_stats, session_scope)
+from .parsing import split_subcommand
+from .report import export_rows, status_text, write_export
+from .timezones import UserTimezoneCache, get_zone, next_reminder_slot
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +25,15 @@ load_dotenv()
 # Create test database
 Base.metadata.create_all(bind=engine)
 
+
+def loaded_timezones(zones):
+    """A time zone cache refreshed from a users.list listing `zones` (user id -> zone or None)"""
+    client = MagicMock()
+    client.users_list.return_value = {"ok": True, "members": [{"id": uid, "tz": tz} for uid, tz in zones.items()]}
+    cache = UserTimezoneCache(dispatcher=Dispatcher(max_retries=0, tier_rates={tier: 60000 for tier in TIER_RATES}))
+    cache.ensure_fresh(client)
+    return cache
+
 class TestSlackReadConfirm(unittest.TestCase):
     def setUp(self):
         self.db = SessionLocal()
@@ -20,6 +41,7 @@ class TestSlackReadConfirm(unittest.TestCase):
         self.db.query(ReadReceipt).delete()
         self.db.query(Target).delete()
         self.db.query(Announcement).delete()
+        self.db.query(ChannelStats).delete()
         self.db.commit()
         
     def tearDown(self):
@@ -103,13 +125,11 @@ class TestSlackReadConfirm(unittest.TestCase):
         self.assertIsNotNone(saved_receipt)
         self.assertEqual(saved_receipt.target_id, tgt.id)
         
-    @patch('slack_read_confirm.scheduler.get_app')
-    def test_scheduler(self, mock_get_app):
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_scheduler(self, mock_get_client):
         # Mock the Slack client
-        mock_app = MagicMock()
         mock_client = MagicMock()
-        mock_app.client = mock_client
-        mock_get_app.return_value = mock_app
+        mock_get_client.return_value = mock_client
         
         # Create test announcement
         ann = Announcement(
@@ -122,18 +142,20 @@ class TestSlackReadConfirm(unittest.TestCase):
         self.db.commit()
         self.db.refresh(ann)
         
-        # Create target
+        # Create a target whose reminder slot has come
+        now = datetime.utcnow()
         tgt = Target(
             announcement_id=ann.id,
-            user_id="U67890"
+            user_id="U67890",
+            next_reminder_at=now
         )
         self.db.add(tgt)
         self.db.commit()
         self.db.refresh(tgt)
         
-        # Test the reminder function directly
-        from .scheduler import send_reminder
-        send_reminder(ann.id, tgt.id, tgt.user_id)
+        # The sweep claims the due target and sends its reminder
+        from .scheduler import send_due_reminders
+        self.assertEqual(send_due_reminders(now=now), 1)
         
         # Verify that the Slack client was called
         mock_client.chat_postMessage.assert_called_once()
@@ -141,5 +163,413 @@ class TestSlackReadConfirm(unittest.TestCase):
         self.assertEqual(kwargs['channel'], "U67890")
         self.assertIn("Test announcement", kwargs['text'])
 
+    def test_create_announcement_batched(self):
+        user_ids = ["U1", "U2", "U3"]
+        announcement_id, targets = create_announcement(
+            self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", user_ids
+        )
+
+        # Every target is returned with its new id
+        self.assertEqual(sorted(uid for _, uid in targets), user_ids)
+        saved = self.db.query(Target).filter_by(announcement_id=announcement_id).all()
+        self.assertEqual({t.id for t in saved}, {tid for tid, _ in targets})
+
+    def test_record_receipt_idempotent(self):
+        announcement_id, _ = create_announcement(
+            self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1"]
+        )
+
+        self.assertEqual(record_receipt(self.db, "C12345", "1234567890.123456", "U1"), (announcement_id, True, True))
+        # A repeated reaction does not create a second receipt
+        self.assertEqual(record_receipt(self.db, "C12345", "1234567890.123456", "U1"), (announcement_id, False, False))
+        self.assertEqual(self.db.query(ReadReceipt).count(), 1)
+
+        # Non-targets and ordinary messages are ignored
+        self.assertIsNone(record_receipt(self.db, "C12345", "1234567890.123456", "U2"))
+        self.assertIsNone(record_receipt(self.db, "C12345", "9999999999.000000", "U1"))
+
+    def test_completion_fires_once(self):
+        announcement_id, _ = create_announcement(
+            self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2"]
+        )
+
+        first = record_receipt(self.db, "C12345", "1234567890.123456", "U1")
+        last = record_receipt(self.db, "C12345", "1234567890.123456", "U2")
+        self.assertFalse(first.completed)
+        self.assertTrue(last.completed)
+
+        ann = self.db.query(Announcement).filter_by(id=announcement_id).one()
+        self.assertEqual((ann.target_count, ann.read_count), (2, 2))
+        self.assertIsNotNone(ann.completed_at)
+
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_send_due_reminders(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+
+        _, targets = create_announcement(
+            self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2", "U3"]
+        )
+        read_target_id = next(tid for tid, uid in targets if uid == "U1")
+        self.db.add(ReadReceipt(target_id=read_target_id, timestamp=datetime.utcnow()))
+        self.db.commit()
+
+        from .scheduler import send_due_reminders
+        patcher = patch('slack_read_confirm.scheduler.user_timezones', loaded_timezones({"U1": None, "U2": None, "U3": None}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # New targets are scheduled for their next local reminder hour, not reminded straight away
+        now = datetime.utcnow()
+        self.assertEqual(send_due_reminders(batch_size=1, now=now), 0)
+        tomorrow = now + timedelta(days=1, hours=2)
+        self.assertEqual(send_due_reminders(batch_size=1, now=tomorrow), 2)
+
+        # Only unread targets are reminded
+        reminded = {c.kwargs['channel'] for c in mock_client.chat_postMessage.call_args_list}
+        self.assertEqual(reminded, {"U2", "U3"})
+        # Time zones come from the background refresh, never from the sweep itself
+        mock_client.users_list.assert_not_called()
+
+        # A second sweep the same day finds nothing due
+        mock_client.reset_mock()
+        self.assertEqual(send_due_reminders(now=tomorrow + timedelta(hours=1)), 0)
+        mock_client.chat_postMessage.assert_not_called()
+
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_sweep_commits_each_batch(self, mock_get_client):
+        from . import scheduler
+
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement",
+                            ["U21", "U22", "U23", "U24"])
+        now = datetime.utcnow()
+        self.db.query(Target).update({"next_reminder_at": now})
+        self.db.commit()
+
+        complete = scheduler.complete_reminders
+        batches = []
+
+        def crash_on_second_batch(db, target_ids, now):
+            batches.append(target_ids)
+            if len(batches) == 2:
+                raise RuntimeError("process died")
+            complete(db, target_ids, now)
+
+        with patch.object(scheduler, "complete_reminders", crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                scheduler.send_due_reminders(batch_size=2, now=now)
+        # The first batch's reminders stay recorded, so a restart does not send them again
+        self.db.expire_all()
+        reminded = self.db.query(Target.id).filter(Target.last_reminded_at.isnot(None)).all()
+        self.assertEqual(sorted(row.id for row in reminded), sorted(batches[0]))
+
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_send_due_digests(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+
+        # Users not DMed by other tests, so the per-channel send limit does not kick in
+        for i in range(3):
+            create_announcement(self.db, "U12345", "C12345", f"1234567890.00000{i}", f"Announcement {i}", ["U7", "U8"])
+        record_receipt(self.db, "C12345", "1234567890.000000", "U8")
+        self.db.commit()
+
+        from .scheduler import send_due_digests
+        patcher = patch('slack_read_confirm.scheduler.user_timezones', loaded_timezones({"U7": None, "U8": None}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # One DM per user however many announcements they have outstanding
+        now = datetime.utcnow()
+        self.assertEqual(send_due_digests(batch_size=1, now=now), 0)
+        tomorrow = now + timedelta(days=1, hours=2)
+        self.assertEqual(send_due_digests(batch_size=1, now=tomorrow), 2)
+        digests = {c.kwargs['channel']: c.kwargs for c in mock_client.chat_postMessage.call_args_list}
+        self.assertEqual(set(digests), {"U7", "U8"})
+        u7_text = "\n".join(block["text"]["text"] for block in digests["U7"]["blocks"] if block["type"] == "section")
+        self.assertIn("3 announcements", u7_text)
+        self.assertIn("https://slack.com/archives/C12345/p1234567890000002", u7_text)
+        self.assertEqual(len(digests["U8"]["blocks"]), 4)
+
+        mock_client.reset_mock()
+        self.assertEqual(send_due_digests(now=tomorrow), 0)
+        mock_client.chat_postMessage.assert_not_called()
+
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_sweep_waits_for_time_zones(self, mock_get_client):
+        from .scheduler import REMINDER_HOUR, send_due_reminders
+
+        mock_get_client.return_value = MagicMock()
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2"])
+        self.db.commit()
+        now = datetime.utcnow()
+
+        # Right after a start users.list has not been paged yet: no slot is fixed in the default zone
+        cold = UserTimezoneCache(dispatcher=Dispatcher(max_retries=0))
+        with patch('slack_read_confirm.scheduler.user_timezones', cold):
+            send_due_reminders(now=now)
+        self.assertEqual(self.db.query(Target).filter(Target.next_reminder_at.isnot(None)).count(), 0)
+
+        # Once loaded, known users get their local slot; U2 joined after the refresh and waits for the next one
+        zones = loaded_timezones({"U1": "Asia/Tokyo"})
+        with patch('slack_read_confirm.scheduler.user_timezones', zones):
+            send_due_reminders(now=now)
+        self.db.expire_all()
+        slots = dict(self.db.query(Target.user_id, Target.next_reminder_at))
+        self.assertEqual(slots["U1"], next_reminder_slot("U1", get_zone("Asia/Tokyo"), now, REMINDER_HOUR))
+        self.assertIsNone(slots["U2"])
+
+    def test_reminder_claims_are_exclusive_across_replicas(self):
+        from .scheduler import claim_due_reminders, complete_reminders
+
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2", "U3"])
+        now = datetime.utcnow()
+        self.db.query(Target).update({"next_reminder_at": now})
+        self.db.commit()
+
+        first = claim_due_reminders(self.db, now, 2, replica_id="replica-a")
+        second = claim_due_reminders(self.db, now, 2, replica_id="replica-b")
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({row[0] for row in first} & {row[0] for row in second})
+        self.assertEqual(claim_due_reminders(self.db, now, 2, replica_id="replica-c"), [])
+
+        # Delivered reminders are not due again; an abandoned lease is taken over once it expires
+        complete_reminders(self.db, [row[0] for row in first], now)
+        self.db.query(Target).filter(Target.lease_owner == "replica-b").update(
+            {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+        self.db.commit()
+        taken_over = claim_due_reminders(self.db, now, 10, replica_id="replica-c")
+        self.assertEqual([row[0] for row in taken_over], [row[0] for row in second])
+
+    @patch('slack_read_confirm.scheduler.REMINDER_LEASE', timedelta(seconds=0.2))
+    def test_lease_runs_from_the_claim_not_the_sweep_start(self):
+        from .scheduler import claim_due_reminders, complete_reminders
+
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2"])
+        now = datetime.utcnow()
+        self.db.query(Target).update({"next_reminder_at": now})
+        self.db.commit()
+
+        first = claim_due_reminders(self.db, now, 1, replica_id="replica-a")
+        complete_reminders(self.db, [row[0] for row in first], now)
+        self.db.commit()
+        # The same sweep claims its second batch once a whole lease period has passed since it started
+        time.sleep(0.3)
+        second = claim_due_reminders(self.db, now, 1, replica_id="replica-a")
+        self.assertEqual(len(second), 1)
+        with SessionLocal() as other_replica:
+            self.assertEqual(claim_due_reminders(other_replica, datetime.utcnow(), 10, replica_id="replica-b"), [])
+
+    @patch('slack_read_confirm.scheduler.REMINDER_LEASE', timedelta(seconds=0.4))
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_slow_batch_keeps_its_lease(self, mock_get_client):
+        from .scheduler import claim_due_reminders, send_due_reminders
+
+        def slow_post(**kwargs):
+            time.sleep(0.1)
+            return {"ok": True}
+
+        mock_client = MagicMock()
+        mock_client.chat_postMessage.side_effect = slow_post
+        mock_get_client.return_value = mock_client
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement",
+                            [f"U3{i}" for i in range(8)])
+        now = datetime.utcnow()
+        self.db.query(Target).update({"next_reminder_at": now})
+        self.db.commit()
+
+        # One worker: the batch takes about twice the lease
+        with patch('slack_read_confirm.scheduler.dispatcher',
+                   Dispatcher(workers=1, tier_rates={tier: 60000 for tier in TIER_RATES}, channel_rate=60000)):
+            sweep = threading.Thread(target=send_due_reminders, kwargs={"now": now})
+            sweep.start()
+            time.sleep(0.6)
+            with SessionLocal() as other_replica:
+                taken_over = claim_due_reminders(other_replica, datetime.utcnow(), 10, replica_id="replica-b")
+            sweep.join(timeout=10)
+
+        # The lease was renewed while the sends were pending, so nothing was claimed twice
+        self.assertEqual(taken_over, [])
+        self.assertEqual(mock_client.chat_postMessage.call_count, 8)
+        self.db.expire_all()
+        self.assertEqual(self.db.query(Target).filter(Target.last_reminded_at.isnot(None)).count(), 8)
+
+    @patch('slack_read_confirm.scheduler.get_client')
+    def test_failed_sends_follow_one_policy(self, mock_get_client):
+        from .scheduler import claim_due_reminders, send_due_reminders
+
+        def post(channel, **kwargs):
+            if channel == "U1":
+                response = SlackResponse(client=None, http_verb="POST", api_url="", req_args={},
+                                         data={"ok": False, "error": "user_not_found"}, headers={}, status_code=200)
+                raise SlackApiError("user_not_found", response)
+            if channel == "U2":
+                raise OSError("connection reset")
+            return {"ok": True}
+
+        mock_client = MagicMock()
+        mock_client.chat_postMessage.side_effect = post
+        mock_get_client.return_value = mock_client
+        create_announcement(self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2", "U3"])
+        now = datetime.utcnow()
+        self.db.query(Target).update({"next_reminder_at": now})
+        self.db.commit()
+
+        with patch('slack_read_confirm.scheduler.dispatcher',
+                   Dispatcher(max_retries=0, tier_rates={tier: 60000 for tier in TIER_RATES}, channel_rate=60000)):
+            self.assertEqual(send_due_reminders(now=now), 1)
+
+        self.db.expire_all()
+        targets = {target.user_id: target for target in self.db.query(Target)}
+        # A user Slack cannot reach is retired instead of retried forever
+        self.assertEqual(targets["U1"].reminder_error, "user_not_found")
+        self.assertIsNone(targets["U1"].next_reminder_at)
+        self.assertIsNone(targets["U1"].lease_owner)
+        # A transient failure keeps its lease as a backoff and is retried once it expires
+        self.assertIsNotNone(targets["U2"].lease_owner)
+        self.assertIsNone(targets["U2"].last_reminded_at)
+        self.assertIsNotNone(targets["U3"].last_reminded_at)
+        later = datetime.utcnow() + timedelta(days=2)
+        self.db.query(Target).update({"lease_expires_at": now})
+        self.db.commit()
+        self.assertEqual([row[1] for row in claim_due_reminders(self.db, later, 10, replica_id="replica-b")], ["U2"])
+
+    def test_session_scope_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with session_scope() as db:
+                db.add(Announcement(owner_id="U12345", channel_id="C12345", message_ts="1.0", text="Rolled back"))
+                db.flush()
+                raise RuntimeError("boom")
+
+        with session_scope() as db:
+            db.add(Announcement(owner_id="U12345", channel_id="C12345", message_ts="2.0", text="Committed"))
+
+        self.assertEqual([a.text for a in self.db.query(Announcement).all()], ["Committed"])
+
+    def test_indexes_are_only_deduplicated_when_missing(self):
+        from . import db_migrate
+
+        # Would fail if run: the tables are only rewritten for a missing unique index
+        with patch.object(db_migrate, "DEDUPLICATE_STATEMENTS", ["SELECT no_such_column FROM targets"]):
+            self.assertEqual(db_migrate.create_indexes(), [])
+            self.db.close()
+            with engine.begin() as conn:
+                conn.execute(text("DROP INDEX uq_targets_announcement_user"))
+            with self.assertRaises(Exception):
+                db_migrate.create_indexes()
+        self.assertEqual(db_migrate.create_indexes(), ["uq_targets_announcement_user"])
+
+    def test_pool_configuration_and_stats(self):
+        options = engine_options("postgresql://localhost:5432/slack_read_confirm")
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertIn("pool_pre_ping", options)
+        # SQLite files are pooled too, and shareable across the job threads
+        options = engine_options("sqlite:///local.db")
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertFalse(options["connect_args"]["check_same_thread"])
+        self.assertNotIn("poolclass", engine_options("sqlite://"))
+
+        pooled = create_engine("sqlite://", poolclass=TimedQueuePool, pool_size=1)
+        before = pool_stats.checkouts
+        with pooled.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        self.assertEqual(pool_stats.checkouts, before + 1)
+        pooled.dispose()
+
+    def test_app_factory_is_lazy(self):
+        from . import app
+        from .scheduler import scheduler
+
+        # Importing the entry point neither starts the scheduler nor needs a token
+        self.assertFalse(scheduler.running)
+        bolt_app = app.create_app(token="xoxb-test", signing_secret="test", token_verification_enabled=False)
+        self.assertFalse(scheduler.running)
+        self.assertEqual(len(bolt_app._listeners), 4)
+
+    def test_open_announcement_index(self):
+        create_announcement(self.db, "U12345", "C12345", "1.0", "Open", ["U1", "U2"])
+        create_announcement(self.db, "U12345", "C12345", "2.0", "Done", ["U1"])
+        record_receipt(self.db, "C12345", "1.0", "U1")
+        record_receipt(self.db, "C12345", "2.0", "U1")
+        self.db.commit()
+
+        index = OpenAnnouncementIndex()
+        # Before loading, everything falls through to the DB
+        self.assertTrue(index.might_be_pending("C12345", "9.0", "U1"))
+
+        index.load(self.db)
+        self.assertEqual(index.stats()["targets"], 1)
+        self.assertTrue(index.might_be_pending("C12345", "1.0", "U2"))
+        # Already read, completed, non-target and ordinary messages are dropped
+        self.assertFalse(index.might_be_pending("C12345", "1.0", "U1"))
+        self.assertFalse(index.might_be_pending("C12345", "2.0", "U1"))
+        self.assertFalse(index.might_be_pending("C12345", "1.0", "U3"))
+        self.assertFalse(index.might_be_pending("C12345", "9.0", "U1"))
+
+        index.add("C12345", "3.0", ["U4"])
+        self.assertTrue(index.might_be_pending("C12345", "3.0", "U4"))
+        index.discard("C12345", "1.0", "U2")
+        index.remove("C12345", "3.0")
+        self.assertEqual(index.stats()["announcements"], 0)
+
+        # Shared with other replicas: recent unknown messages may be announcements it has not loaded yet
+        shared = OpenAnnouncementIndex(shared=True)
+        shared.load(self.db)
+        self.assertTrue(shared.might_be_pending("C12345", f"{shared.loaded_at:.6f}", "U1"))
+        self.assertFalse(shared.might_be_pending("C12345", "9.0", "U1"))
+
+    def test_status_report(self):
+        first, _ = create_announcement(self.db, "U12345", "C1", "1.0", "First", ["U1", "U2"])
+        create_announcement(self.db, "U12345", "C1", "2.0", "Second", ["U1"])
+        create_announcement(self.db, "U12345", "C2", "3.0", "Elsewhere", [])
+        record_receipt(self.db, "C1", "1.0", "U1")
+        record_receipt(self.db, "C1", "1.0", "U1")
+        record_receipt(self.db, "C1", "2.0", "U1")
+
+        # Totals are maintained as announcements and receipts are written
+        stats = {s.channel_id: s for s in self.db.query(ChannelStats).filter_by(owner_id="U12345")}
+        self.assertEqual((stats["C1"].announcement_count, stats["C1"].target_count,
+                          stats["C1"].read_count, stats["C1"].completed_count), (2, 3, 2, 1))
+        self.assertEqual(stats["C2"].announcement_count, 1)
+
+        self.assertEqual(split_subcommand("Status 12"), ("status", "12"))
+        self.assertEqual(split_subcommand("<@U1> statuses"), (None, "<@U1> statuses"))
+
+        summary = status_text(self.db, "U12345")
+        self.assertIn("<#C1>: 2 announcements, 2/3 read, 1 complete", summary)
+        detail = status_text(self.db, "U12345", first)
+        self.assertIn("1/2 read", detail)
+        self.assertIn("Not read yet: <@U2>", detail)
+        # Other owners' announcements are not visible
+        self.assertIn("no announcement", status_text(self.db, "U99999", first))
+        self.assertIn("haven't created", status_text(self.db, "U99999"))
+
+        out = io.StringIO()
+        self.assertEqual(write_export(export_rows(self.db, owner_id="U12345", channel_id="C1"), out, "csv"), 2)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("announcement_id,owner_id,channel_id"))
+        self.assertIn(",2,1,1,", lines[1])
+
+    @patch('slack_read_confirm.listeners.dispatcher')
+    def test_app_mention_creates_targets(self, mock_dispatcher):
+        from .listeners import process_app_mention
+
+        mock_dispatcher.call.return_value = {"ok": True, "ts": "5.000001"}
+        event = {"user": "U12345", "channel": "C12345",
+                 "text": "<@UBOT> read-confirm <@U1> <@U2> Office CLOSED on Monday"}
+        client = MagicMock()
+        process_app_mention(event, client, MagicMock(), bot_user_id="UBOT")
+
+        mock_dispatcher.call.assert_called_once_with(ANY, "chat_postMessage", timeout=ANY, channel="C12345",
+                                                     text="Office CLOSED on Monday")
+        ann = self.db.query(Announcement).filter_by(message_ts="5.000001").one()
+        self.assertEqual((ann.owner_id, ann.text, ann.target_count), ("U12345", "Office CLOSED on Monday", 2))
+        self.assertEqual(sorted(t.user_id for t in self.db.query(Target).filter_by(announcement_id=ann.id)),
+                         ["U1", "U2"])
+        # The reply goes through the rate-limited dispatcher like every other post
+        mock_dispatcher.submit.assert_called_once_with(client, "chat_postMessage", channel="C12345", text=ANY)
+        self.assertIn("for 2 people", mock_dispatcher.submit.call_args.kwargs["text"])
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from .announcements import create_announcement, record_receipt
+from .archive import run_archive, write_chunk
+from .hot_index import open_index
+from .models import Announcement, Base, ChannelStats, ReadReceipt, SessionLocal, Target, engine
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        for model in (ReadReceipt, Target, Announcement, ChannelStats):
+            self.db.query(model).delete()
+        self.db.commit()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.now = datetime.utcnow()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _announce(self, ts, targets, age_days, read=()):
+        announcement_id, _ = create_announcement(self.db, "U12345", "C12345", ts, f"Announcement {ts}", targets)
+        for user_id in read:
+            record_receipt(self.db, "C12345", ts, user_id)
+        self.db.query(Announcement).filter_by(id=announcement_id).update(
+            {"created_at": self.now - timedelta(days=age_days)})
+        if len(read) == len(targets):
+            self.db.query(Announcement).filter_by(id=announcement_id).update(
+                {"completed_at": self.now - timedelta(days=age_days)})
+        self.db.commit()
+        return announcement_id
+
+    def _archived(self):
+        records = []
+        for name in sorted(os.listdir(self.tmpdir.name)):
+            with gzip.open(os.path.join(self.tmpdir.name, name), "rt") as f:
+                records.extend(json.loads(line) for line in f)
+        return records
+
+    def test_moves_completed_and_expired_announcements(self):
+        old_done = self._announce("1.0", ["U1", "U2"], age_days=40, read=["U1", "U2"])
+        recent_done = self._announce("2.0", ["U1"], age_days=5, read=["U1"])
+        expired = self._announce("3.0", ["U1", "U2"], age_days=100, read=["U1"])
+        still_open = self._announce("4.0", ["U1"], age_days=40)
+        open_index.add("C12345", "3.0", ["U2"])
+
+        dry = run_archive(self.tmpdir.name, now=self.now, retention_days=30, expire_days=90, dry_run=True)
+        self.assertEqual(dry["announcements"], 2)
+        self.assertEqual(self.db.query(Announcement).count(), 4)
+
+        totals = run_archive(self.tmpdir.name, now=self.now, retention_days=30, expire_days=90,
+                             batch_size=1)
+        self.assertEqual(totals, {"announcements": 2, "targets": 4, "files": 2})
+
+        live = {ann.id for ann in self.db.query(Announcement)}
+        self.assertEqual(live, {recent_done, still_open})
+        self.assertEqual(self.db.query(Target).count(), 2)
+        self.assertEqual(self.db.query(ReadReceipt).count(), 1)
+        # The expired announcement is forgotten by the index too
+        self.assertNotIn(("C12345", "3.0"), open_index._pending)
+
+        records = self._archived()
+        self.assertEqual([r["id"] for r in records], [old_done, expired])
+        self.assertEqual([t["user_id"] for t in records[1]["targets"]], ["U1", "U2"])
+        self.assertIsNotNone(records[1]["targets"][0]["read_at"])
+        self.assertIsNone(records[1]["targets"][1]["read_at"])
+
+        # Nothing left past retention: a second run is a no-op
+        self.assertEqual(run_archive(self.tmpdir.name, now=self.now, retention_days=30, expire_days=90)["files"], 0)
+
+    def test_channel_stats_drop_archived_announcements(self):
+        self._announce("1.0", ["U1", "U2"], age_days=40, read=["U1", "U2"])
+        self._announce("2.0", ["U1", "U2", "U3"], age_days=100, read=["U1"])
+        self._announce("3.0", ["U1"], age_days=5, read=["U1"])
+
+        run_archive(self.tmpdir.name, now=self.now, retention_days=30, expire_days=90)
+        stats = self.db.query(ChannelStats).filter_by(owner_id="U12345", channel_id="C12345").one()
+        # Only the recent announcement is still counted
+        self.assertEqual((stats.announcement_count, stats.target_count, stats.read_count, stats.completed_count),
+                         (1, 1, 1, 1))
+
+    def test_chunks_are_bounded_by_target_rows(self):
+        for i in range(5):
+            self._announce(f"{i}.0", ["U1", "U2", "U3"], age_days=40, read=["U1", "U2", "U3"])
+
+        totals = run_archive(self.tmpdir.name, now=self.now, retention_days=30, max_rows=6)
+        # Two announcements (six targets) per transaction
+        self.assertEqual(totals["files"], 3)
+        self.assertEqual(len(self._archived()), 5)
+        self.assertEqual(self.db.query(Announcement).count(), 0)
+
+    def test_stop_ends_the_run_after_the_chunk_in_flight(self):
+        for i in range(3):
+            self._announce(f"{i}.0", ["U1"], age_days=40, read=["U1"])
+        stop = threading.Event()
+
+        def write_and_stop(directory, records):
+            stop.set()
+            return write_chunk(directory, records)
+
+        with patch("slack_read_confirm.archive.write_chunk", side_effect=write_and_stop):
+            totals = run_archive(self.tmpdir.name, now=self.now, retention_days=30, batch_size=1, stop=stop)
+        self.assertEqual(totals["files"], 1)
+        self.assertEqual(self.db.query(Announcement).count(), 2)
+
+    def test_interrupted_run_is_resumed(self):
+        announcement_id = self._announce("1.0", ["U1"], age_days=40, read=["U1"])
+        # A crash mid-write leaves a partial temporary file and all of the rows
+        leftover = os.path.join(self.tmpdir.name,
+                                f"announcements-{announcement_id:012d}-{announcement_id:012d}.jsonl.gz.tmp")
+        with open(leftover, "wb") as f:
+            f.write(b"partial")
+
+        run_archive(self.tmpdir.name, now=self.now, retention_days=30)
+        self.assertEqual(self.db.query(Announcement).count(), 0)
+        self.assertEqual(os.listdir(self.tmpdir.name), [os.path.basename(leftover)[:-len(".tmp")]])
+        self.assertEqual(len(self._archived()), 1)
+
+if __name__ == "__main__":
+    unittest.main()
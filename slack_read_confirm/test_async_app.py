@@ -0,0 +1,105 @@
+import asyncio
+import importlib.util
+import unittest
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+
+from .announcements import create_announcement
+from .models import DATABASE_URL, Announcement, Base, ReadReceipt, SessionLocal, Target, engine
+
+ASYNC_DRIVER = "aiosqlite" if DATABASE_URL.startswith("sqlite") else "asyncpg"
+
+
+@unittest.skipUnless(importlib.util.find_spec(ASYNC_DRIVER), f"{ASYNC_DRIVER} is not installed")
+class TestAsyncApp(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.db.query(ReadReceipt).delete()
+        self.db.query(Target).delete()
+        self.db.query(Announcement).delete()
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _react(self, user_id):
+        from .async_app import get_async_engine, handle_reaction_added
+
+        async def react():
+            event = {"reaction": "white_check_mark", "user": user_id, "item": {"channel": "C12345", "ts": "1234567890.123456"}}
+            await handle_reaction_added(event, MagicMock())
+            await get_async_engine().dispose()
+
+        asyncio.run(react())
+
+    @patch('slack_read_confirm.async_app.slack_submit')
+    def test_reaction_records_receipt_and_completes(self, mock_submit):
+        announcement_id, _ = create_announcement(
+            self.db, "U12345", "C12345", "1234567890.123456", "Test announcement", ["U1", "U2"]
+        )
+        self.db.commit()
+
+        self._react("U1")
+        self._react("U1")
+        mock_submit.assert_not_called()
+        self._react("U2")
+
+        # Celebration is posted once, after the last target reads
+        mock_submit.assert_called_once()
+        self.assertEqual(mock_submit.call_args.kwargs["thread_ts"], "1234567890.123456")
+        self.db.expire_all()
+        ann = self.db.query(Announcement).filter_by(id=announcement_id).one()
+        self.assertEqual(ann.read_count, 2)
+        self.assertEqual(self.db.query(ReadReceipt).count(), 2)
+
+    @patch('slack_read_confirm.async_app.dispatcher')
+    def test_sweep_settles_failed_and_cancelled_sends(self, mock_dispatcher):
+        from .async_app import get_async_engine, send_due_reminders
+
+        create_announcement(self.db, "U12345", "C12345", "1.0", "Test announcement", ["U1", "U2", "U3", "U4"])
+        self.db.query(Target).update({Target.next_reminder_at: datetime.utcnow() - timedelta(minutes=1)})
+        self.db.commit()
+
+        def submit(client, method, channel, **kwargs):
+            future = Future()
+            if channel == "U1":
+                future.set_result({"ok": True})
+            elif channel == "U2":
+                future.set_exception(OSError("connection reset"))
+            elif channel == "U4":
+                response = SlackResponse(client=None, http_verb="POST", api_url="", req_args={},
+                                         data={"ok": False, "error": "channel_not_found"}, headers={}, status_code=200)
+                future.set_exception(SlackApiError("channel_not_found", response))
+            return future  # U3's send never starts
+
+        mock_dispatcher.submit.side_effect = submit
+
+        async def sweep():
+            task = asyncio.create_task(send_due_reminders())
+            await asyncio.sleep(0.5)
+            # Cancelled like a sweep still running at the shutdown deadline
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await get_async_engine().dispose()
+
+        asyncio.run(sweep())
+        self.db.expire_all()
+        targets = {target.user_id: target for target in self.db.query(Target)}
+        # Same policy as the sync sweep: delivered is recorded, unsent is released at once,
+        # a transient failure keeps its lease and an undeliverable target is retired
+        self.assertIsNotNone(targets["U1"].last_reminded_at)
+        self.assertIsNotNone(targets["U2"].lease_owner)
+        self.assertIsNone(targets["U3"].lease_owner)
+        self.assertIsNotNone(targets["U3"].next_reminder_at)
+        self.assertEqual(targets["U4"].reminder_error, "channel_not_found")
+        self.assertIsNone(targets["U4"].next_reminder_at)
+
+
+if __name__ == "__main__":
+    unittest.main()
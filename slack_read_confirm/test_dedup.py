@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from .dedup import SeenCache, dedup_middleware, seen_events, seen_reactions
+from .listeners import handle_reaction_added
+
+
+class TestSeenCache(unittest.TestCase):
+    def test_repeats_are_duplicates_until_they_expire(self):
+        cache = SeenCache(ttl=60)
+        self.assertFalse(cache.seen("Ev1"))
+        self.assertTrue(cache.seen("Ev1"))
+        self.assertFalse(cache.seen("Ev2"))
+        self.assertEqual(cache.stats(), {"size": 2, "duplicates": 1})
+
+        expired = SeenCache(ttl=0)
+        self.assertFalse(expired.seen("Ev1"))
+        self.assertFalse(expired.seen("Ev1"))
+
+    def test_size_is_bounded(self):
+        cache = SeenCache(ttl=60, max_size=3)
+        for i in range(5):
+            cache.seen(f"Ev{i}")
+        self.assertEqual(cache.stats()["size"], 3)
+        # The oldest keys were evicted
+        self.assertFalse(cache.seen("Ev0"))
+        self.assertTrue(cache.seen("Ev4"))
+
+    def test_forget(self):
+        cache = SeenCache(ttl=60)
+        cache.seen("Ev1")
+        cache.forget("Ev1")
+        self.assertFalse(cache.seen("Ev1"))
+
+
+class TestDedupListeners(unittest.TestCase):
+    def setUp(self):
+        seen_events.clear()
+        seen_reactions.clear()
+
+    def test_redelivered_event_is_acknowledged_without_listeners(self):
+        body = {"type": "event_callback", "event_id": "Ev123", "event": {"type": "reaction_added"}}
+        next_ = MagicMock(return_value="handled")
+
+        self.assertEqual(dedup_middleware(body, next_), "handled")
+        response = dedup_middleware(dict(body), next_)
+        self.assertEqual(response.status, 200)
+        next_.assert_called_once()
+        # Commands and other requests without an event id always pass
+        dedup_middleware({"command": "/read-confirm"}, next_)
+        self.assertEqual(next_.call_count, 2)
+
+    @patch("slack_read_confirm.listeners.session_scope")
+    @patch("slack_read_confirm.listeners.record_receipt")
+    @patch("slack_read_confirm.listeners.open_index")
+    def test_repeated_checkmarks_skip_the_database(self, mock_index, mock_record, mock_scope):
+        mock_index.might_be_pending.return_value = True
+        mock_record.return_value = None
+        item = {"type": "message", "channel": "C1", "ts": "1.0"}
+
+        handle_reaction_added({"reaction": "white_check_mark", "user": "U1", "item": item}, MagicMock(), MagicMock())
+        handle_reaction_added({"reaction": "heavy_check_mark", "user": "U1", "item": item}, MagicMock(), MagicMock())
+        handle_reaction_added({"reaction": "white_check_mark", "user": "U2", "item": item}, MagicMock(), MagicMock())
+
+        self.assertEqual(mock_record.call_count, 2)
+        self.assertEqual(seen_reactions.stats()["duplicates"], 1)
+
+    @patch("slack_read_confirm.listeners.session_scope")
+    @patch("slack_read_confirm.listeners.record_receipt")
+    @patch("slack_read_confirm.listeners.open_index")
+    def test_failed_receipt_can_be_retried(self, mock_index, mock_record, mock_scope):
+        mock_index.might_be_pending.return_value = True
+        mock_record.side_effect = [RuntimeError("database unavailable"), None]
+        event = {"reaction": "white_check_mark", "user": "U1", "item": {"type": "message", "channel": "C1", "ts": "1.0"}}
+
+        with self.assertRaises(RuntimeError):
+            handle_reaction_added(event, MagicMock(), MagicMock())
+        handle_reaction_added(event, MagicMock(), MagicMock())
+        self.assertEqual(mock_record.call_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import time
+import unittest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from .dispatcher import BACKGROUND, TIER_RATES, Dispatcher, TokenBucket
+from .fake_slack import FakeSlackServer
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSlackServer().start()
+        self.client = WebClient(token="xoxb-test", base_url=self.server.base_url)
+        # Generous limits so retries are driven by Retry-After rather than the buckets
+        self.dispatcher = Dispatcher(workers=2, max_retries=3, tier_rates={tier: 60000 for tier in TIER_RATES},
+                                     channel_rate=60000, jitter=0.01)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_retries_after_rate_limit(self):
+        self.server.rate_limit("chat.postMessage", times=2, retry_after=0)
+
+        response = self.dispatcher.call(self.client, "chat_postMessage", channel="C12345", text="hello")
+
+        self.assertTrue(response["ok"])
+        self.assertEqual(len(self.server.calls_to("chat.postMessage")), 3)
+        stats = self.dispatcher.stats()
+        self.assertEqual(stats["rate_limited"], 2)
+        self.assertEqual(stats["retried"], 2)
+        self.assertEqual(stats["sent"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.rate_limit("chat.postEphemeral", times=10, retry_after=0)
+
+        with self.assertRaises(SlackApiError):
+            self.dispatcher.call(self.client, "chat_postEphemeral", channel="C12345", user="U1", text="hello")
+
+        self.assertEqual(len(self.server.calls_to("chat.postEphemeral")), 4)
+        self.assertEqual(self.dispatcher.stats()["failed"], 1)
+
+    def test_queue_drains(self):
+        futures = [self.dispatcher.submit(self.client, "chat_postMessage", channel=f"D{i}", text="hi") for i in range(20)]
+        self.dispatcher.join()
+
+        self.assertTrue(all(f.result()["ok"] for f in futures))
+        stats = self.dispatcher.stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["sent"], 20)
+
+    def test_paused_tier_does_not_hold_other_tiers(self):
+        dispatcher = Dispatcher(workers=1, max_retries=1, tier_rates={tier: 60000 for tier in TIER_RATES}, jitter=0)
+        self.server.rate_limit("users.list", times=1, retry_after=1)
+        listing = dispatcher.submit(self.client, "users_list")
+        while not self.server.calls_to("users.list"):
+            time.sleep(0.01)
+
+        # users.list's worker sleeps out the Retry-After; the ephemeral has workers of its own
+        start = time.monotonic()
+        dispatcher.call(self.client, "chat_postEphemeral", timeout=0.5, channel="C12345", user="U1", text="hi")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertTrue(listing.result(timeout=5)["ok"])
+
+    def _slow_posts(self, seconds: float):
+        def post(params):
+            time.sleep(seconds)
+            return {"ok": True, "ts": "1.0"}
+
+        self.server.on("chat.postMessage", post)
+        return Dispatcher(workers=1, tier_rates={tier: 60000 for tier in TIER_RATES}, channel_rate=60000)
+
+    def test_interactive_calls_go_before_background_ones(self):
+        dispatcher = self._slow_posts(0.02)
+        for i in range(10):
+            dispatcher.submit(self.client, "chat_postMessage", priority=BACKGROUND, channel=f"D{i}", text="reminder")
+        dispatcher.call(self.client, "chat_postMessage", timeout=5, channel="C_URGENT", text="announcement")
+        dispatcher.join()
+
+        channels = [params["channel"] for params in self.server.calls_to("chat.postMessage")]
+        # At most the reminder already being sent goes first
+        self.assertLessEqual(channels.index("C_URGENT"), 1)
+
+    def test_call_timeout_cancels_the_queued_call(self):
+        dispatcher = self._slow_posts(0.3)
+        dispatcher.submit(self.client, "chat_postMessage", channel="D1", text="slow")
+        with self.assertRaises(FutureTimeoutError):
+            dispatcher.call(self.client, "chat_postMessage", timeout=0.05, channel="C12345", text="too late")
+        dispatcher.join()
+        self.assertEqual([params["channel"] for params in self.server.calls_to("chat.postMessage")], ["D1"])
+
+    def test_token_bucket_throttles(self):
+        bucket = TokenBucket(per_minute=6000, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # 100 tokens/sec with no burst: ten refills take at least 0.1s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import threading
+import unittest
+
+from .jobs import JobQueue, JobRejected
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_runs_jobs_and_records_latency(self):
+        jobs = JobQueue("test", workers=2, max_pending=10)
+
+        futures = [jobs.submit(pow, i, 2) for i in range(5)]
+
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 1, 4, 9, 16])
+        self.assertTrue(jobs.drain(timeout=5))
+        stats = jobs.stats()
+        self.assertEqual(stats["completed"], 5)
+        self.assertEqual(stats["wait_seconds"]["count"], 5)
+        self.assertEqual(stats["run_seconds"]["count"], 5)
+
+    def test_backpressure_rejects_when_full(self):
+        jobs = JobQueue("test", workers=1, max_pending=1, submit_timeout=0.01)
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        jobs.submit(block)
+        started.wait(5)
+        jobs.submit(block)  # fills the queue
+        with self.assertRaises(JobRejected):
+            jobs.submit(block)
+        self.assertEqual(jobs.stats()["rejected"], 1)
+
+        release.set()
+        self.assertTrue(jobs.drain(timeout=5))
+
+    def test_drain_finishes_queued_jobs(self):
+        jobs = JobQueue("test", workers=1, max_pending=10)
+        done = []
+
+        for i in range(5):
+            jobs.submit(done.append, i)
+
+        self.assertTrue(jobs.drain(timeout=5))
+        self.assertEqual(done, [0, 1, 2, 3, 4])
+        with self.assertRaises(JobRejected):
+            jobs.submit(done.append, 5)
+
+    def test_drain_of_a_full_queue_honours_the_timeout(self):
+        jobs = JobQueue("test", workers=1, max_pending=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        jobs.submit(block)
+        started.wait(5)
+        jobs.submit(block)  # fills the queue, leaving no room for the sentinel
+        drained = []
+        drainer = threading.Thread(target=lambda: drained.append(jobs.drain(timeout=0.2)))
+        drainer.start()
+        drainer.join(2)
+        self.assertFalse(drainer.is_alive())
+        self.assertEqual(drained, [False])
+
+        release.set()
+        self.assertTrue(jobs.drain(timeout=5))
+
+
+if __name__ == "__main__":
+    unittest.main()
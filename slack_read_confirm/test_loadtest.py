@@ -0,0 +1,32 @@
+import unittest
+
+from .loadtest import WORKLOADS, compare_to_baseline, percentile, run_workload
+
+
+class TestLoadHarness(unittest.TestCase):
+    def test_workloads_replay_through_listeners(self):
+        for workload in WORKLOADS:
+            with self.subTest(workload=workload):
+                result = run_workload("sqlite://", workload, events=10, targets=5, group_size=3)
+                self.assertEqual(result["params"]["events"], 10)
+                self.assertGreater(result["throughput"], 0)
+                self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+                # Every workload reaches the DB at least once through the real listeners
+                self.assertGreater(result["queries_per_event"], 0)
+
+    def test_percentile_and_baseline_comparison(self):
+        self.assertEqual(percentile([3, 1, 2, 4], 50), 2)
+        self.assertEqual(percentile([3, 1, 2, 4], 99), 4)
+
+        baseline = {"workload": "reactions", "params": {"events": 10}, "p50_ms": 1.0, "p99_ms": 2.0,
+                    "throughput": 100.0, "queries_per_event": 2.0}
+        better = {**baseline, "p50_ms": 0.5, "throughput": 150.0}
+        worse = {**baseline, "p99_ms": 3.0, "throughput": 50.0}
+        self.assertEqual(compare_to_baseline(better, baseline), [])
+        self.assertEqual([line.split(":")[0] for line in compare_to_baseline(worse, baseline)], ["p99_ms", "throughput"])
+        with self.assertRaises(ValueError):
+            compare_to_baseline({**baseline, "workload": "commands"}, baseline)
+
+
+if __name__ == "__main__":
+    unittest.main()
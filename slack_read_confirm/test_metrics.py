@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from slack_bolt import App, BoltRequest
+from slack_sdk import WebClient
+from sqlalchemy import create_engine, text
+
+from . import metrics
+from .announcements import create_announcement
+from .dedup import SeenCache
+from .fake_slack import FakeSlackServer
+from .hot_index import OpenAnnouncementIndex
+from .listeners import register_listeners
+from .models import Base, SessionLocal, create_database_engine
+
+
+def sample(name: str) -> float:
+    """Value of one exposition sample, e.g. 'db_queries_total{handler="x"}', or 0 if absent"""
+    for line in metrics.registry.exposition().splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_exposition(self):
+        registry = metrics.Registry()
+        latency = registry.histogram("test_seconds", "Test latency", ["handler"])
+        latency.observe(0.003, handler="reaction_added")
+        latency.observe(2.0, handler="reaction_added")
+
+        lines = registry.exposition().splitlines()
+
+        self.assertIn("# TYPE test_seconds histogram", lines)
+        self.assertIn('test_seconds_bucket{handler="reaction_added",le="0.005"} 1', lines)
+        self.assertIn('test_seconds_bucket{handler="reaction_added",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{handler="reaction_added"} 2', lines)
+
+    def test_timed_is_passthrough_when_disabled(self):
+        @metrics.timed("disabled_handler")
+        def handler(event):
+            return event
+
+        with patch.object(metrics, "enabled", False):
+            self.assertEqual(handler("ok"), "ok")
+        self.assertNotIn('handler="disabled_handler"', metrics.registry.exposition())
+
+    def test_sql_attributed_to_handler(self):
+        engine = create_engine("sqlite://")
+        metrics.instrument_engine(engine)
+
+        @metrics.timed("sql_handler")
+        def handler():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+
+        with patch.object(metrics, "enabled", True):
+            handler()
+
+        exposition = metrics.registry.exposition()
+        self.assertIn('db_queries_total{handler="sql_handler"} 2', exposition)
+        self.assertIn('slack_listener_seconds_count{handler="sql_handler"} 1', exposition)
+
+
+class TestListenerMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # An engine of its own, so instrumenting it leaves the shared engine untouched
+        self.engine = create_database_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'metrics.db')}")
+        metrics.instrument_engine(self.engine)
+        Base.metadata.create_all(bind=self.engine)
+        SessionLocal.configure(bind=self.engine)
+        with SessionLocal() as db:
+            create_announcement(db, "U0", "C_METRICS", "1.0", "Timed", ["U1", "U2"])
+            db.commit()
+        self.server = FakeSlackServer().start()
+
+    def tearDown(self):
+        from .models import engine
+        self.server.stop()
+        SessionLocal.configure(bind=engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    @patch("slack_read_confirm.listeners.seen_reactions", SeenCache(ttl=60, max_size=100))
+    @patch("slack_read_confirm.listeners.open_index", OpenAnnouncementIndex())
+    def test_listener_work_after_ack_is_attributed(self):
+        # The default mode: Bolt acks, then runs the listener on its executor threads
+        client = WebClient(token="xoxb-test", base_url=self.server.base_url)
+        app = register_listeners(App(client=client, signing_secret="test", token_verification_enabled=False,
+                                     process_before_response=False))
+        body = {"type": "event_callback", "team_id": "T1", "api_app_id": "A1", "event_id": "EvMetrics1",
+                "event_time": int(time.time()),
+                "event": {"type": "reaction_added", "user": "U1", "reaction": "white_check_mark",
+                          "item": {"type": "message", "channel": "C_METRICS", "ts": "1.0"}, "event_ts": "2.0"}}
+        listener_count = 'slack_listener_seconds_count{handler="reaction_added"}'
+        before = {name: sample(name) for name in (listener_count, 'slack_listener_seconds_sum{handler="reaction_added"}',
+                                                  'db_queries_total{handler="reaction_added"}',
+                                                  'db_query_seconds_sum{handler="reaction_added"}')}
+
+        with patch.object(metrics, "enabled", True):
+            self.assertEqual(app.dispatch(BoltRequest(body=body, mode="socket_mode")).status, 200)
+            deadline = time.monotonic() + 5
+            while sample(listener_count) == before[listener_count] and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        delta = {name: sample(name) - value for name, value in before.items()}
+        self.assertEqual(delta[listener_count], 1)
+        # The receipt's SQL ran inside the listener, under its label
+        self.assertGreater(delta['db_queries_total{handler="reaction_added"}'], 0)
+        self.assertGreaterEqual(delta['slack_listener_seconds_sum{handler="reaction_added"}'],
+                                delta['db_query_seconds_sum{handler="reaction_added"}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
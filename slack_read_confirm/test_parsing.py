@@ -0,0 +1,33 @@
+import unittest
+
+from .parsing import parse_command_text, parse_mention_text, split_subcommand
+
+
+class TestParsing(unittest.TestCase):
+    def test_command_text_is_tokenized_in_one_pass(self):
+        parsed = parse_command_text("<@U1> <!subteam^S1|eng> Read the <b>new</b> policy <@W2>")
+        self.assertEqual(parsed.user_ids, ["U1", "W2"])
+        self.assertEqual(parsed.group_ids, ["S1"])
+        self.assertEqual(parsed.text, "Read the <b>new</b> policy")
+        # Unpacks like the original (user ids, group ids, text) tuple
+        user_ids, group_ids, text = parse_command_text("no mentions here")
+        self.assertEqual((user_ids, group_ids, text), ([], [], "no mentions here"))
+
+    def test_mention_keeps_case_and_drops_the_bot(self):
+        parsed = parse_mention_text("<@UBOT> Read-Confirm <@U1> <!subteam^S9|ops> Deploy FREEZE starts Friday", "UBOT")
+        self.assertEqual(parsed.user_ids, ["U1"])
+        self.assertEqual(parsed.group_ids, ["S9"])
+        self.assertEqual(parsed.text, "Deploy FREEZE starts Friday")
+
+        self.assertEqual(parse_mention_text("<@UBOT> read-confirm <@UBOT> hi", "UBOT").user_ids, [])
+        self.assertIsNone(parse_mention_text("<@UBOT> hello there", "UBOT"))
+
+    def test_only_exact_status_is_a_subcommand(self):
+        self.assertEqual(split_subcommand("status"), ("status", ""))
+        self.assertEqual(split_subcommand(" Status 12 "), ("status", "12"))
+        # Announcements that merely start with the word are posted as announcements
+        for text in ("Status update: office closed Friday", "status of the 3 projects <@U1>", "status 12 is done"):
+            self.assertEqual(split_subcommand(text), (None, text))
+
+if __name__ == "__main__":
+    unittest.main()
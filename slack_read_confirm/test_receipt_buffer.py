@@ -0,0 +1,127 @@
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+
+from .announcements import create_announcement, record_receipts
+from .models import Announcement, Base, ChannelStats, ReadReceipt, SessionLocal, Target, engine, session_scope
+from .receipt_buffer import ReceiptBuffer
+
+
+class TestRecordReceipts(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        for model in (ReadReceipt, Target, Announcement, ChannelStats):
+            self.db.query(model).delete()
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_batch_matches_one_at_a_time(self):
+        first, _ = create_announcement(self.db, "U12345", "C1", "1.0", "First", ["U1", "U2"])
+        second, _ = create_announcement(self.db, "U12345", "C1", "2.0", "Second", ["U1", "U2", "U3"])
+
+        results = record_receipts(self.db, [
+            ("C1", "1.0", "U1"),
+            ("C1", "2.0", "U1"),
+            ("C1", "1.0", "U1"),  # repeated within the batch
+            ("C1", "1.0", "U9"),  # not a target
+            ("C1", "9.0", "U1"),  # not an announcement
+            ("C1", "1.0", "U2"),
+        ])
+        self.assertEqual(results, [
+            (first, True, False),
+            (second, True, False),
+            (first, False, False),
+            None,
+            None,
+            (first, True, True),
+        ])
+        # Already stored receipts are reported as not inserted
+        self.assertEqual(record_receipts(self.db, [("C1", "1.0", "U1"), ("C1", "2.0", "U2")]),
+                         [(first, False, False), (second, True, False)])
+
+        counts = {ann.id: (ann.read_count, ann.completed_at is not None) for ann in self.db.query(Announcement)}
+        self.assertEqual(counts, {first: (2, True), second: (2, False)})
+        self.assertEqual(self.db.query(ReadReceipt).count(), 4)
+        stats = self.db.query(ChannelStats).filter_by(owner_id="U12345", channel_id="C1").one()
+        self.assertEqual((stats.read_count, stats.completed_count), (4, 1))
+
+
+class TestReceiptBuffer(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            for model in (ReadReceipt, Target, Announcement, ChannelStats):
+                db.query(model).delete()
+            db.commit()
+            self.announcement_id, _ = create_announcement(
+                db, "U12345", "C1", "1.0", "Burst", [f"U{i}" for i in range(25)])
+            db.commit()
+
+    def test_burst_is_coalesced(self):
+        buffer = ReceiptBuffer(flush_ms=1000, flush_size=10)
+        futures = [buffer.add("C1", "1.0", f"U{i}") for i in range(25)]
+        buffer.drain(timeout=10)
+
+        results = [future.result(timeout=0) for future in futures]
+        self.assertTrue(all(result.inserted for result in results))
+        # Exactly one receipt reports the completion
+        self.assertEqual(sum(result.completed for result in results), 1)
+        self.assertEqual(buffer.stats()["flushes"], 3)
+        self.assertEqual(buffer.stats()["largest_batch"], 10)
+
+    def test_flush_latency_is_bounded(self):
+        buffer = ReceiptBuffer(flush_ms=20, flush_size=100)
+        started = time.monotonic()
+        result = buffer.add("C1", "1.0", "U1").result(timeout=5)
+        self.assertTrue(result.inserted)
+        self.assertLess(time.monotonic() - started, 1.0)
+        buffer.drain(timeout=5)
+
+    def test_drain_flushes_and_later_receipts_are_written_directly(self):
+        buffer = ReceiptBuffer(flush_ms=60000, flush_size=100)
+        pending = buffer.add("C1", "1.0", "U1")
+        self.assertTrue(buffer.drain(timeout=10))
+        self.assertTrue(pending.result(timeout=0).inserted)
+
+        late = buffer.add("C1", "1.0", "U2")
+        self.assertTrue(late.done())
+        self.assertTrue(late.result().inserted)
+
+    def test_drain_of_a_full_buffer_honours_the_timeout(self):
+        release = threading.Event()
+
+        @contextmanager
+        def slow_session():
+            release.wait(5)
+            with session_scope() as db:
+                yield db
+
+        buffer = ReceiptBuffer(flush_ms=1, max_pending=1, session_factory=slow_session)
+        first = buffer.add("C1", "1.0", "U1")
+        time.sleep(0.1)
+        second = buffer.add("C1", "1.0", "U2")  # fills the queue behind the stuck flush
+        started = time.monotonic()
+        self.assertFalse(buffer.drain(timeout=0.2))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+        release.set()
+        self.assertTrue(buffer.drain(timeout=5))
+        self.assertTrue(first.result(timeout=0).inserted)
+        self.assertTrue(second.result(timeout=0).inserted)
+
+    def test_flush_errors_reach_every_receipt(self):
+        def broken_session():
+            raise RuntimeError("database unavailable")
+
+        buffer = ReceiptBuffer(flush_ms=1, session_factory=broken_session)
+        with self.assertRaises(RuntimeError):
+            buffer.add("C1", "1.0", "U1").result(timeout=5)
+        self.assertEqual(buffer.stats()["failed"], 1)
+        buffer.drain(timeout=5)
+
+if __name__ == "__main__":
+    unittest.main()
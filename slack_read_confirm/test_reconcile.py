@@ -0,0 +1,121 @@
+import unittest
+
+from slack_sdk import WebClient
+
+from .announcements import create_announcement, record_receipt
+from .dispatcher import TIER_RATES, Dispatcher
+from .fake_slack import FakeSlackServer
+from .models import Announcement, Base, ChannelStats, ReadReceipt, SessionLocal, Target, engine
+from .reconcile import Reconciler, checkmark_users
+
+
+def reactions(*entries):
+    return {"ok": True, "type": "message",
+            "message": {"reactions": [{"name": name, "users": users, "count": len(users)} for name, users in entries]}}
+
+
+class TestReconciler(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            for model in (ReadReceipt, Target, Announcement, ChannelStats):
+                db.query(model).delete()
+            db.commit()
+            self.first, _ = create_announcement(db, "U0", "C1", "1.0", "First", ["U1", "U2", "U3"])
+            self.second, _ = create_announcement(db, "U0", "C1", "2.0", "Second", ["U1"])
+            db.commit()
+            # U1 already confirmed the first one through a reaction event
+            record_receipt(db, "C1", "1.0", "U1")
+            db.commit()
+
+        self.messages = {
+            "1.0": reactions(("white_check_mark", ["U1", "U2"]), ("eyes", ["U3"]), ("heavy_check_mark", ["U9"])),
+            "2.0": reactions(("white_check_mark::skin-tone-3", ["U1"])),
+        }
+        self.server = FakeSlackServer().start()
+        self.server.on("reactions.get", lambda params: self.messages[params["timestamp"]])
+        self.client = WebClient(token="xoxb-test", base_url=self.server.base_url)
+        self.dispatcher = Dispatcher(workers=2, max_retries=1, tier_rates={tier: 60000 for tier in TIER_RATES},
+                                     channel_rate=60000, jitter=0.01)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def receipts(self):
+        with SessionLocal() as db:
+            return sorted(db.query(Target.announcement_id, Target.user_id).join(ReadReceipt).all())
+
+    def fetched(self):
+        return [params["timestamp"] for params in self.server.calls_to("reactions.get")]
+
+    def test_checkmark_users(self):
+        self.assertEqual(checkmark_users(self.messages["1.0"]), {"U1", "U2", "U9"})
+        self.assertEqual(checkmark_users(self.messages["2.0"]), {"U1"})
+        self.assertEqual(checkmark_users({"ok": True, "message": {}}), set())
+
+    def test_missed_checkmarks_are_backfilled(self):
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=3600, concurrency=1)
+        self.assertEqual(reconciler.run(self.client), 2)
+        self.dispatcher.join()
+
+        # Only targets that reacted with a checkmark, and nobody twice
+        self.assertEqual(self.receipts(), [(self.first, "U1"), (self.first, "U2"), (self.second, "U1")])
+        with SessionLocal() as db:
+            self.assertIsNotNone(db.get(Announcement, self.second).completed_at)
+            self.assertIsNone(db.get(Announcement, self.first).completed_at)
+        celebrations = self.server.calls_to("chat.postMessage")
+        self.assertEqual([params["thread_ts"] for params in celebrations], ["2.0"])
+
+    def test_recently_checked_announcements_are_skipped(self):
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=3600)
+        reconciler.run(self.client)
+        self.assertEqual(reconciler.run(self.client), 0)
+        # The first announcement is still open but was fetched within the recheck interval
+        self.assertEqual(len(self.fetched()), 2)
+        self.assertEqual(reconciler.stats()["skipped_recent"], 1)
+
+        reconciler.recheck_seconds = 0
+        reconciler.run(self.client)
+        self.assertEqual(self.fetched()[2:], ["1.0"])
+
+    def test_calls_per_sweep_are_capped(self):
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=3600, max_calls=1, batch_size=1)
+        self.assertEqual(reconciler.run(self.client), 1)
+        self.assertEqual(self.fetched(), ["1.0"])
+        # The next sweep picks up the announcement that was not checked yet
+        self.assertEqual(reconciler.run(self.client), 1)
+        self.assertEqual(self.fetched(), ["1.0", "2.0"])
+
+    def test_rate_limited_fetch_is_retried(self):
+        self.server.rate_limit("reactions.get", times=1, retry_after=0)
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=3600, concurrency=1)
+        self.assertEqual(reconciler.run(self.client), 2)
+        self.assertEqual(len(self.fetched()), 3)
+        self.assertEqual(self.dispatcher.stats()["rate_limited"], 1)
+        self.assertEqual(reconciler.stats()["failed"], 0)
+
+    def test_failed_fetches_do_not_stop_the_sweep(self):
+        self.messages["1.0"] = {"ok": False, "error": "message_not_found"}
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=0, concurrency=1)
+        self.assertEqual(reconciler.run(self.client), 1)
+        self.assertEqual(self.receipts(), [(self.first, "U1"), (self.second, "U1")])
+        self.assertEqual(reconciler.stats()["failed"], 1)
+        self.assertEqual(reconciler.stats()["fetched"], 1)
+
+        # Still rate limited after the dispatcher's retries: counted as failed, fetched again next sweep
+        self.messages["1.0"] = reactions(("white_check_mark", ["U2"]))
+        self.server.rate_limit("reactions.get", times=2, retry_after=0)
+        self.assertEqual(reconciler.run(self.client), 0)
+        self.assertEqual(reconciler.stats()["failed"], 2)
+        self.assertEqual(reconciler.run(self.client), 1)
+        self.assertIn((self.first, "U2"), self.receipts())
+
+    def test_programming_errors_are_not_swallowed(self):
+        self.messages["1.0"] = {"ok": True, "message": {"reactions": ["white_check_mark"]}}
+        reconciler = Reconciler(dispatcher=self.dispatcher, recheck_seconds=3600, concurrency=1)
+        with self.assertRaises(AttributeError):
+            reconciler.run(self.client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from .announcements import create_announcement
+from .app import stop_services
+from .dispatcher import TIER_RATES, Dispatcher
+from .jobs import JobQueue
+from .models import Announcement, Base, ChannelStats, ReadReceipt, SessionLocal, Target, engine
+from .receipt_buffer import ReceiptBuffer
+from .reconcile import Reconciler
+from .scheduler import send_due_reminders
+from .timezones import UserTimezoneCache
+
+DUE_REMINDERS = 200
+
+
+class TestGracefulShutdown(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            for model in (ReadReceipt, Target, Announcement, ChannelStats):
+                db.query(model).delete()
+            db.commit()
+            create_announcement(db, "U0", "C1", "1.0", "Due", [f"U{i}" for i in range(DUE_REMINDERS)])
+            db.query(Target).update({Target.next_reminder_at: datetime.utcnow() - timedelta(minutes=1)})
+            db.commit()
+            # Not due; confirmed through the write-behind buffer during shutdown
+            create_announcement(db, "U0", "C1", "2.0", "Buffered", [f"V{i}" for i in range(10)])
+            db.commit()
+
+        def post(**kwargs):
+            time.sleep(0.005)
+            return {"ok": True}
+
+        self.client = MagicMock()
+        self.client.chat_postMessage.side_effect = post
+        self.dispatcher = Dispatcher(workers=4, max_retries=0, tier_rates={tier: 60000 for tier in TIER_RATES},
+                                     channel_rate=60000)
+        self.command_queue = JobQueue("commands", workers=2)
+        self.receipt_buffer = ReceiptBuffer(flush_ms=50)
+        self.sweeps_stopping = threading.Event()
+        # Fresh instances in place of the process-wide ones that stop_services() shuts down
+        for target, value in (("slack_read_confirm.scheduler.get_client", MagicMock(return_value=self.client)),
+                              ("slack_read_confirm.scheduler.dispatcher", self.dispatcher),
+                              ("slack_read_confirm.dispatcher.dispatcher", self.dispatcher),
+                              ("slack_read_confirm.scheduler.sweeps_stopping", self.sweeps_stopping),
+                              ("slack_read_confirm.scheduler.reconciler", Reconciler(dispatcher=self.dispatcher)),
+                              ("slack_read_confirm.scheduler.user_timezones", UserTimezoneCache(dispatcher=self.dispatcher)),
+                              ("slack_read_confirm.jobs.command_queue", self.command_queue),
+                              ("slack_read_confirm.jobs.mention_queue", JobQueue("mentions", workers=2)),
+                              ("slack_read_confirm.receipt_buffer.receipt_buffer", self.receipt_buffer)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_scheduler_wait_is_bounded(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        from .scheduler import stop_scheduler
+
+        started, release = threading.Event(), threading.Event()
+
+        def stuck_job():
+            started.set()
+            release.wait(5)
+
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(stuck_job)
+        with patch("slack_read_confirm.scheduler.scheduler", scheduler):
+            scheduler.start()
+            self.assertTrue(started.wait(5))
+            began = time.monotonic()
+            self.assertFalse(stop_scheduler(timeout=0.2))
+            self.assertLess(time.monotonic() - began, 1.0)
+        release.set()
+
+    def test_drain_under_load(self):
+        sweep = threading.Thread(target=send_due_reminders, kwargs={"batch_size": 50})
+        sweep.start()
+        jobs = [self.command_queue.submit(time.sleep, 0.01) for _ in range(20)]
+        receipts = [self.receipt_buffer.add("C1", "2.0", f"V{i}") for i in range(10)]
+        deadline = time.monotonic() + 10
+        while self.client.chat_postMessage.call_count < 60 and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+        handler = MagicMock()
+        started = time.monotonic()
+        self.assertTrue(stop_services(handler, timeout=10))
+        elapsed = time.monotonic() - started
+        sweep.join(timeout=5)
+        self.assertFalse(sweep.is_alive())
+        handler.close.assert_called_once_with()
+
+        # The sweep stopped after the batch in flight instead of sending all due reminders
+        sent = self.client.chat_postMessage.call_count
+        self.assertLess(sent, DUE_REMINDERS)
+        self.assertLess(elapsed, 2.0)
+        self.assertTrue(all(job.done() for job in jobs))
+        self.assertTrue(all(receipt.result(timeout=0).inserted for receipt in receipts))
+        with SessionLocal() as db:
+            # Every reminder sent is recorded, and nothing is left leased
+            self.assertEqual(db.query(Target).filter(Target.last_reminded_at.isnot(None)).count(), sent)
+            self.assertEqual(db.query(Target).filter(Target.lease_owner.isnot(None)).count(), 0)
+
+        # After a restart the next sweep sends exactly the reminders still due
+        self.sweeps_stopping.clear()
+        self.assertEqual(send_due_reminders(batch_size=50), DUE_REMINDERS - sent)
+        self.assertEqual(self.client.chat_postMessage.call_count, DUE_REMINDERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from .announcements import create_announcement, record_receipt, record_receipts
+from .models import Announcement, Base, ChannelStats, ReadReceipt, configure_engine, create_database_engine
+
+# Set to also run the conformance tests against Postgres
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+class StorageConformance:
+    """Behavior every storage backend must share; subclasses set `url`"""
+
+    url = None
+
+    def setUp(self):
+        self.engine = create_database_engine(self.url)
+        Base.metadata.drop_all(bind=self.engine)
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_announcement_with_targets(self):
+        with self.Session() as db:
+            announcement_id, targets = create_announcement(db, "U0", "C1", "1.0", "Hello", ["U1", "U2", "U3"])
+            self.assertEqual(sorted(uid for _, uid in targets), ["U1", "U2", "U3"])
+            self.assertEqual(db.get(Announcement, announcement_id).target_count, 3)
+            # (channel, ts) identifies one announcement
+            with self.assertRaises(Exception):
+                create_announcement(db, "U0", "C1", "1.0", "Again", ["U1"])
+
+    def test_receipts_are_idempotent_and_complete_once(self):
+        with self.Session() as db:
+            announcement_id, _ = create_announcement(db, "U0", "C1", "1.0", "Hello", ["U1", "U2", "U3"])
+            self.assertEqual(record_receipt(db, "C1", "1.0", "U1"), (announcement_id, True, False))
+            self.assertEqual(record_receipt(db, "C1", "1.0", "U1"), (announcement_id, False, False))
+            self.assertIsNone(record_receipt(db, "C1", "1.0", "U9"))
+            self.assertEqual(record_receipts(db, [("C1", "1.0", "U2"), ("C1", "1.0", "U3"), ("C1", "1.0", "U1")]),
+                             [(announcement_id, True, False), (announcement_id, True, True),
+                              (announcement_id, False, False)])
+            stats = db.query(ChannelStats).one()
+            self.assertEqual((stats.read_count, stats.completed_count), (3, 1))
+
+    def test_concurrent_receipts(self):
+        users = [f"U{i}" for i in range(40)]
+        with self.Session() as db:
+            create_announcement(db, "U0", "C1", "1.0", "Hello", users)
+            db.commit()
+
+        def react(user_id):
+            with self.Session() as db:
+                result = record_receipt(db, "C1", "1.0", user_id)
+                db.commit()
+                return result
+
+        # Every user twice, from several threads at once
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(react, users + users))
+        self.assertEqual(sum(result.inserted for result in results), len(users))
+        self.assertEqual(sum(result.completed for result in results), 1)
+        with self.Session() as db:
+            self.assertEqual(db.query(ReadReceipt).count(), len(users))
+            self.assertEqual(db.query(Announcement).one().read_count, len(users))
+
+
+class TestSQLiteStorage(StorageConformance, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.url = f"sqlite:///{os.path.join(cls.tmpdir.name, 'conformance.db')}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_connections_are_tuned(self):
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            # 1 is NORMAL
+            self.assertEqual(conn.execute(text("PRAGMA synchronous")).scalar(), 1)
+            self.assertGreater(conn.execute(text("PRAGMA mmap_size")).scalar(), 0)
+
+
+class TestEngineConfiguration(unittest.TestCase):
+    def test_unsupported_backend_is_rejected(self):
+        engine = MagicMock()
+        engine.dialect.name = "mysql"
+        with self.assertRaisesRegex(ValueError, "Unsupported database backend 'mysql'"):
+            configure_engine(engine, "mysql://localhost/slack_read_confirm")
+
+
+@unittest.skipUnless(TEST_POSTGRES_URL, "TEST_POSTGRES_URL is not set")
+class TestPostgresStorage(StorageConformance, unittest.TestCase):
+    url = TEST_POSTGRES_URL
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from slack_sdk import WebClient
+
+from .dispatcher import TIER_RATES, Dispatcher
+from .fake_slack import FakeSlackServer
+from .timezones import UserTimezoneCache, get_zone, next_reminder_slot, reminder_jitter
+
+
+class TestReminderSlots(unittest.TestCase):
+    def test_slot_is_local_reminder_hour(self):
+        new_york = get_zone("America/New_York")
+        # 12:00 UTC is 07:00 in New York (EST), so today's 09:00 is still ahead
+        slot = next_reminder_slot("U1", new_york, datetime(2026, 1, 15, 12, 0), hour=9, jitter_minutes=0)
+        self.assertEqual(slot, datetime(2026, 1, 15, 14, 0))
+        # Past 09:00 local, the slot moves to tomorrow; in summer New York is UTC-4
+        slot = next_reminder_slot("U1", new_york, datetime(2026, 7, 15, 14, 0), hour=9, jitter_minutes=0)
+        self.assertEqual(slot, datetime(2026, 7, 16, 13, 0))
+
+    def test_jitter_is_stable_and_bounded(self):
+        offsets = {reminder_jitter(f"U{i}", minutes=30) for i in range(200)}
+        self.assertTrue(all(timedelta(0) <= offset < timedelta(minutes=30) for offset in offsets))
+        self.assertGreater(len(offsets), 100)
+        self.assertEqual(reminder_jitter("U1", minutes=30), reminder_jitter("U1", minutes=30))
+        self.assertEqual(reminder_jitter("U1", minutes=0), timedelta(0))
+
+
+class TestUserTimezoneCache(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher(max_retries=0, tier_rates={tier: 60000 for tier in TIER_RATES})
+        pages = {
+            None: {"ok": True, "members": [{"id": "U1", "tz": "Europe/Berlin"}, {"id": "U2"}],
+                   "response_metadata": {"next_cursor": "page2"}},
+            "page2": {"ok": True, "members": [{"id": "U3", "tz": "Asia/Tokyo"}], "response_metadata": {"next_cursor": ""}},
+        }
+        self.client = MagicMock()
+        self.client.users_list.side_effect = lambda limit, cursor=None: pages[cursor]
+
+    def test_bulk_load_pages_through_users_list(self):
+        cache = UserTimezoneCache(ttl=60, dispatcher=self.dispatcher)
+        cache.ensure_fresh(self.client)
+        cache.ensure_fresh(self.client)
+
+        self.assertEqual(self.client.users_list.call_count, 2)
+        self.assertEqual(cache.zone("U1").key, "Europe/Berlin")
+        self.assertEqual(cache.zone("U3").key, "Asia/Tokyo")
+        # No tz in the profile, or not in the workspace list: the default zone
+        self.assertEqual(cache.zone("U2"), cache.zone("U404"))
+        self.assertEqual(cache.stats(), {"users": 3, "refreshes": 1, "failures": 0})
+        # Known users, with or without a zone, can be scheduled; unknown ones wait for a refresh
+        self.assertEqual(cache.known_zone("U2"), cache.zone("U2"))
+        self.assertIsNone(cache.known_zone("U404"))
+
+    def test_failed_refresh_keeps_previous_zones(self):
+        cache = UserTimezoneCache(ttl=0, dispatcher=self.dispatcher)
+        cache.ensure_fresh(self.client)
+        self.client.users_list.side_effect = OSError("down")
+        cache.ensure_fresh(self.client)
+        self.assertEqual(cache.zone("U1").key, "Europe/Berlin")
+
+    def test_stopped_cache_does_not_page(self):
+        cache = UserTimezoneCache(ttl=60, dispatcher=self.dispatcher)
+        cache.stop()
+        cache.ensure_fresh(self.client)
+        self.client.users_list.assert_not_called()
+        self.assertEqual(cache.stats()["refreshes"], 0)
+
+    def test_failed_refresh_backs_off(self):
+        cache = UserTimezoneCache(ttl=60, retry_seconds=60, dispatcher=self.dispatcher)
+        self.client.users_list.side_effect = OSError("missing_scope")
+        cache.ensure_fresh(self.client)
+        cache.ensure_fresh(self.client)
+        # Checks within the retry interval do not page users.list again
+        self.assertEqual(self.client.users_list.call_count, 1)
+        self.assertEqual(cache.stats(), {"users": 0, "refreshes": 0, "failures": 1})
+
+    def test_missing_scope_falls_back_to_the_default_zone(self):
+        cache = UserTimezoneCache(ttl=60, dispatcher=self.dispatcher)
+        with FakeSlackServer() as server:
+            server.on("users.list", lambda params: {"ok": False, "error": "missing_scope"})
+            cache.ensure_fresh(WebClient(token="xoxb-test", base_url=server.base_url))
+        # Without users:read, reminders are scheduled in the default zone rather than never
+        self.assertTrue(cache.ready)
+        self.assertEqual(cache.known_zone("U1"), cache.zone("U1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
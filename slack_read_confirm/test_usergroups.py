@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import MagicMock
+
+from .dispatcher import TIER_RATES, Dispatcher
+from .usergroups import UsergroupCache
+
+
+class TestUsergroupCache(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.usergroups_users_list.side_effect = lambda usergroup: {"ok": True, "users": [f"{usergroup}_U1", f"{usergroup}_U2"]}
+        self.dispatcher = Dispatcher(tier_rates={tier: 60000 for tier in TIER_RATES})
+
+    def test_hits_after_first_fetch(self):
+        cache = UsergroupCache(ttl=60, dispatcher=self.dispatcher)
+
+        first = cache.get_members(self.client, ["S1", "S2"])
+        second = cache.get_members(self.client, ["S1", "S2"])
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["S1"], ("S1_U1", "S1_U2"))
+        self.assertEqual(self.client.usergroups_users_list.call_count, 2)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "size": 2})
+
+    def test_expiry_eviction_and_invalidation(self):
+        expired = UsergroupCache(ttl=0, dispatcher=self.dispatcher)
+        expired.get_members(self.client, ["S1"])
+        expired.get_members(self.client, ["S1"])
+        self.assertEqual(expired.stats()["hits"], 0)
+
+        lru = UsergroupCache(ttl=60, max_groups=1, dispatcher=self.dispatcher)
+        lru.get_members(self.client, ["S1"])
+        lru.get_members(self.client, ["S2"])
+        self.assertEqual(lru.stats()["size"], 1)
+
+        lru.invalidate("S2")
+        lru.get_members(self.client, ["S2"])
+        self.assertEqual(lru.stats()["misses"], 3)
+
+    def test_failed_fetch_is_not_cached(self):
+        self.client.usergroups_users_list.side_effect = lambda usergroup: {"ok": False, "error": "no_such_subteam"}
+        cache = UsergroupCache(ttl=60, dispatcher=self.dispatcher)
+
+        self.assertEqual(cache.get_members(self.client, ["S1"]), {})
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Recipient time zones, loaded in bulk from users.list"""
+
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from slack_sdk.errors import SlackApiError
+
+from . import metrics
+from .dispatcher import BACKGROUND, SLACK_CALL_TIMEOUT, dispatcher
+
+logger = logging.getLogger(__name__)
+
+USER_TZ_CACHE_TTL = float(os.environ.get("USER_TZ_CACHE_TTL", "86400"))
+# After a failed users.list refresh, or when a recipient is missing from it, refresh again this soon
+USER_TZ_RETRY_SECONDS = float(os.environ.get("USER_TZ_RETRY_SECONDS", "900"))
+# How often the background refresh checks whether the cache has expired
+USER_TZ_CHECK_SECONDS = 60
+# Zone for users whose profile has none (or who joined since the last refresh)
+DEFAULT_TIMEZONE = os.environ.get("REMINDER_DEFAULT_TIMEZONE", "UTC")
+# Reminders are spread over this many minutes after the local reminder hour
+REMINDER_JITTER_MINUTES = int(os.environ.get("REMINDER_JITTER_MINUTES", "60"))
+USERS_LIST_PAGE_SIZE = 200
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name: str):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown time zone {name!r}, using {DEFAULT_TIMEZONE}")
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def reminder_jitter(user_id: str, minutes: int = REMINDER_JITTER_MINUTES) -> timedelta:
+    """Stable per-user offset in [0, minutes), so each user is reminded at the same time every day"""
+    if minutes <= 0:
+        return timedelta(0)
+    return timedelta(seconds=zlib.crc32(user_id.encode("utf-8")) % (minutes * 60))
+
+
+def next_reminder_slot(user_id: str, zone, after: datetime, hour: int,
+                       jitter_minutes: int = REMINDER_JITTER_MINUTES) -> datetime:
+    """First local `hour`:00 plus the user's jitter strictly after `after`, as naive UTC"""
+    local = after.replace(tzinfo=timezone.utc).astimezone(zone)
+    slot = local.replace(hour=hour, minute=0, second=0, microsecond=0) + reminder_jitter(user_id, jitter_minutes)
+    if slot <= local:
+        slot += timedelta(days=1)
+    return slot.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class UserTimezoneCache:
+    """user id -> IANA zone name for the whole workspace.
+
+    Refreshed at most once per TTL by paging through users.list, which costs
+    one tier-2 call per 200 users instead of a users.info call per recipient.
+    The refresh runs as its own background job; reminder sweeps only read the
+    cached zones, and only once they are `ready`, because the slots they
+    assign are never recomputed. A failed refresh is retried after
+    `retry_seconds`; without the users:read scope every zone is the default.
+    """
+
+    def __init__(self, ttl: float = USER_TZ_CACHE_TTL, retry_seconds: float = USER_TZ_RETRY_SECONDS,
+                 dispatcher=dispatcher):
+        self.ttl = ttl
+        self.retry_seconds = retry_seconds
+        self.dispatcher = dispatcher
+        self._zones = {}
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.refreshes = 0
+        self.failures = 0
+        self.unavailable = False
+
+    @property
+    def ready(self) -> bool:
+        """True once zones have loaded, or once it is clear they never will"""
+        return self.refreshes > 0 or self.unavailable
+
+    def ensure_fresh(self, client):
+        """Reload the workspace's time zones if the cache has expired"""
+        if time.monotonic() < self._expires:
+            return
+        zones = {}
+        cursor = None
+        try:
+            while True:
+                kwargs = {"limit": USERS_LIST_PAGE_SIZE}
+                if cursor:
+                    kwargs["cursor"] = cursor
+                if self._stopping.is_set():
+                    # Shutting down: keep the previous zones rather than page on
+                    return
+                resp = self.dispatcher.call(client, "users_list", timeout=SLACK_CALL_TIMEOUT, priority=BACKGROUND,
+                                            **kwargs)
+                for member in resp.get("members", []):
+                    # Members without a zone in their profile are known, and get the default
+                    zones[sys.intern(member["id"])] = sys.intern(member.get("tz") or DEFAULT_TIMEZONE)
+                cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+        except Exception as e:
+            # Keep serving the previous zones and back off instead of re-paging on every check
+            logger.error(f"users.list time zone refresh failed, retrying in {self.retry_seconds:.0f}s: {e}")
+            with self._lock:
+                self._expires = time.monotonic() + self.retry_seconds
+                self.failures += 1
+                if isinstance(e, SlackApiError) and e.response.get("error") == "missing_scope":
+                    # Retrying will not help until the app is reinstalled with users:read
+                    self.unavailable = True
+            return
+        with self._lock:
+            self._zones = zones
+            self._expires = time.monotonic() + self.ttl
+            self.refreshes += 1
+
+    def stop(self):
+        """Make a running refresh return before its next users.list page"""
+        self._stopping.set()
+
+    def zone(self, user_id: str):
+        return get_zone(self._zones.get(user_id, DEFAULT_TIMEZONE))
+
+    def known_zone(self, user_id: str):
+        """The user's zone, or None (and an early refresh) if they joined since the last refresh"""
+        name = self._zones.get(user_id)
+        if name is None and not self.unavailable:
+            with self._lock:
+                self._expires = min(self._expires, time.monotonic() + self.retry_seconds)
+            return None
+        return get_zone(name or DEFAULT_TIMEZONE)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._zones), "refreshes": self.refreshes, "failures": self.failures}
+
+
+# Process-wide cache used by the reminder sweep
+user_timezones = UserTimezoneCache()
+
+
+def _collect():
+    stats = user_timezones.stats()
+    return metrics.gauge_lines("user_timezone_cache", "Cached recipient time zones and bulk refreshes",
+                               [({"stat": key}, value) for key, value in stats.items()])
+
+
+metrics.registry.register_collector(_collect)
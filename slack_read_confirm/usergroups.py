@@ -0,0 +1,97 @@
+"""Usergroup membership cache"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from . import metrics
+from .dispatcher import SLACK_CALL_TIMEOUT, dispatcher
+
+logger = logging.getLogger(__name__)
+
+USERGROUP_CACHE_TTL = float(os.environ.get("USERGROUP_CACHE_TTL", "600"))
+USERGROUP_CACHE_SIZE = int(os.environ.get("USERGROUP_CACHE_SIZE", "256"))
+
+
+class UsergroupCache:
+    """TTL + LRU cache of usergroup members keyed by group id.
+
+    Misses are expanded concurrently: every missing group is enqueued on the
+    dispatcher at once and the results are collected together.
+    """
+
+    def __init__(self, ttl: float = USERGROUP_CACHE_TTL, max_groups: int = USERGROUP_CACHE_SIZE, dispatcher=dispatcher):
+        self.ttl = ttl
+        self.dispatcher = dispatcher
+        self.max_groups = max_groups
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, group_id: str):
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(group_id)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(group_id, None)
+            self.misses += 1
+            return None
+
+    def _store(self, group_id: str, members):
+        with self._lock:
+            self._entries[group_id] = (time.monotonic() + self.ttl, members)
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_groups:
+                self._entries.popitem(last=False)
+
+    def get_members(self, client, group_ids) -> dict:
+        """Return {group_id: (user ids)} for every group that could be resolved"""
+        members = {}
+        pending = {}
+        for gid in dict.fromkeys(group_ids):
+            cached = self._lookup(gid)
+            if cached is not None:
+                members[gid] = cached
+            else:
+                pending[gid] = self.dispatcher.submit(client, "usergroups_users_list", usergroup=gid)
+
+        for gid, future in pending.items():
+            try:
+                resp = future.result(SLACK_CALL_TIMEOUT)
+                if resp.get("ok"):
+                    users = tuple(resp.get("users", []))
+                    self._store(gid, users)
+                    members[gid] = users
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(f"Usergroup fetch timed out {gid}")
+            except Exception as e:
+                logger.error(f"Usergroup fetch error {gid}: {e}")
+        return members
+
+    def invalidate(self, group_id: str):
+        with self._lock:
+            self._entries.pop(group_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# Process-wide cache shared by the command handlers
+usergroup_cache = UsergroupCache()
+
+
+def _collect():
+    stats = usergroup_cache.stats()
+    return metrics.gauge_lines("usergroup_cache", "Usergroup membership cache hits, misses and size",
+                               [({"stat": key}, value) for key, value in stats.items()])
+
+
+metrics.registry.register_collector(_collect)